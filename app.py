@@ -1,59 +1,87 @@
-import aws_cdk_lib as cdk
+"""FIS app.
+
+    cdk synth                            all experiment stacks
+    cdk synth -c experiments=nacl,asg    only those (and what they need)
+
+Stack modules are imported only when their stack is built.
+"""
+import importlib
+import os
+
+import aws_cdk as cdk
 from constructs import Construct
-from aws_cdk_lib import StackProps, Stack
-from .fis_upload_ssm_docs.ssm_upload_stack import FisSsmDocs
-from .fis_role.iam_role_stack import FisRole
-from .fis_logs.logs_stack import FisLogs
-from .fis_stop_condition.stop_condition_stack import StopCondition
-from .fis_experiments.ec2_instance_faults.experiments_stack import (
-    Ec2InstancesExperiments,
-)
-from .fis_experiments.ec2_control_plane_faults.experiments_stack import (
-    Ec2ControlPlaneExperiments,
-)
-from .fis_experiments.nacl_faults.experiments_stack import NaclExperiments
-from .fis_experiments.asg_faults.experiments_stack import AsgExperiments
-from .fis_experiments.eks_faults.experiments_stack import EksExperiments
-from .fis_experiments.security_groups_faults.experiments_stack import (
-    SecGroupExperiments,
-)
-from .fis_experiments.iam_access_faults.experiments_stack import IamAccessExperiments
-from .fis_experiments.lambda_faults.experiments_stack import LambdaChaosExperiments
-
-
-class FIS(Stack):
-    def __init__(self, scope: Construct, id: str, props: StackProps = None):
-        super().__init__(scope, id, props)
-        SSMDocStack = FisSsmDocs(self, "FisSsmDocs")
-        LogsStack = FisLogs(self, "FisLogs")
-        IamRoleStack = FisRole(self, "FisRole")
-        StopConditionStack = StopCondition(self, "StopCond")
 
+import aws_fcd_infra_fis_experiment_catalog as catalog
+import aws_fcd_infra_fis_ssm_document_registry as ssm_documents
+from aws_fcd_infra_fis_synth_cache import SynthCache
+
+# Experiment stacks by selector name: module, class, construct id, catalog
+# group they build (its ${context:...} placeholders are part of the stack's
+# synth-cache key) and whether they import FisSsmDocs exports
+EXPERIMENT_STACKS = {
+    "ec2": ("aws_fcd_infra_fis_ec2_instance_fault_experiment_stack", "Ec2InstancesExperiments", "Ec2InstExp", "ec2_instance_faults", False),
+    "ec2api": ("aws_fcd_infra_fis_ec2_control_plane_experiment_stack", "Ec2ControlPlaneExperiments", "Ec2APIExp", "ec2_control_plane_faults", False),
+    "nacl": ("aws_fcd_infra_fis_nacl_fault_experiment_stack", "NaclExperiments", "NaclExp", "nacl_faults", True),
+    "asg": ("aws_fcd_infra_fis_asg_fault_experiment_stack", "AsgExperiments", "AsgExp", "asg_faults", False),
+    "eks": ("aws_fcd_infra_fis_eks_fault_experiment_stack", "EksExperiments", "EksExp", "eks_faults", False),
+    "secgroup": ("aws_fcd_infra_fis_sg_fault_experiment_stack", "SecGroupExperiments", "SecGroupExp", "security_groups_faults", True),
+    "iam": ("aws_fcd_infra_fis_iam_access_experiment_stack", "IamAccessExperiments", "IamAccExp", "iam_access_faults", True),
+    "lambda": ("aws_fcd_infra_fis_lambda_fault_experiment_stack", "LambdaChaosExperiments", "LambdaExp", "lambda_faults", True),
+}
+
+
+def _load(module, name):
+    return getattr(importlib.import_module(module), name)
+
+
+def selected_experiments(value):
+    """Selector names from -c experiments=..., in EXPERIMENT_STACKS order."""
+    if value in (None, "", "all"):
+        return list(EXPERIMENT_STACKS)
+    names = [name.strip() for name in (value if isinstance(value, list) else value.split(",")) if name.strip()]
+    unknown = [name for name in names if name not in EXPERIMENT_STACKS]
+    if unknown:
+        raise ValueError("unknown experiments %s; choose from %s" % (", ".join(unknown), ", ".join(EXPERIMENT_STACKS)))
+    return [name for name in EXPERIMENT_STACKS if name in names]
+
+
+class FIS(cdk.Stack):
+    def __init__(self, scope: Construct, id: str, cache: SynthCache, experiments=None, **kwargs) -> None:
+        super().__init__(scope, id, **kwargs)
+        experiments = selected_experiments(experiments)
+
+        LogsStack = cache.stack(_load("aws_fcd_infra_fis_log_stack", "FisLogs"), self, "FisLogs", context=[])
+        IamRoleStack = cache.stack(_load("aws_fcd_infra_fis_role_stack", "FisRole"), self, "FisRole", context=[])
+        StopConditionStack = cache.stack(
+            _load("aws_fcd_infra_fis_stop_condition_stack", "StopCondition"), self, "StopCond", context=[],
+        )
         IamRoleStack.add_dependency(LogsStack)
 
+        SSMDocStack = None
+        if any(EXPERIMENT_STACKS[name][4] for name in experiments):
+            documents_dir = self.node.try_get_context("ssm_documents_dir") or ssm_documents.DEFAULT_DOCUMENTS_DIR
+            SSMDocStack = cache.stack(
+                _load("aws_fcd_infra_fis_ssm_stack", "FisSsmDocs"), self, "FisSsmDocs",
+                context=[],
+                files=[os.path.join(documents_dir, "*" + ext) for ext in ssm_documents.EXTENSIONS],
+                documents_dir=documents_dir,
+            )
+
+        for name in experiments:
+            module, class_name, stack_id, group, uses_ssm_docs = EXPERIMENT_STACKS[name]
+            stack = cache.stack(
+                _load(module, class_name), self, stack_id,
+                context=catalog.load_catalog().context_keys(group),
+                files=[catalog.DEFAULT_CATALOG],
+            )
+            stack.add_dependency(IamRoleStack)
+            stack.add_dependency(StopConditionStack)
+            if uses_ssm_docs:
+                stack.add_dependency(SSMDocStack)
+
 
-Ec2InstancesExperimentStack = Ec2InstancesExperiments(self, "Ec2InstExp")
-Ec2ControlPlaneExperimentsStack = Ec2ControlPlaneExperiments(self, "Ec2APIExp")
-NaclExperimentsStack = NaclExperiments(self, "NaclExp")
-AsgExperimentsStack = AsgExperiments(self, "AsgExp")
-EksExperimentsStack = EksExperiments(self, "EksExp")
-SecGroupExperimentsStack = SecGroupExperiments(self, "SecGroupExp")
-IamAccessExperimentsStack = IamAccessExperiments(self, "IamAccExp")
-LambdaFaultExperimentStack = LambdaChaosExperiments(self, "LambdaExp")
-
-Ec2InstancesExperimentStack.add_dependency(IamRoleStack)
-Ec2InstancesExperimentStack.add_dependency(StopConditionStack)
-Ec2ControlPlaneExperimentsStack.add_dependency(IamRoleStack)
-Ec2ControlPlaneExperimentsStack.add_dependency(StopConditionStack)
-NaclExperimentsStack.add_dependency(IamRoleStack)
-NaclExperimentsStack.add_dependency(StopConditionStack)
-AsgExperimentsStack.add_dependency(IamRoleStack)
-AsgExperimentsStack.add_dependency(StopConditionStack)
-EksExperimentsStack.add_dependency(IamRoleStack)
-EksExperimentsStack.add_dependency(StopConditionStack)
-SecGroupExperimentsStack.add_dependency(IamRoleStack)
-SecGroupExperimentsStack.add_dependency(StopConditionStack)
-IamAccessExperimentsStack.add_dependency(IamRoleStack)
-IamAccessExperimentsStack.add_dependency(StopConditionStack)
-LambdaFaultExperimentStack.add_dependency(IamRoleStack)
-LambdaFaultExperimentStack.add_dependency(StopConditionStack)
+if __name__ == "__main__":
+    app = cdk.App()
+    cache = SynthCache(app)
+    FIS(app, "FIS", cache, experiments=app.node.try_get_context("experiments"))
+    cache.synth(app)
@@ -0,0 +1,264 @@
+"""Which instances would an experiment template hit? Resolved offline.
+
+    python aws_fcd_infra_fis_blast_radius.py --inventory snapshot.json --local cdk.out
+    python aws_fcd_infra_fis_blast_radius.py --describe --save-inventory snapshot.json --templates EXT1a2b
+
+An inventory snapshot (DescribeInstances output: one response, a list of
+pages, or a flat list of instances) is loaded once into an index keyed by
+tag, availability zone, VPC, subnet and state. A target's resourceTags and
+filters then become set intersections over that index instead of a scan of
+every instance; filters on other paths only check the instances left
+after the indexed ones. ALL targets resolve to the exact instances;
+COUNT(n) and PERCENT(n) pick at random when the experiment starts, so
+they resolve to the candidates and how many of them will be hit.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+
+# Instance attributes with their own index; other filter paths are checked
+# per candidate
+INDEXED_PATHS = ("Placement.AvailabilityZone", "VpcId", "SubnetId", "State.Name", "InstanceType")
+INSTANCE_RESOURCE_TYPES = ("aws:ec2:instance", "aws:ec2:spot-instance")
+
+_COUNT = re.compile(r"^COUNT\((\d+)\)$")
+_PERCENT = re.compile(r"^PERCENT\((\d+)\)$")
+
+
+class BlastRadiusError(ValueError):
+    pass
+
+
+def _flatten(instance, prefix="", out=None):
+    out = {} if out is None else out
+    for key, value in instance.items():
+        if key == "Tags" and isinstance(value, list):
+            out["Tags"] = {tag["Key"]: tag["Value"] for tag in value}
+        elif isinstance(value, dict) and key != "Tags":
+            _flatten(value, prefix + key + ".", out)
+        elif not isinstance(value, list):
+            out[prefix + key] = value
+    out.setdefault("Tags", {})
+    return out
+
+
+def inventory_instances(snapshot):
+    """Flat instance records (``{"InstanceId": ..., "Placement.AvailabilityZone":
+    ..., "Tags": {...}}``) from a DescribeInstances response, a list of
+    pages, or a list of instances (nested or already flat)."""
+    pages = snapshot if isinstance(snapshot, list) else [snapshot]
+    for page in pages:
+        if "Reservations" in page:
+            for reservation in page["Reservations"]:
+                for instance in reservation.get("Instances", []):
+                    yield _flatten(instance)
+        elif "Instances" in page:
+            for instance in page["Instances"]:
+                yield _flatten(instance)
+        else:
+            yield _flatten(page)
+
+
+class InstanceIndex:
+    """Instances of an inventory snapshot, indexed for target resolution."""
+
+    def __init__(self, instances):
+        self.records = list(instances)
+        self._by_id = {record["InstanceId"]: position for position, record in enumerate(self.records)}
+        self._all = set(range(len(self.records)))
+        # path -> value -> positions; tags under "tag:KEY"
+        self._index = {path: {} for path in INDEXED_PATHS}
+        indexed = [(path, self._index[path]) for path in INDEXED_PATHS]
+        tags = {}
+        for position, record in enumerate(self.records):
+            for path, postings in indexed:
+                value = record.get(path)
+                if value is not None:
+                    value = str(value)
+                    if value in postings:
+                        postings[value].add(position)
+                    else:
+                        postings[value] = {position}
+            for key, value in record["Tags"].items():
+                postings = tags.get(key)
+                if postings is None:
+                    postings = tags[key] = {}
+                if value in postings:
+                    postings[value].add(position)
+                else:
+                    postings[value] = {position}
+        for key, postings in tags.items():
+            self._index["tag:" + key] = postings
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls(inventory_instances(json.load(f)))
+
+    def __len__(self):
+        return len(self.records)
+
+    def _posting(self, path, values):
+        postings = self._index.get(path, {})
+        if len(values) == 1:
+            return postings.get(str(values[0]), set())
+        found = set()
+        for value in values:
+            found |= postings.get(str(value), set())
+        return found
+
+    def match(self, resource_tags=None, filters=None, resource_arns=None):
+        """Instance ids matching every tag, every filter (any of its values)
+        and, if given, one of the ARNs."""
+        postings = []
+        if resource_arns:
+            postings.append({self._by_id[arn.rsplit("/", 1)[-1]] for arn in resource_arns
+                             if arn.rsplit("/", 1)[-1] in self._by_id})
+        for key, value in (resource_tags or {}).items():
+            postings.append(self._posting("tag:" + key, [value]))
+        scanned = []
+        for f in filters or []:
+            path, values = f["path"], f["values"]
+            if path in INDEXED_PATHS or path.startswith("tag:"):
+                postings.append(self._posting(path, values))
+            else:
+                scanned.append((path, {str(value) for value in values}))
+        postings.sort(key=len)
+        found = set(postings[0]) if postings else set(self._all)
+        for posting in postings[1:]:
+            if not found:
+                break
+            found &= posting
+        if scanned:
+            found = {position for position in found
+                     if all(str(self.records[position].get(path)) in values for path, values in scanned)}
+        return sorted(self.records[position]["InstanceId"] for position in found)
+
+    def scan(self, resource_tags=None, filters=None, resource_arns=None):
+        """``match`` by checking every instance; the baseline the index is
+        measured against."""
+        arn_ids = {arn.rsplit("/", 1)[-1] for arn in resource_arns or []}
+        found = []
+        for record in self.records:
+            if arn_ids and record["InstanceId"] not in arn_ids:
+                continue
+            if all(record["Tags"].get(k) == v for k, v in (resource_tags or {}).items()) and all(
+                str(record["Tags"].get(f["path"][4:]) if f["path"].startswith("tag:") else record.get(f["path"]))
+                in {str(value) for value in f["values"]} for f in filters or []
+            ):
+                found.append(record["InstanceId"])
+        return sorted(found)
+
+
+class TargetResolution:
+    """Instances one target could hit and how many of them it will."""
+
+    def __init__(self, name, resource_type, selection_mode, candidates, supported=True):
+        self.name = name
+        self.resource_type = resource_type
+        self.selection_mode = selection_mode
+        self.candidates = candidates
+        self.supported = supported
+        count = _COUNT.match(selection_mode)
+        percent = _PERCENT.match(selection_mode)
+        if count:
+            self.selected = min(int(count.group(1)), len(candidates))
+        elif percent:
+            self.selected = len(candidates) * int(percent.group(1)) // 100
+        else:
+            self.selected = len(candidates)
+
+    @property
+    def exact(self):
+        """True when the hit instances are exactly the candidates."""
+        return self.selected == len(self.candidates)
+
+    def sample(self, seed=None):
+        """One possible set of hit instances."""
+        if self.exact:
+            return list(self.candidates)
+        return sorted(random.Random(seed).sample(self.candidates, self.selected))
+
+
+def resolve_template(index, template):
+    """``{target name: TargetResolution}`` for an experiment template as
+    returned by GetExperimentTemplate (camelCase keys)."""
+    resolutions = {}
+    for name, target in template.get("targets", {}).items():
+        resource_type = target.get("resourceType")
+        mode = target.get("selectionMode", "ALL")
+        if resource_type not in INSTANCE_RESOURCE_TYPES:
+            resolutions[name] = TargetResolution(name, resource_type, mode, [], supported=False)
+            continue
+        if target.get("parameters"):
+            raise BlastRadiusError("target %r: resolving targets with parameters is not supported" % name)
+        candidates = index.match(target.get("resourceTags"), target.get("filters"), target.get("resourceArns"))
+        resolutions[name] = TargetResolution(name, resource_type, mode, candidates)
+    return resolutions
+
+
+# -- CLI -------------------------------------------------------------------------
+
+def describe_instances(region=None):
+    """Pages of a live DescribeInstances, for --describe."""
+    import boto3
+
+    paginator = boto3.client("ec2", region_name=region).get_paginator("describe_instances")
+    return [{"Reservations": page["Reservations"]} for page in paginator.paginate()]
+
+
+def _templates(args):
+    if args.local:
+        from aws_fcd_infra_fis_runner import LocalFis
+
+        return LocalFis.from_assembly(args.local, None).templates
+    import boto3
+
+    client = boto3.client("fis", region_name=args.region)
+    return {tid: client.get_experiment_template(id=tid)["experimentTemplate"] for tid in args.templates.split(",")}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--inventory", help="DescribeInstances snapshot (JSON)")
+    parser.add_argument("--describe", action="store_true", help="take the snapshot with a live DescribeInstances")
+    parser.add_argument("--save-inventory", metavar="PATH", help="write the --describe snapshot here")
+    parser.add_argument("--local", metavar="ASSEMBLY", help="templates from a cloud assembly")
+    parser.add_argument("--templates", help="comma separated experiment template ids (live FIS)")
+    parser.add_argument("--show", type=int, default=10, help="instance ids to print per target")
+    parser.add_argument("--region", default=os.environ.get("AWS_REGION"))
+    args = parser.parse_args(argv)
+    if bool(args.inventory) == args.describe:
+        parser.error("give one of --inventory or --describe")
+    if not (args.local or args.templates):
+        parser.error("give --local or --templates")
+
+    if args.describe:
+        snapshot = describe_instances(args.region)
+        if args.save_inventory:
+            with open(args.save_inventory, "w") as f:
+                json.dump(snapshot, f, default=str)
+        index = InstanceIndex(inventory_instances(snapshot))
+    else:
+        index = InstanceIndex.load(args.inventory)
+
+    for tid, template in _templates(args).items():
+        tags = template.get("tags", {})
+        print("%s  %s" % (tid, tags.get("Name", template.get("description", ""))))
+        for name, resolution in resolve_template(index, template).items():
+            if not resolution.supported:
+                print("    %s: %s not resolved offline" % (name, resolution.resource_type))
+                continue
+            hit = "%d" % resolution.selected if resolution.exact else "%d of %d" % (
+                resolution.selected, len(resolution.candidates))
+            shown = resolution.candidates[:args.show]
+            more = " ..." if len(resolution.candidates) > args.show else ""
+            print("    %s: %s %s instances: %s%s" % (name, resolution.selection_mode, hit, " ".join(shown), more))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,448 @@
+"""Deploy the stacks of a synthesized FIS app concurrently.
+
+    cdk synth -o cdk.out
+    python aws_fcd_infra_fis_deploy_planner.py cdk.out --dry-run
+    python aws_fcd_infra_fis_deploy_planner.py cdk.out --workers 6
+    python aws_fcd_infra_fis_deploy_planner.py cdk.out --local
+
+The dependency graph is read from the cloud assembly: explicit
+``add_dependency`` edges from manifest.json plus an edge from every stack
+exporting a value to every stack that imports it with ``Fn::ImportValue``.
+A stack starts as soon as everything it depends on is deployed, so with
+enough workers the rollout takes as long as the critical path rather than
+the sum of all stacks.
+
+With ``--state FILE`` the digest of every template that deployed is
+recorded, and ``--changed-only`` deploys just the stacks whose template
+differs from the recorded one (or that have no record yet):
+
+    python aws_fcd_infra_fis_deploy_planner.py cdk.out --state deployed.json --changed-only
+"""
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+STACK_ARTIFACT = "aws:cloudformation:stack"
+
+DEFAULT_WORKERS = 4
+# Rough CloudFormation timings used when there's no history for a stack
+BASE_SECONDS = 30.0
+SECONDS_PER_RESOURCE = 4.0
+
+
+class PlanError(ValueError):
+    pass
+
+
+class DeployError(RuntimeError):
+    pass
+
+
+class StackInfo:
+    def __init__(self, artifact_id, display_name, stack_name, template, dependencies):
+        self.artifact_id = artifact_id
+        self.display_name = display_name
+        self.stack_name = stack_name
+        self.template = template
+        self.dependencies = set(dependencies)
+        self.exports = set()
+        self.imports = set()
+        _collect_exports_imports(template, self.exports, self.imports)
+
+    @property
+    def resource_count(self):
+        return len(self.template.get("Resources", {}))
+
+    @property
+    def template_digest(self):
+        return hashlib.sha256(json.dumps(self.template, sort_keys=True).encode()).hexdigest()
+
+    def __repr__(self):
+        return "StackInfo(%r)" % self.stack_name
+
+
+def _collect_exports_imports(template, exports, imports):
+    for output in template.get("Outputs", {}).values():
+        name = output.get("Export", {}).get("Name")
+        if isinstance(name, str):
+            exports.add(name)
+
+    def walk(node):
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if key == "Fn::ImportValue" and isinstance(value, str):
+                    imports.add(value)
+                else:
+                    walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk(template.get("Resources", {}))
+    walk(template.get("Outputs", {}))
+
+
+def load_assembly(path):
+    """Read the stacks of the cloud assembly in ``path`` and wire up their
+    dependencies. Returns ``{stack_name: StackInfo}``."""
+    with open(os.path.join(path, "manifest.json")) as f:
+        artifacts = json.load(f).get("artifacts", {})
+
+    def stack_deps(artifact_id, seen):
+        # Stacks depend on their asset manifests; look through those
+        for dep in artifacts.get(artifact_id, {}).get("dependencies", []):
+            if dep in seen:
+                continue
+            seen.add(dep)
+            if artifacts.get(dep, {}).get("type") == STACK_ARTIFACT:
+                yield dep
+            else:
+                yield from stack_deps(dep, seen)
+
+    by_artifact = {}
+    for artifact_id, artifact in artifacts.items():
+        if artifact.get("type") != STACK_ARTIFACT:
+            continue
+        props = artifact.get("properties", {})
+        with open(os.path.join(path, props["templateFile"])) as f:
+            template = json.load(f)
+        by_artifact[artifact_id] = StackInfo(
+            artifact_id,
+            artifact.get("displayName", artifact_id),
+            props.get("stackName", artifact_id),
+            template,
+            stack_deps(artifact_id, set()),
+        )
+
+    stacks = {}
+    for info in by_artifact.values():
+        info.dependencies = {by_artifact[dep].stack_name for dep in info.dependencies}
+        stacks[info.stack_name] = info
+
+    exporters = {}
+    for info in stacks.values():
+        for name in info.exports:
+            exporters[name] = info.stack_name
+    for info in stacks.values():
+        for name in info.imports:
+            producer = exporters.get(name)
+            if producer and producer != info.stack_name:
+                info.dependencies.add(producer)
+    return stacks
+
+
+def external_imports(stacks):
+    """Imports no stack of the assembly exports; they must already exist."""
+    exported = set()
+    for info in stacks.values():
+        exported |= info.exports
+    return {name: sorted(s for s, info in stacks.items() if name in info.imports)
+            for name in sorted(set().union(*(info.imports for info in stacks.values())) - exported)}
+
+
+def plan_waves(stacks):
+    """Group stacks into waves: each wave only depends on earlier ones."""
+    remaining = {name: set(info.dependencies) for name, info in stacks.items()}
+    waves = []
+    while remaining:
+        ready = sorted(name for name, deps in remaining.items() if not deps)
+        if not ready:
+            raise PlanError("dependency cycle between stacks: %s" % ", ".join(sorted(remaining)))
+        waves.append(ready)
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    return waves
+
+
+# -- estimates -----------------------------------------------------------------
+
+def load_history(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_history(path, durations):
+    history = load_history(path)
+    history.update(durations)
+    with open(path, "w") as f:
+        json.dump(history, f, indent=2, sort_keys=True)
+
+
+def load_state(path):
+    """``{stack_name: template digest}`` as of the last successful deploys."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_state(path, stacks, deployed):
+    state = load_state(path)
+    state.update((name, stacks[name].template_digest) for name in deployed)
+    with open(path, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+
+
+def changed_stacks(stacks, state):
+    """Stacks whose template isn't the one recorded in ``state``."""
+    return {name for name, info in stacks.items() if state.get(name) != info.template_digest}
+
+
+def estimate_durations(stacks, history=None):
+    history = history or {}
+    return {
+        name: history.get(name, BASE_SECONDS + SECONDS_PER_RESOURCE * info.resource_count)
+        for name, info in stacks.items()
+    }
+
+
+def estimate_wall_time(stacks, durations, workers):
+    """Replay the scheduler on estimated durations.
+
+    Returns ``(wall, serial, critical_path)`` in seconds.
+    """
+    finish = {}
+
+    def critical(name):
+        if name not in finish:
+            finish[name] = durations[name] + max((critical(dep) for dep in stacks[name].dependencies), default=0.0)
+        return finish[name]
+
+    critical_path = max((critical(name) for name in stacks), default=0.0)
+    serial = sum(durations.values())
+
+    pending = {name: set(info.dependencies) for name, info in stacks.items()}
+    running = []  # (end time, name)
+    now = 0.0
+    while pending or running:
+        ready = sorted((name for name, deps in pending.items() if not deps), key=lambda n: -finish[n])
+        for name in ready[:max(0, workers - len(running))]:
+            del pending[name]
+            running.append((now + durations[name], name))
+        if not running:
+            raise PlanError("dependency cycle between stacks: %s" % ", ".join(sorted(pending)))
+        running.sort()
+        now, done = running.pop(0)
+        for deps in pending.values():
+            deps.discard(done)
+    return now, serial, critical_path
+
+
+# -- backends ------------------------------------------------------------------
+
+class CdkCliBackend:
+    """Deploys one stack at a time with the CDK CLI against the assembly,
+    which also takes care of publishing its assets."""
+
+    def __init__(self, assembly, cdk_command=("npx", "cdk"), extra_args=()):
+        self.assembly = assembly
+        self.cdk_command = list(cdk_command)
+        self.extra_args = list(extra_args)
+
+    def deploy(self, stack):
+        command = self.cdk_command + [
+            "deploy", stack.display_name,
+            "--app", self.assembly,
+            "--exclusively",
+            "--require-approval", "never",
+            "--progress", "events",
+        ] + self.extra_args
+        proc = subprocess.run(command, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise DeployError("%s failed:\n%s" % (stack.stack_name, proc.stderr[-4000:]))
+
+
+class LocalCloudFormation:
+    """In-process stand-in for CloudFormation.
+
+    Deploying a stack takes ``base + per_resource * resources`` seconds
+    (scaled by ``speed``) and fails like CloudFormation would if one of its
+    ``Fn::ImportValue`` names hasn't been exported by an earlier stack.
+    ``exports`` can be seeded with values that exist outside the assembly.
+    """
+
+    def __init__(self, base=BASE_SECONDS, per_resource=SECONDS_PER_RESOURCE, speed=1.0, exports=(), fail=()):
+        self.base = base
+        self.per_resource = per_resource
+        self.speed = speed
+        self.exports = set(exports)
+        self.fail = set(fail)
+        self.deployed = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def deploy(self, stack):
+        with self._lock:
+            missing = sorted(stack.imports - self.exports)
+            if missing:
+                raise DeployError("%s: no export named %s found" % (stack.stack_name, ", ".join(missing)))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep((self.base + self.per_resource * stack.resource_count) * self.speed)
+            if stack.stack_name in self.fail:
+                raise DeployError("%s: UPDATE_ROLLBACK_COMPLETE" % stack.stack_name)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        with self._lock:
+            self.exports |= stack.exports
+            self.deployed.append(stack.stack_name)
+
+
+# -- deploy --------------------------------------------------------------------
+
+class DeployResult:
+    def __init__(self):
+        self.durations = {}
+        self.failed = {}
+        self.skipped = []
+        self.wall = 0.0
+
+    @property
+    def ok(self):
+        return not self.failed and not self.skipped
+
+
+def deploy(stacks, backend, workers=DEFAULT_WORKERS, priority=None, log=None):
+    """Deploy ``stacks`` through ``backend`` with up to ``workers`` at once.
+
+    A stack is started as soon as all of its dependencies are deployed;
+    ``priority`` (higher first) orders stacks that are ready at the same
+    time, normally the length of the longest path they start. After a
+    failure nothing new is started, and stacks that were never started are
+    reported as skipped.
+    """
+    log = log or (lambda message: None)
+    priority = priority or {}
+    pending = {name: set(info.dependencies) for name, info in stacks.items()}
+    result = DeployResult()
+    started = time.perf_counter()
+    running = {}
+
+    def run(name):
+        t0 = time.perf_counter()
+        backend.deploy(stacks[name])
+        return time.perf_counter() - t0
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+            if not result.failed:
+                ready = sorted((n for n, deps in pending.items() if not deps), key=lambda n: (-priority.get(n, 0), n))
+                for name in ready[:workers - len(running)]:
+                    del pending[name]
+                    log("start  %s" % name)
+                    running[pool.submit(run, name)] = name
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    result.durations[name] = future.result()
+                    log("done   %s (%.1fs)" % (name, result.durations[name]))
+                except Exception as e:
+                    result.failed[name] = e
+                    log("FAILED %s: %s" % (name, e))
+                for deps in pending.values():
+                    deps.discard(name)
+    result.skipped = sorted(pending)
+    result.wall = time.perf_counter() - started
+    return result
+
+
+def _critical_priority(stacks, durations):
+    """Longest remaining path from each stack to the end of the rollout."""
+    dependents = {name: [] for name in stacks}
+    for name, info in stacks.items():
+        for dep in info.dependencies:
+            dependents[dep].append(name)
+    memo = {}
+
+    def tail(name):
+        if name not in memo:
+            memo[name] = durations[name] + max((tail(d) for d in dependents[name]), default=0.0)
+        return memo[name]
+
+    return {name: tail(name) for name in stacks}
+
+
+def print_plan(stacks, durations, workers, out=sys.stdout):
+    waves = plan_waves(stacks)
+    for i, wave in enumerate(waves, 1):
+        out.write("wave %d:\n" % i)
+        for name in wave:
+            deps = ", ".join(sorted(stacks[name].dependencies)) or "-"
+            out.write("  %-40s ~%5.0fs  after %s\n" % (name, durations[name], deps))
+    for name, users in external_imports(stacks).items():
+        out.write("external import %s used by %s\n" % (name, ", ".join(users)))
+    wall, serial, critical = estimate_wall_time(stacks, durations, workers)
+    out.write("estimated: %.0fs with %d workers (serial %.0fs, critical path %.0fs)\n" % (wall, workers, serial, critical))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("assembly", nargs="?", default="cdk.out", help="cloud assembly directory (cdk synth -o)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--dry-run", action="store_true", help="print waves and estimated time, deploy nothing")
+    parser.add_argument("--local", action="store_true", help="deploy to an in-process CloudFormation stand-in")
+    parser.add_argument("--local-speed", type=float, default=0.01, help="stand-in time scale (1.0 = estimated real time)")
+    parser.add_argument("--history", help="JSON file of measured stack durations, used for estimates and updated after deploys")
+    parser.add_argument("--stacks", help="comma separated stack names to deploy (dependencies must already exist)")
+    parser.add_argument("--state", help="JSON file of the templates last deployed, updated after deploys")
+    parser.add_argument("--changed-only", action="store_true", help="only stacks whose template differs from --state")
+    args = parser.parse_args(argv)
+    if args.changed_only and not args.state:
+        parser.error("--changed-only needs --state")
+
+    stacks = load_assembly(args.assembly)
+    wanted = set(args.stacks.split(",")) if args.stacks else None
+    if args.changed_only:
+        changed = changed_stacks(stacks, load_state(args.state))
+        wanted = changed if wanted is None else wanted & changed
+    if wanted is not None:
+        unknown = wanted - set(stacks)
+        if unknown:
+            parser.error("unknown stacks: %s" % ", ".join(sorted(unknown)))
+        stacks = {name: stacks[name] for name in wanted}
+        for info in stacks.values():
+            info.dependencies &= wanted
+    durations = estimate_durations(stacks, load_history(args.history) if args.history else None)
+    print_plan(stacks, durations, args.workers)
+    if args.dry_run:
+        return 0
+
+    if args.local:
+        backend = LocalCloudFormation(speed=args.local_speed, exports=external_imports(stacks))
+    else:
+        backend = CdkCliBackend(args.assembly)
+    result = deploy(
+        stacks, backend, workers=args.workers,
+        priority=_critical_priority(stacks, durations),
+        log=lambda message: print(message, flush=True),
+    )
+    if args.history and not args.local:
+        save_history(args.history, result.durations)
+    if args.state and not args.local:
+        save_state(args.state, stacks, result.durations)
+    print("deployed %d stacks in %.1fs" % (len(result.durations), result.wall))
+    if result.skipped:
+        print("skipped: %s" % ", ".join(result.skipped))
+    return 0 if result.ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,61 +1,26 @@
-from aws_cdk import (
-    aws_fis as fis,
-    core as cdk,
-)
-from aws_cdk.core import (
-    Construct,
-    Stack,
-    StackProps,
-)
+import aws_cdk as cdk
+from aws_cdk import aws_eks as eks
+from constructs import Construct
 
-class EksExperiments(Stack):
-    def __init__(self, scope: Construct, id: str, props: StackProps = None):
-        super().__init__(scope, id, props)
-        # Import FIS Role and Stop Condition
-        imported_fis_role_arn = cdk.Fn.import_value("FISIamRoleArn")
-        imported_stop_condition_arn = cdk.Fn.import_value("StopConditionArn")
-        eks_cluster_name = self.node.try_get_context("eks_cluster_name")
-        # Targets
-        target_eks_cluster = fis.CfnExperimentTemplate.ExperimentTemplateTargetProperty(
-            resource_type="aws:eks:nodegroup",
-            selection_mode="ALL",
-            resource_tags={
-                "eksctl.cluster.k8s.io/v1alpha1/cluster-name": str(eks_cluster_name),
-            },
-        )
-        # Actions
-        terminate_node_group_instance = fis.CfnExperimentTemplate.ExperimentTemplateActionProperty(
-            action_id="aws:eks:terminate-nodegroup-instances",
-            parameters={
-                "instanceTerminationPercentage": "50",
-            },
-            targets={
-                "Nodegroups": "nodeGroupTarget",
-            },
-        )
+from aws_fcd_infra_fis_eks_rbac import DEFAULT_USERNAME
+from aws_fcd_infra_fis_experiment_catalog import add_experiments
 
-        # Experiments
-template_eks_terminate_node_group = fis.CfnExperimentTemplate(
-    self,
-    "fis-eks-terminate-node-group",
-    description="Terminate 50 per cent instances on the EKS target node group.",
-    role_arn=imported_fis_role_arn.to_string(),
-    stop_conditions=[
-        {
-            "source": "aws:cloudwatch:alarm",
-            "value": imported_stop_condition_arn.to_string(),
-        },
-    ],
-    tags={
-        "Name": "Terminate 50 per cent instances on the EKS target node group",
-        "Stackname": self.stack_name,
-    },
-    actions={
-        "nodeGroupActions": terminate_node_group_instance,
-    },
-    targets={
-        "nodeGroupTarget": target_eks_cluster,
-    },
-)
 
+class EksExperiments(cdk.Stack):
+    def __init__(self, scope: Construct, id: str, **kwargs) -> None:
+        super().__init__(scope, id, **kwargs)
+        # Targets, actions and templates are defined in fis_experiments.yml
+        self.templates = add_experiments(self, "eks_faults")
 
+        # Pod experiments call the cluster API as the FIS role; map it to the
+        # Kubernetes user bound by aws_fcd_infra_fis_eks_rbac.py. Clusters
+        # still on the aws-auth ConfigMap map it there (-c eks_access_entry=false).
+        cluster_name = self.node.try_get_context("eks_cluster_name")
+        if cluster_name and str(self.node.try_get_context("eks_access_entry")).lower() != "false":
+            eks.CfnAccessEntry(
+                self, "fis-access-entry",
+                cluster_name=cluster_name,
+                principal_arn=cdk.Fn.import_value("FISIamRoleArn"),
+                username=self.node.try_get_context("eks_fis_username") or DEFAULT_USERNAME,
+                type="STANDARD",
+            )
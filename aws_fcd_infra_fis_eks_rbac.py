@@ -0,0 +1,68 @@
+"""Kubernetes side of the EKS pod experiments.
+
+    python aws_fcd_infra_fis_eks_rbac.py --namespace web | kubectl apply -f -
+
+FIS runs aws:eks:pod-* actions by calling the cluster's API as the FIS
+role, mapped to the Kubernetes user fis-experiment (EksExperiments adds the
+EKS access entry for that), and starts its fault pods under a service
+account in the target namespace. This prints the ServiceAccount, Role and
+RoleBinding that give both what the actions need, per namespace.
+"""
+import argparse
+import sys
+
+import yaml
+
+DEFAULT_USERNAME = "fis-experiment"
+DEFAULT_SERVICE_ACCOUNT = "fis-experiment"
+ROLE_NAME = "fis-experiment"
+
+RULES = [
+    {"apiGroups": [""], "resources": ["configmaps"], "verbs": ["get", "create", "patch", "delete"]},
+    {"apiGroups": [""], "resources": ["pods"], "verbs": ["create", "list", "get", "delete", "deletecollection"]},
+    {"apiGroups": [""], "resources": ["pods/ephemeralcontainers"], "verbs": ["update"]},
+    {"apiGroups": [""], "resources": ["pods/exec"], "verbs": ["create"]},
+    {"apiGroups": ["apps"], "resources": ["deployments"], "verbs": ["get"]},
+]
+
+
+def manifests(namespace, service_account=DEFAULT_SERVICE_ACCOUNT, username=DEFAULT_USERNAME):
+    """ServiceAccount, Role and RoleBinding for pod experiments in ``namespace``."""
+    return [
+        {
+            "apiVersion": "v1",
+            "kind": "ServiceAccount",
+            "metadata": {"name": service_account, "namespace": namespace},
+        },
+        {
+            "apiVersion": "rbac.authorization.k8s.io/v1",
+            "kind": "Role",
+            "metadata": {"name": ROLE_NAME, "namespace": namespace},
+            "rules": RULES,
+        },
+        {
+            "apiVersion": "rbac.authorization.k8s.io/v1",
+            "kind": "RoleBinding",
+            "metadata": {"name": ROLE_NAME, "namespace": namespace},
+            "subjects": [
+                {"kind": "ServiceAccount", "name": service_account, "namespace": namespace},
+                {"apiGroup": "rbac.authorization.k8s.io", "kind": "User", "name": username},
+            ],
+            "roleRef": {"apiGroup": "rbac.authorization.k8s.io", "kind": "Role", "name": ROLE_NAME},
+        },
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--namespace", action="append", required=True, help="namespace of the target pods, repeatable")
+    parser.add_argument("--service-account", default=DEFAULT_SERVICE_ACCOUNT, help="-c eks_fis_service_account")
+    parser.add_argument("--username", default=DEFAULT_USERNAME, help="-c eks_fis_username")
+    args = parser.parse_args(argv)
+    documents = [doc for namespace in args.namespace for doc in manifests(namespace, args.service_account, args.username)]
+    yaml.safe_dump_all(documents, sys.stdout, sort_keys=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,359 @@
+import functools
+import hashlib
+import itertools
+import json
+import os
+import re
+
+import aws_cdk as cdk
+import yaml
+from aws_cdk import aws_fis as fis
+
+DEFAULT_CATALOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fis_experiments.yml")
+
+_PLACEHOLDER = re.compile(r"\$\{([a-z_]+)(?::([^}]+))?\}")
+
+# How ${az} is filled in (-c az_mode=...):
+#   rotate  one template per experiment; the zone is picked from a hash of
+#           the stack path and -c az_rotation=..., so it only moves when the
+#           rotation value changes
+#   per-az  one template per experiment and zone
+AZ_MODES = ("rotate", "per-az")
+DEFAULT_AZ_MODE = "rotate"
+AZ_CONTEXT = ["az_mode", "az_rotation", "availability_zones"]
+
+# Experiments with a sweep: grid are only built when selected with
+# -c sweeps=ID,ID (or all); each grid point becomes its own template
+SWEEP_CONTEXT = ["sweeps"]
+
+try:
+    _YamlLoader = yaml.CSafeLoader
+except AttributeError:
+    _YamlLoader = yaml.SafeLoader
+
+
+class CatalogError(ValueError):
+    pass
+
+
+class ExperimentCatalog:
+    """Parsed and validated experiment catalog (see fis_experiments.yml).
+
+    Holds plain data only, so one instance is shared by every stack of an
+    app; per-stack substitution happens in CatalogCompiler.
+    """
+
+    def __init__(self, data, source="<catalog>"):
+        self.source = source
+        self.defaults = data.get("defaults", {})
+        self.targets = data.get("targets", {})
+        self.actions = data.get("actions", {})
+        self.stop_conditions = data.get("stopConditions", {})
+        self.experiments = data.get("experiments", [])
+        self._groups = {}
+        for spec in self.experiments:
+            self._validate(spec)
+            group = self._groups.setdefault(spec["group"], [])
+            if any(other["id"] == spec["id"] for other in group):
+                raise CatalogError("%s: duplicate experiment id %r in group %r" % (source, spec["id"], spec["group"]))
+            group.append(spec)
+
+    def _validate(self, spec):
+        for key in ("id", "group", "description", "actions"):
+            if key not in spec:
+                raise CatalogError("%s: experiment %r has no %r" % (self.source, spec.get("id"), key))
+        sweep = spec.get("sweep")
+        if sweep is not None and not (
+            isinstance(sweep, dict) and sweep and all(isinstance(v, list) and v for v in sweep.values())
+        ):
+            raise CatalogError("%s: sweep of experiment %r must map names to lists of values" % (self.source, spec["id"]))
+        if "stopCondition" in spec and spec["stopCondition"] not in self.stop_conditions:
+            raise CatalogError(
+                "%s: experiment %r uses unknown stop condition %r" % (self.source, spec["id"], spec["stopCondition"])
+            )
+        targets = spec.get("targets", {})
+        for target_key, target_name in targets.items():
+            if target_name not in self.targets:
+                raise CatalogError("%s: experiment %r uses unknown target %r" % (self.source, spec["id"], target_name))
+        for action_key, action_name in spec["actions"].items():
+            if action_name not in self.actions:
+                raise CatalogError("%s: experiment %r uses unknown action %r" % (self.source, spec["id"], action_name))
+            for target_key in self.actions[action_name].get("targets", {}).values():
+                if target_key not in targets:
+                    raise CatalogError(
+                        "%s: action %r of experiment %r needs target %r" % (self.source, action_name, spec["id"], target_key)
+                    )
+
+    @property
+    def groups(self):
+        return sorted(self._groups)
+
+    def group(self, name):
+        return self._groups.get(name, [])
+
+    def context_keys(self, group):
+        """Context keys the ``${context:...}`` placeholders of ``group``'s
+        experiments read, plus the AZ and sweep settings."""
+        used = [self.defaults]
+        for spec in self.group(group):
+            used.append(spec)
+            used.extend(self.targets[name] for name in spec.get("targets", {}).values())
+            used.extend(self.actions[name] for name in spec["actions"].values())
+            if "stopCondition" in spec:
+                used.append(self.stop_conditions[spec["stopCondition"]])
+        keys = set(AZ_CONTEXT + SWEEP_CONTEXT)
+        for obj in used:
+            keys.update(_context_placeholders(obj))
+        return sorted(keys)
+
+    def sweep_points(self, spec):
+        """Grid points of ``spec``'s sweep in order (the last name varies
+        fastest); ``[{}]`` for an experiment without one."""
+        sweep = spec.get("sweep") or {}
+        return [dict(zip(sweep, values)) for values in itertools.product(*sweep.values())]
+
+
+@functools.lru_cache(maxsize=None)
+def _load_catalog(path, mtime_ns):
+    with open(path) as f:
+        data = yaml.load(f, Loader=_YamlLoader) or {}
+    return ExperimentCatalog(data, source=path)
+
+
+def load_catalog(path=DEFAULT_CATALOG):
+    """Parse ``path`` once per process (re-parsed only if the file changes)."""
+    path = os.path.abspath(path)
+    return _load_catalog(path, os.stat(path).st_mtime_ns)
+
+
+class CatalogCompiler:
+    """Turn catalog entries into CfnExperimentTemplate properties for one stack.
+
+    Targets, actions, stop conditions and ``Fn.import_value`` tokens are built
+    once per stack and the same objects are handed to every template that
+    references them, so adding templates adds only their own small dicts.
+    """
+
+    def __init__(self, stack, catalog, values=None, az=None, imports=None, point=None):
+        self.stack = stack
+        self.catalog = catalog
+        self.values = values or {}
+        self.point = point or {}
+        self._imports = {} if imports is None else imports
+        self._targets = {}
+        self._actions = {}
+        self._stop_conditions = {}
+        self._defaults = None
+        self._az = az
+
+    def for_az(self, az):
+        """A compiler filling ``${az}`` with ``az``, sharing import tokens."""
+        return CatalogCompiler(self.stack, self.catalog, self.values, az=az, imports=self._imports, point=self.point)
+
+    def for_point(self, point):
+        """A compiler filling ``${sweep:...}`` from the grid point ``point``."""
+        return CatalogCompiler(self.stack, self.catalog, self.values, az=self._az, imports=self._imports, point=point)
+
+    def availability_zones(self):
+        """Zones from -c availability_zones=a,b,c, else the stack's own
+        (looked up for env-specific stacks, two Fn::GetAZs picks otherwise)."""
+        zones = self.stack.node.try_get_context("availability_zones")
+        if isinstance(zones, str):
+            zones = [zone.strip() for zone in zones.split(",") if zone.strip()]
+        return list(zones or self.stack.availability_zones)
+
+    def az_mode(self):
+        mode = self.stack.node.try_get_context("az_mode") or DEFAULT_AZ_MODE
+        if mode not in AZ_MODES:
+            raise CatalogError("az_mode must be one of %s, not %r" % (", ".join(AZ_MODES), mode))
+        return mode
+
+    def rotated_az(self):
+        zones = self.availability_zones()
+        seed = "%s/%s" % (self.stack.node.try_get_context("az_rotation") or "", self.stack.node.path)
+        return zones[int(hashlib.sha256(seed.encode()).hexdigest(), 16) % len(zones)]
+
+    def sweep_selected(self, spec):
+        if "sweep" not in spec:
+            return True
+        sweeps = self.stack.node.try_get_context("sweeps") or ""
+        if isinstance(sweeps, str):
+            sweeps = [name.strip() for name in sweeps.split(",") if name.strip()]
+        return "all" in sweeps or spec["id"] in sweeps
+
+    def uses_az(self, spec):
+        return any(
+            _mentions_az(self.catalog.targets[name]) for name in spec.get("targets", {}).values()
+        ) or any(
+            _mentions_az(self.catalog.actions[name]) for name in spec["actions"].values()
+        )
+
+    # -- placeholders ----------------------------------------------------------
+
+    def _lookup(self, kind, arg):
+        if kind == "region":
+            return self.stack.region
+        if kind == "account":
+            return self.stack.account
+        if kind == "stack_name":
+            return self.stack.stack_name
+        if kind == "import":
+            if arg not in self._imports:
+                self._imports[arg] = cdk.Fn.import_value(arg)
+            return self._imports[arg]
+        if kind == "context":
+            arg, _, default = arg.partition("|")
+            value = self.stack.node.try_get_context(arg)
+            if value is None and default:
+                return default
+            if value is None:
+                cdk.Annotations.of(self.stack).add_warning("FIS catalog: context value %r is not set" % arg)
+                return ""
+            return str(value)
+        if kind == "value":
+            if arg not in self.values:
+                raise CatalogError("%s needs value %r from the stack" % (self.catalog.source, arg))
+            return str(self.values[arg])
+        if kind == "sweep":
+            if arg not in self.point:
+                raise CatalogError("%s: ${sweep:%s} outside a sweep over %s" % (self.catalog.source, arg, arg))
+            return str(self.point[arg])
+        if kind == "az":
+            if self._az is None:
+                self._az = self.rotated_az()
+            return self._az
+        raise CatalogError("%s: unknown placeholder ${%s}" % (self.catalog.source, kind))
+
+    def resolve(self, obj):
+        if isinstance(obj, str):
+            m = _PLACEHOLDER.fullmatch(obj)
+            if m:
+                return self._lookup(m.group(1), m.group(2))
+            return _PLACEHOLDER.sub(lambda m: self._lookup(m.group(1), m.group(2)), obj)
+        if isinstance(obj, dict):
+            resolved = {key: self.resolve(value) for key, value in obj.items()}
+            if isinstance(resolved.get("documentParameters"), dict):
+                resolved["documentParameters"] = json.dumps(resolved["documentParameters"])
+            return resolved
+        if isinstance(obj, list):
+            return [self.resolve(value) for value in obj]
+        return obj
+
+    # -- shared objects --------------------------------------------------------
+
+    def defaults(self):
+        if self._defaults is None:
+            self._defaults = self.resolve(self.catalog.defaults)
+        return self._defaults
+
+    def target(self, name):
+        if name not in self._targets:
+            self._targets[name] = self.resolve(self.catalog.targets[name])
+        return self._targets[name]
+
+    def action(self, name):
+        if name not in self._actions:
+            self._actions[name] = self.resolve(self.catalog.actions[name])
+        return self._actions[name]
+
+    def stop_conditions(self, spec):
+        if "stopConditions" in spec:
+            return self.resolve(spec["stopConditions"])
+        name = spec.get("stopCondition")
+        if name is None:
+            return self.defaults()["stopConditions"]
+        if name not in self._stop_conditions:
+            self._stop_conditions[name] = self.resolve(self.catalog.stop_conditions[name])
+        return self._stop_conditions[name]
+
+    def template_props(self, spec):
+        defaults = self.defaults()
+        tags = {
+            "Name": spec.get("name", spec["description"]),
+            "Stackname": self.stack.stack_name,
+        }
+        tags.update(self.resolve(spec.get("tags", {})))
+        return dict(
+            description=spec["description"],
+            role_arn=self.resolve(spec["roleArn"]) if "roleArn" in spec else defaults["roleArn"],
+            stop_conditions=self.stop_conditions(spec),
+            tags=tags,
+            actions={key: self.action(name) for key, name in spec["actions"].items()},
+            targets={key: self.target(name) for key, name in spec.get("targets", {}).items()},
+        )
+
+
+def _context_placeholders(obj):
+    if isinstance(obj, str):
+        return {m.group(2).partition("|")[0] for m in _PLACEHOLDER.finditer(obj) if m.group(1) == "context"}
+    if isinstance(obj, dict):
+        return set().union(*map(_context_placeholders, obj.values()))
+    if isinstance(obj, list):
+        return set().union(*map(_context_placeholders, obj))
+    return set()
+
+
+def _mentions_az(obj):
+    if isinstance(obj, str):
+        return "${az}" in obj
+    if isinstance(obj, dict):
+        return any(_mentions_az(value) for value in obj.values())
+    if isinstance(obj, list):
+        return any(_mentions_az(value) for value in obj)
+    return False
+
+
+def _az_label(az, index):
+    # Fn::GetAZs picks are tokens; name those templates by position
+    return az if not cdk.Token.is_unresolved(az) else "az%d" % (index + 1)
+
+
+def _point_label(point):
+    return "-".join("%s%s" % (name, value) for name, value in point.items())
+
+
+def add_experiments(stack, group, values=None, catalog=None):
+    """Add every catalog experiment of ``group`` to ``stack``.
+
+    ``values`` fills ``${value:...}`` placeholders with things only the stack
+    knows, e.g. names of resources it creates. Returns the templates by id;
+    in per-az mode experiments using ``${az}`` get one template per zone,
+    with the zone appended to their id, and a selected sweep gets one per
+    grid point, with the point appended and tagged Sweep, SweepPoint,
+    SweepAxes and Sweep:NAME for each coordinate. A sweep built per zone
+    has the zone as its outermost axis (Sweep:AvailabilityZone), so
+    SweepPoint numbers the points of all zones in run order.
+    """
+    catalog = catalog or load_catalog()
+    compiler = CatalogCompiler(stack, catalog, values)
+    per_az = compiler.az_mode() == "per-az"
+    zone_compilers = None
+    templates = {}
+    for spec in catalog.group(group):
+        if not compiler.sweep_selected(spec):
+            continue
+        if per_az and compiler.uses_az(spec):
+            if zone_compilers is None:
+                zone_compilers = [
+                    (_az_label(az, i), compiler.for_az(az)) for i, az in enumerate(compiler.availability_zones())
+                ]
+            zones = zone_compilers
+        else:
+            zones = [(None, compiler)]
+        grid = catalog.sweep_points(spec)
+        for zone_index, (zone_label, zone_compiler) in enumerate(zones):
+            for index, point in enumerate(grid):
+                point_compiler = zone_compiler.for_point(point) if point else zone_compiler
+                template_id = "-".join([spec["id"]] + [label for label in (zone_label, _point_label(point)) if label])
+                props = point_compiler.template_props(spec)
+                if zone_label:
+                    props["tags"]["AvailabilityZone"] = zone_label
+                if point:
+                    props["tags"]["Name"] += " (%s)" % ", ".join("%s=%s" % item for item in point.items())
+                    axes = dict([("AvailabilityZone", zone_label)] if zone_label else [], **point)
+                    props["tags"]["Sweep"] = spec["id"]
+                    props["tags"]["SweepPoint"] = str(zone_index * len(grid) + index)
+                    props["tags"]["SweepAxes"] = ",".join(axes)
+                    props["tags"].update(("Sweep:%s" % name, str(value)) for name, value in axes.items())
+                templates[template_id] = fis.CfnExperimentTemplate(stack, template_id, **props)
+    return templates
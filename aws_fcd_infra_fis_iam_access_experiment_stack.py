@@ -1,20 +1,14 @@
-import boto3
-from aws_cdk import (
-    aws_iam as iam,
-    aws_fis as fis,
-    core as cdk
-)
+import aws_cdk as cdk
+from aws_cdk import aws_iam as iam
+from constructs import Construct
+
+from aws_fcd_infra_fis_experiment_catalog import add_experiments
+
 
 class IamAccessExperiments(cdk.Stack):
-    def __init__(self, scope: cdk.Construct, id: str, **kwargs) -> None:
+    def __init__(self, scope: Construct, id: str, **kwargs) -> None:
         super().__init__(scope, id, **kwargs)
 
-        # Import FIS Role, Stop Condition, and other required parameters
-        importedFISRoleArn = cdk.Fn.import_value("FISIamRoleArn")
-        importedStopConditionArn = cdk.Fn.import_value("StopConditionArn")
-        importedSSMAIamAccessRoleArn = cdk.Fn.import_value("SSMAIamAccessRoleArn")
-        importedIamAccessSSMADocName = cdk.Fn.import_value("IamAccessSSMADocName")
-        importedTargetRoleName = self.node.try_get_context("target_role_name")
         importedS3BucketToDeny = self.node.try_get_context("s3-bucket-to-deny")
 
         # Create S3 Fault Policy
@@ -31,42 +25,9 @@ class IamAccessExperiments(cdk.Stack):
             ]
         )
 
-        # Actions
-start_automation = {
-    "actionId": "aws:ssm:start-automation-execution",
-    "description": "Deny Access to a S3 Resoure Type for a Role.",
-    "parameters": {
-        "documentArn": f"arn:aws:ssm:{self.region}:{self.account}:document/{importedIamAccessSSMADocName}",
-        "documentParameters": json.dumps({
-            "DurationMinutes": "PT1M",
-            "AutomationAssumeRole": importedSSMAIamAccessRoleArn,
-            "AccessDenyPolicyArn": f"arn:aws:iam::{self.account}:policy/{s3FaultPolicy.managedPolicyName}",
-            "TargetRoleName": importedTargetRoleName,
-        }),
-        "maxDuration": "PT5M",
-    },
-}
-
-# Experiments
-template_inject_s3_access_denied = fis.CfnExperimentTemplate(
-    self,
-    "fis-template-inject-s3-access-denied",
-    description="Deny Access to an S3 bucket via an IAM role",
-    role_arn=importedFISRoleArn,
-    stop_conditions=[
-        {
-            "source": "aws:cloudwatch:alarm",
-            "value": importedStopConditionArn,
-        },
-    ],
-    tags={
-        "Name": "Deny Access to an S3 bucket",
-        "Stackname": self.stack_name,
-    },
-    actions={
-        "ssmaAction": start_automation,
-    },
-    targets={},
-)
-
-
+        # Targets, actions and templates are defined in fis_experiments.yml
+        self.templates = add_experiments(
+            self,
+            "iam_access_faults",
+            values={"s3_fault_policy_name": s3_fault_policy.managed_policy_name},
+        )
@@ -0,0 +1,379 @@
+"""Fault injection for Lambda functions targeted by LambdaChaosExperiments.
+
+    from aws_fcd_infra_fis_lambda_chaos import inject_chaos
+
+    @inject_chaos("lambda-chaos-config")   # or CHAOS_PARAMETER_NAME
+    def handler(event, context):
+        ...
+
+The experiments write a JSON config into the SSM parameter named by
+-c ssm_parameter_name:
+
+    {"is_enabled": true, "fault_type": "latency", "delay": 1000,
+     "error_code": 404, "exception_msg": "This is chaos", "rate": 1}
+
+fault_type is latency (sleep ``delay`` ms, then run the handler),
+exception (raise ChaosException(exception_msg)) or status_code (return
+{"statusCode": error_code} without running the handler); ``rate`` is the
+fraction of invocations that get the fault. is_enabled must be a boolean or
+the string "true" or "false"; anything else leaves chaos disabled.
+
+Instead of a fixed ``delay`` a latency fault can draw each delay (ms) from
+a distribution given as ``latency``:
+
+    {"distribution": "percentiles", "percentiles": {"50": 80, "99": 900, "99.9": 3000}, "max": 5000}
+    {"distribution": "lognormal", "median": 80, "p99": 900}    (or "sigma": 1.05)
+    {"distribution": "pareto", "scale": 50, "shape": 1.5}
+
+optionally capped by "max". Its quantile function is cut into bins with
+edges at every given percentile (and at 1%, 0.1% and 0.01% steps into
+the tail for lognormal and Pareto); a sample picks a bin from an alias
+table and interpolates within it. So the injected p50/p99/p99.9 are
+exactly the specified ones, and a sample costs two random numbers.
+
+The parameter is cached per container for ``ttl`` seconds. Once it is
+older than ``refresh_after`` of that, an invocation starts a background
+refresh and carries on with the cached value, so GetParameter is off the
+request path unless the cache has fully expired (cold start, or a
+container idle for longer than ``ttl``). Failed refreshes keep the last
+good config. When the config is disabled the wrapper costs a clock read
+and an attribute check.
+
+Only the standard library and (lazily) boto3 are used, so the module can
+be copied into a function's deployment package as is.
+"""
+import bisect
+import functools
+import json
+import logging
+import math
+import os
+import random
+import statistics
+import threading
+import time
+
+DEFAULT_TTL = 60.0
+DEFAULT_REFRESH_AFTER = 0.8
+PARAMETER_ENV = "CHAOS_PARAMETER_NAME"
+FAULT_TYPES = ("latency", "exception", "status_code")
+DISTRIBUTIONS = ("percentiles", "lognormal", "pareto")
+
+# Quantile levels the parametric distributions are cut at: 1% bins to the
+# p99, then 0.1%, then 0.01%; the last bin ends at TAIL_QUANTILE (or "max")
+TAIL_QUANTILE = 1 - 1e-6
+QUANTILE_GRID = sorted(
+    {round(i / 100.0, 6) for i in range(100)} | {round(0.99 + i / 1000.0, 6) for i in range(10)}
+    | {round(0.999 + i / 10000.0, 6) for i in range(10)} | {TAIL_QUANTILE}
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ChaosException(Exception):
+    pass
+
+
+class AliasTable:
+    """Walker/Vose alias table: draws index i with probability
+    ``weights[i] / sum(weights)`` in constant time."""
+
+    def __init__(self, weights):
+        n = len(weights)
+        total = float(sum(weights))
+        scaled = [w * n / total for w in weights]
+        self.probability = [1.0] * n
+        self.alias = list(range(n))
+        small = [i for i, w in enumerate(scaled) if w < 1.0]
+        large = [i for i, w in enumerate(scaled) if w >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.probability[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        # Leftovers are 1 up to rounding
+        self.n = n
+
+    def pick(self, u):
+        """Index for a uniform ``u`` in [0, 1)."""
+        u *= self.n
+        i = int(u)
+        return i if u - i < self.probability[i] else self.alias[i]
+
+
+class LatencyDistribution:
+    """Piecewise-linear quantile function: ``quantiles`` ascending levels
+    from 0 to 1 (the last may be < 1) and the delay (ms) at each."""
+
+    def __init__(self, quantiles, values):
+        self.quantiles = quantiles
+        self.values = values
+        self.table = AliasTable([b - a for a, b in zip(quantiles, quantiles[1:])])
+        self._low = values[:-1]
+        self._width = [b - a for a, b in zip(values, values[1:])]
+
+    @classmethod
+    def parse(cls, spec):
+        if not isinstance(spec, dict):
+            raise ValueError("latency must be an object, not %r" % (spec,))
+        kind = spec.get("distribution")
+        cap = float(spec["max"]) if "max" in spec else None
+        if kind == "percentiles":
+            if not isinstance(spec.get("percentiles"), dict):
+                raise ValueError("latency percentiles must be an object of percentile: delay")
+            table = {float(str(k).lstrip("pP")) / 100.0: float(v) for k, v in spec["percentiles"].items()}
+            table.setdefault(0.0, float(spec.get("min", 0)))
+            if max(table) < 1.0:
+                table[1.0] = cap if cap is not None else table[max(table)]
+            quantiles = sorted(table)
+            values = [table[q] for q in quantiles]
+            if any(b < a for a, b in zip(values, values[1:])):
+                raise ValueError("latency percentiles must not decrease")
+        elif kind == "lognormal":
+            median = float(spec["median"])
+            if "sigma" in spec:
+                sigma = float(spec["sigma"])
+            else:
+                sigma = math.log(float(spec["p99"]) / median) / statistics.NormalDist().inv_cdf(0.99)
+            normal = statistics.NormalDist(math.log(median), sigma)
+            quantiles = QUANTILE_GRID
+            values = [0.0] + [math.exp(normal.inv_cdf(q)) for q in quantiles[1:]]
+        elif kind == "pareto":
+            scale, shape = float(spec["scale"]), float(spec["shape"])
+            quantiles = QUANTILE_GRID
+            values = [scale / (1.0 - q) ** (1.0 / shape) for q in quantiles]
+        else:
+            raise ValueError("latency distribution must be one of %s, not %r" % (", ".join(DISTRIBUTIONS), kind))
+        if cap is not None:
+            values = [min(v, cap) for v in values]
+        return cls(list(quantiles), values)
+
+    def sample(self, rng=random.random):
+        # AliasTable.pick, inlined
+        u = rng() * self.table.n
+        i = int(u)
+        if u - i >= self.table.probability[i]:
+            i = self.table.alias[i]
+        return self._low[i] + self._width[i] * rng()
+
+    def quantile(self, q):
+        """The delay at level ``q`` of the specified distribution."""
+        i = min(bisect.bisect_right(self.quantiles, q), len(self.quantiles) - 1)
+        a, b = self.quantiles[i - 1], self.quantiles[i]
+        return self.values[i - 1] + (self.values[i] - self.values[i - 1]) * (q - a) / (b - a)
+
+
+def _flag(value):
+    """A JSON boolean, or "true"/"false" in any case as hand-edited
+    parameters tend to have it."""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    raise ValueError("is_enabled must be true or false, not %r" % (value,))
+
+
+class ChaosConfig:
+    """A parsed chaos config; anything unusable parses as disabled."""
+
+    __slots__ = ("is_enabled", "fault_type", "delay", "error_code", "exception_msg", "rate", "latency")
+
+    def __init__(self, is_enabled=False, fault_type="latency", delay=0, error_code=500, exception_msg="Chaos", rate=1.0,
+                 latency=None):
+        self.is_enabled = _flag(is_enabled)
+        self.fault_type = fault_type
+        self.delay = float(delay)
+        self.error_code = int(error_code)
+        self.exception_msg = exception_msg
+        self.rate = min(1.0, max(0.0, float(rate)))
+        # Built once per config, i.e. once per refresh of the parameter
+        self.latency = LatencyDistribution.parse(latency) if latency else None
+
+    @classmethod
+    def parse(cls, value):
+        try:
+            data = json.loads(value)
+            config = cls(**{key: data[key] for key in cls.__slots__ if key in data})
+        except (TypeError, ValueError, KeyError, ZeroDivisionError) as e:
+            logger.warning("chaos config is not usable, chaos disabled: %s", e)
+            return DISABLED
+        if config.is_enabled and config.fault_type not in FAULT_TYPES:
+            logger.warning("unknown chaos fault_type %r, chaos disabled", config.fault_type)
+            return DISABLED
+        return config
+
+
+DISABLED = ChaosConfig()
+
+
+class ChaosConfigClient:
+    """The chaos config in SSM parameter ``parameter_name``, cached for
+    ``ttl`` seconds and refreshed in the background after ``refresh_after``
+    of that.
+
+    ``ssm`` is a boto3 SSM client (created on first use) or a stand-in
+    with the same ``get_parameter``; ``clock`` is injectable for tests.
+    """
+
+    def __init__(self, parameter_name, ttl=DEFAULT_TTL, refresh_after=DEFAULT_REFRESH_AFTER, ssm=None,
+                 clock=time.monotonic):
+        self.parameter_name = parameter_name
+        self.ttl = ttl
+        self.refresh_at = ttl * refresh_after
+        self.clock = clock
+        self._ssm = ssm
+        self._config = None
+        self._fetched = None
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self.fetches = 0
+        self.errors = 0
+
+    def _fetch(self):
+        if self._ssm is None:
+            import boto3
+
+            self._ssm = boto3.client("ssm")
+        self.fetches += 1
+        try:
+            value = self._ssm.get_parameter(Name=self.parameter_name)["Parameter"]["Value"]
+        except Exception as e:
+            self.errors += 1
+            logger.warning("reading chaos config %s failed: %s", self.parameter_name, e)
+            # Keep serving what we had; try again after another refresh period
+            with self._lock:
+                if self._config is None:
+                    self._config = DISABLED
+                self._fetched = self.clock()
+            return
+        try:
+            config = ChaosConfig.parse(value)
+        except Exception as e:
+            # parse handles what it expects; anything else must not reach
+            # the handler or make every invocation fetch again
+            self.errors += 1
+            logger.warning("chaos config %s is not usable, chaos disabled: %s", self.parameter_name, e)
+            config = DISABLED
+        with self._lock:
+            self._config = config
+            self._fetched = self.clock()
+
+    def _refresh(self):
+        try:
+            self._fetch()
+        finally:
+            self._refreshing = False
+
+    def get(self):
+        """The current config, fetched synchronously only if there is none
+        or it is older than ``ttl``."""
+        fetched = self._fetched
+        if fetched is not None:
+            age = self.clock() - fetched
+            if age < self.refresh_at:
+                return self._config
+            if age < self.ttl:
+                if not self._refreshing:
+                    with self._lock:
+                        start = not self._refreshing
+                        self._refreshing = True
+                    if start:
+                        threading.Thread(target=self._refresh, daemon=True).start()
+                return self._config
+        self._fetch()
+        return self._config
+
+
+_clients = {}
+
+
+def get_client(parameter_name, **kwargs):
+    """The container-wide client of ``parameter_name``, so the cache
+    survives across invocations."""
+    client = _clients.get(parameter_name)
+    if client is None:
+        client = _clients[parameter_name] = ChaosConfigClient(parameter_name, **kwargs)
+    return client
+
+
+def inject(config, handler, event, context, rng=random.random, sleep=time.sleep):
+    """Run ``handler`` with the fault of an enabled ``config`` applied."""
+    if config.rate < 1.0 and rng() >= config.rate:
+        return handler(event, context)
+    if config.fault_type == "latency":
+        delay = config.latency.sample() if config.latency else config.delay
+        if delay > 0:
+            sleep(delay / 1000.0)
+        return handler(event, context)
+    if config.fault_type == "exception":
+        raise ChaosException(config.exception_msg)
+    return {"statusCode": config.error_code}
+
+
+def inject_chaos(parameter_name=None, client=None, **kwargs):
+    """Decorator injecting the faults configured in ``parameter_name``
+    (default: $CHAOS_PARAMETER_NAME) into a Lambda handler."""
+
+    def decorate(handler):
+        chaos = client
+
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            nonlocal chaos
+            if chaos is None:
+                chaos = get_client(parameter_name or os.environ[PARAMETER_ENV], **kwargs)
+            config = chaos.get()
+            if not config.is_enabled:
+                return handler(event, context)
+            return inject(config, handler, event, context)
+
+        return wrapper
+
+    return decorate
+
+
+# -- local stand-in --------------------------------------------------------------
+
+class ThrottlingError(Exception):
+    def __init__(self, operation):
+        super().__init__("%s: Rate exceeded" % operation)
+        self.response = {"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}}
+
+
+class LocalSsm:
+    """In-process SSM Parameter Store stand-in: ``get_parameter`` takes
+    ``latency`` seconds and more than ``rate`` calls per second (``burst``
+    in a row) raise a throttling error, as GetParameter does past its
+    default throughput."""
+
+    def __init__(self, parameters=None, latency=0.0, rate=40.0, burst=40, clock=time.monotonic, sleep=time.sleep):
+        self.parameters = dict(parameters or {})
+        self.latency = latency
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = float(burst)
+        self._refilled = clock()
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.throttled = 0
+
+    def get_parameter(self, Name, WithDecryption=False):
+        with self._lock:
+            self.calls += 1
+            now = self.clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+            self._refilled = now
+            if self._tokens < 1:
+                self.throttled += 1
+                raise ThrottlingError("GetParameter")
+            self._tokens -= 1
+        if self.latency:
+            self.sleep(self.latency)
+        return {"Parameter": {"Name": Name, "Type": "String", "Value": self.parameters[Name]}}
+
+    def put_parameter(self, Name, Value, Type="String", Overwrite=True):
+        self.parameters[Name] = Value
+        return {"Version": 1}
@@ -0,0 +1,446 @@
+"""How fast does an ASG get its capacity back after an AZ is taken out?
+
+    python aws_fcd_infra_fis_recovery.py --asg web-asg --template EXT1a2b --record run.json
+    python aws_fcd_infra_fis_recovery.py --replay run.json
+    python aws_fcd_infra_fis_recovery.py --local --boot 60
+
+While templateTerminateInstanceASGAZ (or any experiment that takes
+instances out of an ASG) runs, the ASG's InService instances, the healthy
+targets of each of its target groups and the launch time of every new
+instance are sampled every --interval seconds, until capacity is back or
+--timeout passes. The report gives the time to the first replacement and
+to full capacity, and per replacement instance the launch (experiment
+start to LaunchTime), boot (to InService) and health check (to healthy in
+every target group) phases.
+
+Each sample keeps the raw API responses. --record writes them out and
+--replay reports on a recorded run, or on fixture responses, offline.
+InService and healthy times are as precise as the sampling interval;
+launch times come from EC2.
+"""
+import argparse
+import datetime
+import itertools
+import json
+import os
+import random
+import sys
+import time
+import uuid
+
+DEFAULT_INTERVAL = 10.0
+DEFAULT_TIMEOUT = 1800.0
+
+# Instances not yet visible to DescribeInstances right after launch
+_NOT_FOUND = ("InvalidInstanceID.NotFound", "InvalidInstanceID.Malformed")
+
+
+class RecoveryError(RuntimeError):
+    pass
+
+
+def _epoch(value):
+    """Seconds from a datetime, an ISO 8601 string (as recorded) or a number."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            value = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value.timestamp()
+
+
+class RecoverySampler:
+    """Samples one ASG through boto3 style autoscaling, elbv2 and ec2
+    clients. DescribeInstances is only called for instances not seen
+    before."""
+
+    def __init__(self, asg_name, autoscaling, elbv2, ec2, clock=time.time):
+        self.asg_name = asg_name
+        self.autoscaling = autoscaling
+        self.elbv2 = elbv2
+        self.ec2 = ec2
+        self.clock = clock
+        self._described = set()
+
+    def sample(self):
+        now = self.clock()
+        groups = self.autoscaling.describe_auto_scaling_groups(AutoScalingGroupNames=[self.asg_name])
+        if not groups["AutoScalingGroups"]:
+            raise RecoveryError("no auto scaling group %r" % self.asg_name)
+        group = groups["AutoScalingGroups"][0]
+        health = {arn: self.elbv2.describe_target_health(TargetGroupArn=arn) for arn in group.get("TargetGroupARNs", [])}
+        new = [i["InstanceId"] for i in group.get("Instances", []) if i["InstanceId"] not in self._described]
+        instances = None
+        if new:
+            try:
+                instances = self.ec2.describe_instances(InstanceIds=new)
+            except Exception as e:
+                if getattr(e, "response", {}).get("Error", {}).get("Code") not in _NOT_FOUND:
+                    raise
+            else:
+                self._described.update(new)
+        return {
+            "time": now,
+            "DescribeAutoScalingGroups": groups,
+            "DescribeTargetHealth": health,
+            "DescribeInstances": instances,
+        }
+
+
+def _summary(values):
+    if not values:
+        return None
+    values = sorted(values)
+    return {"min": values[0], "p50": values[(len(values) - 1) // 2], "max": values[-1]}
+
+
+class RecoveryTracker:
+    """Timeline of an ASG built from samples (live or recorded).
+
+    The first sample is the baseline. ``start`` is when the experiment was
+    started; without it the first sample in which a baseline instance is
+    no longer InService stands in for it.
+    """
+
+    def __init__(self, start=None):
+        self.start = _epoch(start)
+        self.start_observed = start is None
+        self.samples = 0
+        self.baseline = None
+        self.baseline_ids = set()
+        self.lost = set()
+        self.launched = {}
+        self.zones = {}
+        self.in_service_at = {}
+        self.healthy_at = {}
+        self.trough = None
+        self.recovered_at = None
+        # (time, healthy count) for the capacity lost while below baseline
+        self._healthy_counts = []
+
+    def observe(self, sample):
+        t = _epoch(sample["time"])
+        group = sample["DescribeAutoScalingGroups"]["AutoScalingGroups"][0]
+        members = {i["InstanceId"]: i for i in group.get("Instances", [])}
+        in_service = {iid for iid, i in members.items() if i["LifecycleState"] == "InService"}
+        registered = [
+            {d["Target"]["Id"] for d in response["TargetHealthDescriptions"] if d["TargetHealth"]["State"] == "healthy"}
+            for response in (sample.get("DescribeTargetHealth") or {}).values()
+        ]
+        healthy = set.intersection(in_service, *registered)
+        for reservation in (sample.get("DescribeInstances") or {}).get("Reservations", []):
+            for instance in reservation["Instances"]:
+                self.launched.setdefault(instance["InstanceId"], _epoch(instance["LaunchTime"]))
+        for iid, instance in members.items():
+            self.zones.setdefault(iid, instance.get("AvailabilityZone"))
+        self.samples += 1
+
+        if self.baseline is None:
+            self.baseline = {"time": t, "desired": group["DesiredCapacity"], "in_service": len(in_service),
+                             "healthy": len(healthy)}
+            self.baseline_ids = set(members)
+            self.in_service_at.update(dict.fromkeys(in_service, t))
+            self.healthy_at.update(dict.fromkeys(healthy, t))
+            self._healthy_counts.append((t, len(healthy)))
+            return
+        self.lost |= self.baseline_ids - in_service
+        if self.lost and self.start is None:
+            self.start = t
+        for iid in in_service:
+            self.in_service_at.setdefault(iid, t)
+        for iid in healthy:
+            self.healthy_at.setdefault(iid, t)
+        self._healthy_counts.append((t, len(healthy)))
+        if self.trough is None or len(healthy) < self.trough["healthy"]:
+            self.trough = {"time": t, "in_service": len(in_service), "healthy": len(healthy)}
+        if (self.lost and self.recovered_at is None and len(in_service) >= self.baseline["in_service"]
+                and len(healthy) >= self.baseline["healthy"]):
+            self.recovered_at = t
+
+    @property
+    def recovered(self):
+        return self.recovered_at is not None
+
+    def replacements(self):
+        """``{instance id: {"launched", "in_service", "healthy"}}`` seconds
+        from the start, None for phases not reached (yet)."""
+        start = self.start
+        found = {}
+        for iid in sorted(set(self.zones) - self.baseline_ids):
+            times = (self.launched.get(iid), self.in_service_at.get(iid), self.healthy_at.get(iid))
+            found[iid] = dict(zip(("launched", "in_service", "healthy"),
+                                  (None if t is None else t - start for t in times)))
+        return found
+
+    def capacity_loss(self):
+        """Instance-seconds below the baseline healthy count."""
+        if not self.baseline:
+            return 0.0
+        loss = 0.0
+        for (t, count), (t_next, _) in zip(self._healthy_counts, self._healthy_counts[1:]):
+            loss += max(0, self.baseline["healthy"] - count) * (t_next - t)
+        return loss
+
+    def report(self):
+        if self.baseline is None:
+            raise RecoveryError("no samples")
+        start = self.start
+        replacements = self.replacements() if start is not None else {}
+        first = {}
+        for phase in ("launched", "in_service", "healthy"):
+            reached = [r[phase] for r in replacements.values() if r[phase] is not None]
+            first[phase] = min(reached) if reached else None
+        phases = {
+            "launch": [r["launched"] for r in replacements.values() if r["launched"] is not None],
+            "boot": [r["in_service"] - r["launched"] for r in replacements.values()
+                     if r["in_service"] is not None and r["launched"] is not None],
+            "health_check": [r["healthy"] - r["in_service"] for r in replacements.values()
+                             if r["healthy"] is not None and r["in_service"] is not None],
+        }
+        times = [t for t, _ in self._healthy_counts]
+        return {
+            "baseline": self.baseline,
+            "start": start,
+            "start_observed": self.start_observed,
+            "lost": sorted(self.lost),
+            "lost_zones": sorted({self.zones.get(iid) for iid in self.lost} - {None}),
+            "trough": self.trough,
+            "time_to_first_replacement": first,
+            "time_to_full_capacity": None if self.recovered_at is None else self.recovered_at - start,
+            "phases": {name: _summary(values) for name, values in phases.items()},
+            "replacements": replacements,
+            "capacity_loss": self.capacity_loss(),
+            "samples": self.samples,
+            "interval": _summary([b - a for a, b in zip(times, times[1:])]),
+        }
+
+
+def track(sampler, tracker, sleep, interval=DEFAULT_INTERVAL, timeout=DEFAULT_TIMEOUT):
+    """Sample until the tracker has seen capacity come back or ``timeout``
+    seconds pass; returns the raw samples."""
+    deadline = sampler.clock() + timeout
+    samples = []
+    while True:
+        sample = sampler.sample()
+        samples.append(sample)
+        tracker.observe(sample)
+        if tracker.recovered or sampler.clock() >= deadline:
+            return samples
+        sleep(interval)
+
+
+def replay(recording):
+    """A RecoveryTracker fed with a recorded run (``{"start", "samples"}``)."""
+    tracker = RecoveryTracker(recording.get("start"))
+    for sample in recording["samples"]:
+        tracker.observe(sample)
+    return tracker
+
+
+class LocalAsg:
+    """ASG, target group and EC2 stand-in answering the calls
+    RecoverySampler makes, for --local runs and fixtures.
+
+    ``terminate_zone`` takes out every instance in a zone. The ASG notices
+    ``detect`` seconds later and launches the replacements ``launch_interval``
+    apart in the other zones; each boots for ``boot`` seconds and passes
+    the target group health check after ``health_check`` more, all varied
+    by +-``jitter``. ``replaced`` keeps the true timeline of each
+    replacement.
+    """
+
+    def __init__(self, name="web-asg", zones=("local-1a", "local-1b", "local-1c"), per_zone=2, clock=None,
+                 detect=30.0, launch_interval=2.0, boot=90.0, health_check=30.0, terminate=20.0, jitter=0.2, seed=0,
+                 target_group="arn:aws:elasticloadbalancing:local-1:123456789012:targetgroup/web/0123456789abcdef"):
+        self.name = name
+        self.zones = list(zones)
+        self.clock = clock or time.monotonic
+        self.detect = detect
+        self.launch_interval = launch_interval
+        self.boot = boot
+        self.health_check = health_check
+        self.terminate = terminate
+        self.jitter = jitter
+        self.target_group = target_group
+        self._random = random.Random(seed)
+        self._ids = itertools.count(1)
+        self.instances = {}
+        self.replaced = {}
+        self.calls = {}
+        now = self.clock()
+        for zone in self.zones:
+            for _ in range(per_zone):
+                self._launch(zone, now - 3600.0, ready=True)
+        self.desired = len(self.instances)
+
+    def _vary(self, seconds):
+        return seconds * (1.0 + self.jitter * self._random.uniform(-1.0, 1.0))
+
+    def _launch(self, zone, at, ready=False):
+        iid = "i-%017x" % next(self._ids)
+        in_service = at if ready else at + self._vary(self.boot)
+        healthy = in_service if ready else in_service + self._vary(self.health_check)
+        self.instances[iid] = {"zone": zone, "launched": at, "in_service": in_service, "healthy": healthy,
+                               "terminating": None, "gone": None}
+        return iid
+
+    def terminate_zone(self, zone, at=None):
+        at = self.clock() if at is None else at
+        lost = [iid for iid, i in self.instances.items() if i["zone"] == zone and i["terminating"] is None]
+        for iid in lost:
+            self.instances[iid].update(terminating=at, gone=at + self.terminate)
+        others = [z for z in self.zones if z != zone] or [zone]
+        for k in range(len(lost)):
+            iid = self._launch(others[k % len(others)], at + self.detect + k * self.launch_interval)
+            self.replaced[iid] = {phase: self.instances[iid][phase] - at for phase in ("launched", "in_service", "healthy")}
+        return lost
+
+    def _state(self, instance, now):
+        if now < instance["launched"] or (instance["gone"] is not None and now >= instance["gone"]):
+            return None
+        if instance["terminating"] is not None and now >= instance["terminating"]:
+            return "Terminating"
+        return "InService" if now >= instance["in_service"] else "Pending"
+
+    def _call(self, operation):
+        self.calls[operation] = self.calls.get(operation, 0) + 1
+
+    def describe_auto_scaling_groups(self, AutoScalingGroupNames):
+        self._call("DescribeAutoScalingGroups")
+        if self.name not in AutoScalingGroupNames:
+            return {"AutoScalingGroups": []}
+        now = self.clock()
+        instances = []
+        for iid, instance in self.instances.items():
+            state = self._state(instance, now)
+            if state:
+                instances.append({"InstanceId": iid, "AvailabilityZone": instance["zone"], "LifecycleState": state,
+                                  "HealthStatus": "Healthy" if state != "Terminating" else "Unhealthy"})
+        return {"AutoScalingGroups": [{
+            "AutoScalingGroupName": self.name,
+            "DesiredCapacity": self.desired,
+            "TargetGroupARNs": [self.target_group] if self.target_group else [],
+            "Instances": instances,
+        }]}
+
+    def describe_target_health(self, TargetGroupArn):
+        self._call("DescribeTargetHealth")
+        now = self.clock()
+        descriptions = []
+        for iid, instance in self.instances.items():
+            state = self._state(instance, now)
+            if state == "InService":
+                health = "healthy" if now >= instance["healthy"] else "initial"
+            elif state == "Terminating":
+                health = "draining"
+            else:
+                continue
+            descriptions.append({"Target": {"Id": iid, "Port": 80}, "TargetHealth": {"State": health}})
+        return {"TargetHealthDescriptions": descriptions}
+
+    def describe_instances(self, InstanceIds):
+        self._call("DescribeInstances")
+        return {"Reservations": [{"Instances": [
+            {"InstanceId": iid, "LaunchTime": self.instances[iid]["launched"],
+             "Placement": {"AvailabilityZone": self.instances[iid]["zone"]}}
+            for iid in InstanceIds
+        ]}]}
+
+
+# -- CLI -------------------------------------------------------------------------
+
+def _seconds(value):
+    return "-" if value is None else "%.0fs" % value
+
+
+def print_report(report):
+    baseline = report["baseline"]
+    print("baseline: desired %d, %d in service, %d healthy" % (baseline["desired"], baseline["in_service"], baseline["healthy"]))
+    if not report["lost"]:
+        print("no instance left service in %d samples" % report["samples"])
+        return
+    print("lost: %d instances in %s%s" % (len(report["lost"]), ", ".join(report["lost_zones"]) or "-",
+                                          " (start observed)" if report["start_observed"] else ""))
+    trough = report["trough"]
+    print("trough: %d in service, %d healthy at %s" % (
+        trough["in_service"], trough["healthy"], _seconds(trough["time"] - report["start"])))
+    first = report["time_to_first_replacement"]
+    print("first replacement: launched %s, in service %s, healthy %s" % (
+        _seconds(first["launched"]), _seconds(first["in_service"]), _seconds(first["healthy"])))
+    print("full capacity: %s" % (_seconds(report["time_to_full_capacity"]) if report["time_to_full_capacity"] is not None
+                                 else "not reached"))
+    for name, summary in report["phases"].items():
+        if summary:
+            print("  %-12s min %6s  p50 %6s  max %6s" % (
+                name, _seconds(summary["min"]), _seconds(summary["p50"]), _seconds(summary["max"])))
+    print("capacity lost: %.0f instance-seconds, %d samples every %s" % (
+        report["capacity_loss"], report["samples"], _seconds((report["interval"] or {}).get("p50"))))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--asg", help="name of the auto scaling group (-c asg_name)")
+    parser.add_argument("--template", help="start this experiment template and time recovery from its start")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL, help="seconds between samples")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="give up after this many seconds")
+    parser.add_argument("--record", metavar="PATH", help="write the raw samples here")
+    parser.add_argument("--replay", metavar="PATH", help="report on a recorded run instead of sampling")
+    parser.add_argument("--local", action="store_true", help="sample a stand-in ASG that loses one zone")
+    parser.add_argument("--boot", type=float, default=90.0, help="--local: seconds a replacement takes to boot")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--region", default=os.environ.get("AWS_REGION"))
+    args = parser.parse_args(argv)
+    if sum(map(bool, (args.asg, args.replay, args.local))) != 1:
+        parser.error("give one of --asg, --replay or --local")
+
+    if args.replay:
+        with open(args.replay) as f:
+            recording = json.load(f)
+        tracker = replay(recording)
+    else:
+        if args.local:
+            from aws_fcd_infra_fis_runner import VirtualClock
+
+            clock = VirtualClock()
+            asg = LocalAsg(clock=clock, boot=args.boot)
+            sampler = RecoverySampler(asg.name, asg, asg, asg, clock=clock)
+            sleep = clock.sleep
+            first = sampler.sample()
+            asg.terminate_zone(asg.zones[0])
+            start = clock()
+        else:
+            import boto3
+
+            sampler = RecoverySampler(args.asg, boto3.client("autoscaling", region_name=args.region),
+                                      boto3.client("elbv2", region_name=args.region),
+                                      boto3.client("ec2", region_name=args.region))
+            sleep = time.sleep
+            start = None
+            first = sampler.sample()
+            if args.template:
+                boto3.client("fis", region_name=args.region).start_experiment(
+                    experimentTemplateId=args.template, clientToken=str(uuid.uuid4()), tags={"Recovery": args.asg})
+                start = sampler.clock()
+        tracker = RecoveryTracker(start)
+        tracker.observe(first)
+        sleep(args.interval)
+        samples = [first] + track(sampler, tracker, sleep, args.interval, args.timeout)
+        recording = {"asg": sampler.asg_name, "template": args.template, "start": start, "samples": samples}
+
+    if args.record and not args.replay:
+        with open(args.record, "w") as f:
+            json.dump(recording, f, default=str)
+    report = tracker.report()
+    if args.json:
+        print(json.dumps(report, indent=2, default=str))
+    else:
+        print_report(report)
+    return 0 if tracker.recovered or not report["lost"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
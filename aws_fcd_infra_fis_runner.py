@@ -0,0 +1,600 @@
+"""Run deployed FIS experiment templates, several at a time.
+
+    python aws_fcd_infra_fis_runner.py --stack FISAsgExp07460552 --dry-run
+    python aws_fcd_infra_fis_runner.py --templates EXT1a2b,EXT3c4d --max-concurrent 3
+    python aws_fcd_infra_fis_runner.py --local cdk.out
+
+Experiments whose targets could touch the same resources never run at the
+same time. Each template's targets (resource type, tags, filters such as
+Placement.AvailabilityZone, ARNs) and the resources named in its SSM
+automation parameters are turned into footprints; two footprints conflict
+unless they are provably disjoint, e.g. the same tag or filter with
+different values. Everything else is started as soon as a slot is free.
+
+Status is polled for all running experiments with one paginated
+ListExperiments call per round. The interval backs off while nothing
+changes, and throttling errors back off exponentially with jitter.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import re
+import sys
+import time
+import uuid
+
+TERMINAL_STATES = ("completed", "stopped", "failed", "cancelled")
+THROTTLE_CODES = ("ThrottlingException", "Throttling", "TooManyRequestsException", "RequestLimitExceeded")
+
+DEFAULT_MAX_CONCURRENT = 4
+DEFAULT_POLL_INTERVAL = 5.0
+DEFAULT_MAX_POLL_INTERVAL = 60.0
+POLL_BACKOFF = 1.5
+THROTTLE_BASE = 1.0
+THROTTLE_RETRIES = 8
+
+# Resource types whose targets are (or run on) the same EC2 instances
+_DOMAINS = {
+    "aws:ec2:instance": "ec2-compute",
+    "aws:ec2:spot-instance": "ec2-compute",
+    "aws:eks:nodegroup": "ec2-compute",
+    "aws:eks:pod": "ec2-compute",
+    "aws:ecs:task": "ec2-compute",
+    "aws:iam:role": "iam-role",
+}
+
+# documentParameters of SSM automations that name what they change
+_PARAMETER_FOOTPRINTS = {
+    "TargetRoleName": ("iam-role", lambda v: {"arns": {"role/" + v}}),
+    "ParameterName": ("ssm-parameter", lambda v: {"arns": {v}}),
+    "SecurityGroupId": ("ec2-security-group", lambda v: {"arns": {v}}),
+    # A NACL fault cuts off every instance in the zone
+    "AvailabilityZone": ("ec2-compute", lambda v: {"filters": {"Placement.AvailabilityZone": {v}}}),
+}
+
+
+class RunnerError(RuntimeError):
+    pass
+
+
+def _error_code(e):
+    return getattr(e, "response", {}).get("Error", {}).get("Code")
+
+
+# -- footprints ----------------------------------------------------------------
+
+class Footprint:
+    """What one target (or automation) of a template may touch."""
+
+    def __init__(self, domain, tags=None, filters=None, arns=None):
+        self.domain = domain
+        self.tags = {key: {value} for key, value in (tags or {}).items()}
+        self.filters = {path: set(values) for path, values in (filters or {}).items()}
+        self.arns = set(arns) if arns else None
+
+    def overlaps(self, other):
+        if self.domain != other.domain:
+            return False
+        for key in self.tags.keys() & other.tags.keys():
+            if not self.tags[key] & other.tags[key]:
+                return False
+        for path in self.filters.keys() & other.filters.keys():
+            if not self.filters[path] & other.filters[path]:
+                return False
+        if self.arns is not None and other.arns is not None and not self.arns & other.arns:
+            return False
+        return True
+
+    def __repr__(self):
+        parts = [self.domain]
+        parts += ["%s=%s" % (k, "|".join(sorted(v))) for k, v in sorted(self.tags.items())]
+        parts += ["%s=%s" % (k, "|".join(sorted(v))) for k, v in sorted(self.filters.items())]
+        if self.arns:
+            parts.append("arns=" + "|".join(sorted(self.arns)))
+        return "<%s>" % " ".join(parts)
+
+
+# Tag on the instances of an EKS cluster, as the node group targets select them
+EKS_CLUSTER_TAG = "eksctl.cluster.k8s.io/v1alpha1/cluster-name"
+
+
+def _target_tags(target):
+    """resourceTags of a target; pods are keyed by their cluster's node tag,
+    so they conflict with node group faults on the same cluster only."""
+    tags = target.get("resourceTags")
+    cluster = (target.get("parameters") or {}).get("clusterIdentifier")
+    if target.get("resourceType") == "aws:eks:pod" and cluster:
+        tags = dict(tags or {}, **{EKS_CLUSTER_TAG: cluster})
+    return tags
+
+
+def _role_suffix(arn):
+    return "role/" + arn.rsplit("role/", 1)[-1] if "role/" in arn else arn
+
+
+def template_footprints(template):
+    """Footprints of an experiment template as returned by
+    GetExperimentTemplate (camelCase keys)."""
+    footprints = []
+    for target in template.get("targets", {}).values():
+        resource_type = target.get("resourceType", "")
+        domain = _DOMAINS.get(resource_type, resource_type)
+        filters = {f["path"]: f["values"] for f in target.get("filters", [])}
+        arns = target.get("resourceArns")
+        if domain == "iam-role" and arns:
+            arns = [_role_suffix(arn) for arn in arns]
+        footprints.append(Footprint(domain, _target_tags(target), filters, arns))
+    for action in template.get("actions", {}).values():
+        parameters = action.get("parameters", {})
+        document = parameters.get("documentParameters")
+        if isinstance(document, str):
+            try:
+                document = json.loads(document)
+            except ValueError:
+                document = None
+        for name, value in (document or {}).items():
+            if name in _PARAMETER_FOOTPRINTS and isinstance(value, str):
+                domain, fields = _PARAMETER_FOOTPRINTS[name]
+                footprints.append(Footprint(domain, **fields(value)))
+        if action.get("actionId") == "aws:ssm:put-parameter" and "name" in parameters:
+            footprints.append(Footprint("ssm-parameter", arns={parameters["name"]}))
+    return footprints
+
+
+def conflicts(a, b):
+    return any(fa.overlaps(fb) for fa in a for fb in b)
+
+
+def conflict_graph(footprints):
+    """``{template_id: set(conflicting template ids)}``."""
+    graph = {tid: set() for tid in footprints}
+    for a, b in itertools.combinations(footprints, 2):
+        if conflicts(footprints[a], footprints[b]):
+            graph[a].add(b)
+            graph[b].add(a)
+    return graph
+
+
+def plan_rounds(order, graph, max_concurrent):
+    """Greedy grouping in ``order`` into rounds of non-conflicting
+    templates; what a dry run prints."""
+    rounds = []
+    pending = list(order)
+    while pending:
+        chosen = []
+        for tid in pending:
+            if len(chosen) < max_concurrent and not graph[tid] & set(chosen):
+                chosen.append(tid)
+        rounds.append(chosen)
+        pending = [tid for tid in pending if tid not in chosen]
+    return rounds
+
+
+# -- runner --------------------------------------------------------------------
+
+class ExperimentRunner:
+    """Start templates through ``client`` (a boto3 FIS client or a
+    LocalFis) and wait for them, never running conflicting ones together.
+
+    ``sleep`` and ``clock`` are injectable so the runner can be driven by
+    the stand-in's virtual clock.
+    """
+
+    def __init__(self, client, max_concurrent=DEFAULT_MAX_CONCURRENT, poll_interval=DEFAULT_POLL_INTERVAL,
+                 max_poll_interval=DEFAULT_MAX_POLL_INTERVAL, sleep=time.sleep, clock=time.monotonic, log=None):
+        self.client = client
+        self.max_concurrent = max_concurrent
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.sleep = sleep
+        self.clock = clock
+        self.log = log or (lambda message: None)
+        self.api_calls = 0
+        self.throttled = 0
+
+    def _call(self, method, **kwargs):
+        for attempt in range(THROTTLE_RETRIES):
+            self.api_calls += 1
+            try:
+                return getattr(self.client, method)(**kwargs)
+            except Exception as e:
+                if _error_code(e) not in THROTTLE_CODES:
+                    raise
+                self.throttled += 1
+                self.sleep(min(self.max_poll_interval, THROTTLE_BASE * 2 ** attempt) * random.uniform(0.5, 1.0))
+        raise RunnerError("%s still throttled after %d attempts" % (method, THROTTLE_RETRIES))
+
+    def _paginate(self, method, key, **kwargs):
+        token = None
+        while True:
+            page = self._call(method, **dict(kwargs, nextToken=token) if token else kwargs)
+            yield from page.get(key, [])
+            token = page.get("nextToken")
+            if not token:
+                return
+
+    def list_templates(self):
+        return list(self._paginate("list_experiment_templates", "experimentTemplates", maxResults=100))
+
+    def describe(self, template_ids):
+        return {tid: self._call("get_experiment_template", id=tid)["experimentTemplate"] for tid in template_ids}
+
+    def _poll(self, running):
+        states = {}
+        for experiment in self._paginate("list_experiments", "experiments", maxResults=100):
+            if experiment["id"] in running:
+                states[experiment["id"]] = experiment["state"]
+                if len(states) == len(running):
+                    break
+        return states
+
+    def run(self, template_ids, templates=None):
+        """Run ``template_ids`` and return ``{template_id: final state}``."""
+        templates = templates or self.describe(template_ids)
+        graph = conflict_graph({tid: template_footprints(templates[tid]) for tid in template_ids})
+        queue = list(template_ids)
+        running = {}  # experiment id -> template id
+        results = {}
+        interval = self.poll_interval
+        started = self.clock()
+        while queue or running:
+            busy = set(running.values())
+            for tid in list(queue):
+                if len(running) >= self.max_concurrent:
+                    break
+                if graph[tid] & busy:
+                    continue
+                experiment = self._call(
+                    "start_experiment",
+                    experimentTemplateId=tid,
+                    clientToken=str(uuid.uuid4()),
+                    tags={"StartedBy": "aws_fcd_infra_fis_runner"},
+                )["experiment"]
+                running[experiment["id"]] = tid
+                busy.add(tid)
+                queue.remove(tid)
+                self.log("%8.0fs start  %s (%s)" % (self.clock() - started, tid, experiment["id"]))
+            if not running:
+                raise RunnerError("nothing can be started: %s" % ", ".join(queue))
+
+            self.sleep(interval)
+            changed = False
+            for experiment_id, state in self._poll(running).items():
+                if state["status"] in TERMINAL_STATES:
+                    tid = running.pop(experiment_id)
+                    results[tid] = state
+                    changed = True
+                    self.log("%8.0fs %-6s %s %s" % (self.clock() - started, state["status"], tid, state.get("reason", "")))
+            interval = self.poll_interval if changed else min(interval * POLL_BACKOFF, self.max_poll_interval)
+        return results
+
+
+# -- local stand-in --------------------------------------------------------------
+
+class ThrottlingError(Exception):
+    def __init__(self, operation):
+        super().__init__("%s: Rate exceeded" % operation)
+        self.response = {"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}}
+
+
+class VirtualClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+_DURATION = re.compile(r"^PT(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?$")
+
+
+def _seconds(value):
+    m = _DURATION.match(value or "")
+    if not m:
+        return 0
+    hours, minutes, seconds = (int(g or 0) for g in m.groups())
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def _resolve(value, region, exports):
+    """Best-effort resolution of CloudFormation intrinsics in a template."""
+    if isinstance(value, dict) and len(value) == 1:
+        (name, arg), = value.items()
+        if name == "Fn::Join":
+            return arg[0].join(str(_resolve(part, region, exports)) for part in arg[1])
+        if name == "Fn::Select":
+            options = _resolve(arg[1], region, exports)
+            return options[int(arg[0])] if isinstance(options, list) else options
+        if name == "Fn::GetAZs":
+            return [region + letter for letter in "abc"]
+        if name == "Fn::ImportValue":
+            return exports.get(arg, arg)
+        if name == "Ref":
+            return {"AWS::Region": region, "AWS::AccountId": "123456789012", "AWS::Partition": "aws"}.get(arg, arg)
+    if isinstance(value, dict):
+        return {k: _resolve(v, region, exports) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_resolve(v, region, exports) for v in value]
+    return value
+
+
+# Maps whose keys are names chosen by the user, not property names
+_VERBATIM_KEYS = ("ResourceTags", "Tags", "Parameters")
+
+
+def _camel(obj):
+    if isinstance(obj, dict):
+        return {
+            (k[0].lower() + k[1:] if k[:1].isupper() else k): dict(v) if k in _VERBATIM_KEYS and isinstance(v, dict) else _camel(v)
+            for k, v in obj.items()
+        }
+    if isinstance(obj, list):
+        return [_camel(v) for v in obj]
+    return obj
+
+
+class LocalFis:
+    """In-process FIS and EC2 stand-in exposing the boto3 FIS calls the
+    runner uses.
+
+    Templates come from a cloud assembly (``from_assembly``) or are added
+    directly. Experiments resolve their targets against a small inventory
+    of instances, roles, parameters and security groups and run for the
+    longest action duration on ``clock``. ``collisions`` records every
+    resource two running experiments touched at once, and more than
+    ``rate`` calls per second (``burst`` in a row) raise a throttling error
+    like the real API.
+    """
+
+    def __init__(self, inventory, clock=None, rate=5.0, burst=10):
+        self.inventory = inventory
+        self.clock = clock or time.monotonic
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._refilled = self.clock()
+        self.templates = {}
+        self.experiments = {}
+        self.calls = {}
+        self.throttled = 0
+        self.collisions = []
+        self._ids = itertools.count(1)
+
+    @classmethod
+    def from_assembly(cls, path, inventory, region="local-1", **kwargs):
+        from aws_fcd_infra_fis_deploy_planner import load_assembly
+
+        fis = cls(inventory, **kwargs)
+        stacks = load_assembly(path)
+        exports = {name: name for info in stacks.values() for name in info.exports}
+        for info in stacks.values():
+            for logical_id, resource in info.template.get("Resources", {}).items():
+                if resource["Type"] == "AWS::FIS::ExperimentTemplate":
+                    template = _camel(_resolve(resource["Properties"], region, exports))
+                    template["tags"]["aws:cloudformation:stack-name"] = info.stack_name
+                    template["tags"]["aws:cloudformation:logical-id"] = logical_id
+                    fis.add_template(template)
+        return fis
+
+    def add_template(self, template):
+        tid = "EXT%06d" % next(self._ids)
+        self.templates[tid] = dict(template, id=tid)
+        return tid
+
+    def _api(self, operation):
+        self.calls[operation] = self.calls.get(operation, 0) + 1
+        now = self.clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+        if self._tokens < 1:
+            self.throttled += 1
+            raise ThrottlingError(operation)
+        self._tokens -= 1
+
+    # FIS API subset
+
+    def list_experiment_templates(self, maxResults=100, nextToken=None):
+        self._api("ListExperimentTemplates")
+        ids = sorted(self.templates)
+        start = int(nextToken or 0)
+        page = [{"id": tid, "description": self.templates[tid].get("description"), "tags": self.templates[tid].get("tags", {})}
+                for tid in ids[start:start + maxResults]]
+        result = {"experimentTemplates": page}
+        if start + maxResults < len(ids):
+            result["nextToken"] = str(start + maxResults)
+        return result
+
+    def get_experiment_template(self, id):
+        self._api("GetExperimentTemplate")
+        return {"experimentTemplate": self.templates[id]}
+
+    def start_experiment(self, experimentTemplateId, clientToken=None, tags=None):
+        self._api("StartExperiment")
+        template = self.templates[experimentTemplateId]
+        resources = self.inventory.resolve(template)
+        now = self.clock()
+        for other in self.experiments.values():
+            if other["endTime"] > now:
+                for resource in sorted(resources & other["resources"]):
+                    self.collisions.append((experimentTemplateId, other["experimentTemplateId"], resource))
+        duration = max(
+            [_seconds(a.get("parameters", {}).get(k)) for a in template.get("actions", {}).values()
+             for k in ("duration", "maxDuration", "startInstancesAfterDuration")] + [60]
+        )
+        eid = "EXP%06d" % next(self._ids)
+        self.experiments[eid] = {
+            "id": eid,
+            "experimentTemplateId": experimentTemplateId,
+            "startTime": now,
+            "endTime": now + duration,
+            "resources": resources,
+            "tags": tags or {},
+        }
+        return {"experiment": self._describe(eid)}
+
+    def _describe(self, eid):
+        experiment = self.experiments[eid]
+        status = "completed" if self.clock() >= experiment["endTime"] else "running"
+        return {
+            "id": eid,
+            "experimentTemplateId": experiment["experimentTemplateId"],
+            "state": {"status": status, "reason": ""},
+            "tags": experiment["tags"],
+        }
+
+    def get_experiment(self, id):
+        self._api("GetExperiment")
+        return {"experiment": self._describe(id)}
+
+    def list_experiments(self, maxResults=100, nextToken=None):
+        self._api("ListExperiments")
+        ids = sorted(self.experiments, reverse=True)
+        start = int(nextToken or 0)
+        result = {"experiments": [self._describe(eid) for eid in ids[start:start + maxResults]]}
+        if start + maxResults < len(ids):
+            result["nextToken"] = str(start + maxResults)
+        return result
+
+
+class LocalInventory:
+    """EC2 instances, IAM roles, SSM parameters and security groups for
+    LocalFis to resolve experiment targets against."""
+
+    def __init__(self, instances=(), roles=(), parameters=(), security_groups=()):
+        self.instances = list(instances)
+        self.roles = set(roles)
+        self.parameters = set(parameters)
+        self.security_groups = set(security_groups)
+
+    @classmethod
+    def generate(cls, zones=("local-1a", "local-1b", "local-1c"), per_zone=4, vpc_id="vpc-0123456789abcdef0",
+                 asg_name="web-asg", eks_cluster_name="eks-main", roles=("app-role",),
+                 parameters=("lambda-chaos-config",), security_groups=("sg-0123456789abcdef0",)):
+        instances = []
+        for zone, i in itertools.product(zones, range(per_zone)):
+            tags = {"FIS-Ready": "true"}
+            if i % 2 == 0:
+                tags["aws:autoscaling:groupName"] = asg_name
+            if i % 4 == 3:
+                tags[EKS_CLUSTER_TAG] = eks_cluster_name
+            instances.append({
+                "InstanceId": "i-%s%03d" % (zone[-1], i),
+                "Placement.AvailabilityZone": zone,
+                "State.Name": "running",
+                "VpcId": vpc_id,
+                "Tags": tags,
+            })
+        return cls(instances, roles, parameters, security_groups)
+
+    def _instances(self, tags, filters):
+        for instance in self.instances:
+            if all(instance["Tags"].get(k) == v for k, v in (tags or {}).items()) and all(
+                instance.get(f["path"]) in f["values"] for f in filters or []
+            ):
+                yield instance["InstanceId"]
+
+    def resolve(self, template):
+        resources = set()
+        for target in template.get("targets", {}).values():
+            resource_type = target.get("resourceType")
+            if resource_type == "aws:iam:role":
+                resources |= {_role_suffix(arn) for arn in target.get("resourceArns", [])}
+            else:
+                # Nodegroups and pods resolve to their instances
+                found = list(self._instances(_target_tags(target), target.get("filters")))
+                count = re.match(r"COUNT\((\d+)\)", target.get("selectionMode", "ALL"))
+                resources |= set(found[:int(count.group(1))] if count else found)
+        for action in template.get("actions", {}).values():
+            parameters = action.get("parameters", {})
+            document = parameters.get("documentParameters")
+            document = json.loads(document) if isinstance(document, str) else (document or {})
+            if "AvailabilityZone" in document:
+                resources |= set(self._instances(None, [{"path": "Placement.AvailabilityZone", "values": [document["AvailabilityZone"]]}]))
+            if "TargetRoleName" in document:
+                resources.add("role/" + document["TargetRoleName"])
+            if "SecurityGroupId" in document:
+                resources.add(document["SecurityGroupId"])
+            if "ParameterName" in document:
+                resources.add(document["ParameterName"])
+            if action.get("actionId") == "aws:ssm:put-parameter":
+                resources.add(parameters.get("name"))
+        return resources
+
+
+# -- CLI -------------------------------------------------------------------------
+
+def _select(runner, args):
+    summaries = runner.list_templates()
+    if args.templates:
+        wanted = args.templates.split(",")
+        known = {t["id"] for t in summaries}
+        missing = [tid for tid in wanted if tid not in known]
+        if missing:
+            raise RunnerError("unknown templates: %s" % ", ".join(missing))
+        return wanted
+    selected = []
+    for summary in summaries:
+        tags = summary.get("tags", {})
+        if args.stack and tags.get("aws:cloudformation:stack-name") not in args.stack.split(","):
+            continue
+        if args.tag:
+            key, _, value = args.tag.partition("=")
+            if tags.get(key) != value:
+                continue
+        selected.append(summary["id"])
+    return selected
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--templates", help="comma separated experiment template ids")
+    parser.add_argument("--stack", help="templates deployed by these stacks (comma separated)")
+    parser.add_argument("--tag", help="templates with this tag, KEY=VALUE")
+    parser.add_argument("--max-concurrent", type=int, default=DEFAULT_MAX_CONCURRENT)
+    parser.add_argument("--poll", type=float, default=DEFAULT_POLL_INTERVAL, help="initial poll interval in seconds")
+    parser.add_argument("--max-poll", type=float, default=DEFAULT_MAX_POLL_INTERVAL)
+    parser.add_argument("--dry-run", action="store_true", help="print conflicts and the planned rounds, start nothing")
+    parser.add_argument("--local", metavar="ASSEMBLY", help="run against LocalFis loaded from a cloud assembly")
+    parser.add_argument("--region", default=os.environ.get("AWS_REGION"))
+    args = parser.parse_args(argv)
+
+    if args.local:
+        clock = VirtualClock()
+        client = LocalFis.from_assembly(args.local, LocalInventory.generate(), clock=clock)
+        runner = ExperimentRunner(client, args.max_concurrent, args.poll, args.max_poll, sleep=clock.sleep, clock=clock,
+                                  log=print)
+    else:
+        import boto3
+
+        client = boto3.client("fis", region_name=args.region)
+        runner = ExperimentRunner(client, args.max_concurrent, args.poll, args.max_poll,
+                                  log=lambda message: print(message, flush=True))
+
+    template_ids = _select(runner, args)
+    if not template_ids:
+        print("no templates selected")
+        return 1
+    templates = runner.describe(template_ids)
+    graph = conflict_graph({tid: template_footprints(templates[tid]) for tid in template_ids})
+    names = {tid: templates[tid].get("tags", {}).get("Name", templates[tid].get("description", "")) for tid in template_ids}
+    for tid in template_ids:
+        print("%s  %s\n    conflicts: %s" % (tid, names[tid], ", ".join(sorted(graph[tid])) or "-"))
+    for i, chosen in enumerate(plan_rounds(template_ids, graph, args.max_concurrent), 1):
+        print("round %d: %s" % (i, ", ".join(chosen)))
+    if args.dry_run:
+        return 0
+
+    results = runner.run(template_ids, templates)
+    failed = [tid for tid, state in results.items() if state["status"] != "completed"]
+    print("%d experiments, %d not completed, %d API calls (%d throttled)" % (
+        len(results), len(failed), runner.api_calls, runner.throttled))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+import functools
+import hashlib
+import os
+
+import yaml
+
+DEFAULT_DOCUMENTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "documents")
+EXTENSIONS = (".yml", ".yaml")
+
+try:
+    _YamlLoader = yaml.CSafeLoader
+except AttributeError:
+    _YamlLoader = yaml.SafeLoader
+
+# Parsed documents by SHA-256 of their bytes, shared by every registry
+_parsed = {}
+
+
+class SsmDocument:
+    def __init__(self, key, path, data):
+        self.key = key
+        self.path = path
+        self.digest = hashlib.sha256(data).hexdigest()
+        if self.digest not in _parsed:
+            _parsed[self.digest] = yaml.load(data, Loader=_YamlLoader)
+        self.content = _parsed[self.digest]
+
+    def name(self, prefix="FIS"):
+        """Stable document name. It is exported to the experiment stacks, so
+        it must not change when the content does (edits become new
+        versions of the same document instead)."""
+        return "%s-%s" % (prefix, self.key)
+
+
+class SsmDocumentRegistry:
+    """The SSM documents found in ``directory``, keyed by file name without
+    extension (``ssma-nacl-faults.yml`` -> ``ssma-nacl-faults``).
+
+    The directory is listed once; a file is read when it is first asked
+    for (or has changed since) and parsed only if its hash is new.
+    """
+
+    def __init__(self, directory=DEFAULT_DOCUMENTS_DIR):
+        self.directory = directory
+        self._paths = {}
+        try:
+            entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+        except FileNotFoundError:
+            entries = []
+        for entry in entries:
+            key, ext = os.path.splitext(entry.name)
+            if ext in EXTENSIONS and entry.is_file():
+                self._paths[key] = entry.path
+        self._documents = {}
+
+    def __contains__(self, key):
+        return key in self._paths
+
+    def keys(self):
+        return list(self._paths)
+
+    def get(self, key):
+        if key not in self._paths:
+            raise KeyError("no SSM document %r in %s (found: %s)" % (key, self.directory, ", ".join(self._paths) or "none"))
+        path = self._paths[key]
+        mtime_ns = os.stat(path).st_mtime_ns
+        cached = self._documents.get(key)
+        if cached is None or cached[0] != mtime_ns:
+            with open(path, "rb") as f:
+                cached = self._documents[key] = (mtime_ns, SsmDocument(key, path, f.read()))
+        return cached[1]
+
+
+@functools.lru_cache(maxsize=None)
+def _load_registry(directory, mtime_ns):
+    return SsmDocumentRegistry(directory)
+
+
+def load_registry(directory=DEFAULT_DOCUMENTS_DIR):
+    """Registry for ``directory``, listed once per process (again only if
+    files were added or removed)."""
+    directory = os.path.abspath(directory)
+    try:
+        mtime_ns = os.stat(directory).st_mtime_ns
+    except FileNotFoundError:
+        mtime_ns = None
+    return _load_registry(directory, mtime_ns)
@@ -1,36 +1,30 @@
-from aws_cdk import (
-    aws_cloudwatch as cw,
-    core as cdk,
-)
-from aws_cdk.core import (
-    Construct,
-    Stack,
-    StackProps,
-)
+import aws_cdk as cdk
+from constructs import Construct
 
+from aws_fcd_infra_fis_stop_conditions import SCOPES, add_stop_conditions
 
-class StopCondition(Stack):
-    def __init__(self, scope: Construct, id: str, props: StackProps = None):
-        super().__init__(scope, id, props)
-        # FIS Stop Condition
-        alarm = cw.Alarm(
-            self,
-            "cw-alarm",
-            alarm_name="NetworkInAbnormal",
-            metric=cw.Metric(
-                metric_name="NetworkIn",
-                namespace="AWS/EC2",
-            ).with_period(cdk.Duration.seconds(60)),
-            threshold=10,
-            evaluation_periods=1,
-            treat_missing_data=cw.TreatMissingData.NOT_BREACHING,
-            comparison_operator=cw.ComparisonOperator.LESS_THAN_THRESHOLD,
-            datapoints_to_alarm=1,
-        )
+
+class StopCondition(cdk.Stack):
+    def __init__(self, scope: Construct, id: str, **kwargs) -> None:
+        super().__init__(scope, id, **kwargs)
+        # FIS Stop Conditions: one composite alarm per scope (ASG, VPC, EKS
+        # node group) and one over all of them
+        self.alarm, self.scoped_alarms = add_stop_conditions(self)
         cdk.CfnOutput(
             self,
             "StopConditionArn",
-            value=alarm.alarm_arn,
+            value=self.alarm.alarm_arn,
             description="The Arn of the Stop-Conditioin CloudWatch Alarm",
             export_name="StopConditionArn",
         )
+        # Scopes without context fall back to the overall alarm, so every
+        # export the catalog imports exists
+        for name, (_, _, export_name) in SCOPES.items():
+            alarm = self.scoped_alarms.get(name, self.alarm)
+            cdk.CfnOutput(
+                self,
+                export_name,
+                value=alarm.alarm_arn,
+                description="The Arn of the %s Stop-Condition CloudWatch Alarm" % name,
+                export_name=export_name,
+            )
@@ -0,0 +1,202 @@
+"""Stop-condition alarms for the FIS experiments.
+
+For each scope the app knows about (the ASG, the VPC and the EKS node
+group, from the asg_name / vpc_id / eks_cluster_name context values) the
+StopCondition stack builds one alarm per signal and a composite alarm that
+goes off when any of them does:
+
+  network   traffic collapse: AWS/EC2 NetworkIn of the ASG, Container
+            Insights node traffic of the cluster, and for the VPC (EC2
+            publishes no VpcId dimension) NetworkIn of all instances.
+            These are 60s metrics; AWS does not publish them at higher
+            resolution.
+  latency   p99 of the application's Latency metric, 10s periods
+  errors    100 * Errors / Requests of the application, 10s periods
+
+Latency and error rate are read from the high-resolution metrics the
+application publishes (namespace -c app_metrics_namespace, default
+FIS/Application) with the scope's dimension: AutoScalingGroupName, VpcId
+or ClusterName. The VPC scope only watches them when app_metrics_namespace
+is set, since an application that doesn't publish them per VpcId would
+leave alarms that never fire. The 10s alarms fire on 2 of 3 breaching
+datapoints, so one noisy sample doesn't abort an experiment and a real
+breach aborts it within about 20-30 seconds.
+
+Without any scope context the overall alarm is the unscoped NetworkIn
+alarm, so the app still synthesizes with no context at all.
+
+``simulate_time_to_abort`` replays alarm evaluation for a step change in
+a signal, to compare configurations offline.
+"""
+import random
+
+import aws_cdk as cdk
+from aws_cdk import aws_cloudwatch as cw
+
+DEFAULT_APP_NAMESPACE = "FIS/Application"
+DEFAULT_NETWORK_IN_MIN = 10
+DEFAULT_LATENCY_MS = 500
+DEFAULT_ERROR_RATE_PERCENT = 5
+
+HIGH_RESOLUTION = dict(period=10, evaluation_periods=3, datapoints_to_alarm=2)
+STANDARD_RESOLUTION = dict(period=60, evaluation_periods=1, datapoints_to_alarm=1)
+
+# scope: context key naming the resource, metric dimension, export name
+SCOPES = {
+    "asg": ("asg_name", "AutoScalingGroupName", "StopConditionAsgArn"),
+    "vpc": ("vpc_id", "VpcId", "StopConditionVpcArn"),
+    "nodegroup": ("eks_cluster_name", "ClusterName", "StopConditionNodeGroupArn"),
+}
+
+# Context keys the StopCondition stack reads
+CONTEXT = [key for key, _, _ in SCOPES.values()] + [
+    "app_metrics_namespace", "stop_network_in_min", "stop_latency_ms", "stop_error_rate_percent",
+]
+
+
+def _context_number(stack, key, default):
+    value = stack.node.try_get_context(key)
+    return default if value is None else float(value)
+
+
+def _network_in(dimensions=None, statistic="Sum"):
+    return cw.Metric(namespace="AWS/EC2", metric_name="NetworkIn", dimensions_map=dimensions,
+                     statistic=statistic, period=cdk.Duration.seconds(STANDARD_RESOLUTION["period"]))
+
+
+def _signals(stack, scope, dimension, value):
+    """(name, metric or expression, threshold, comparison, resolution) of
+    the signals watched for one scope."""
+    configured_namespace = stack.node.try_get_context("app_metrics_namespace")
+    namespace = configured_namespace or DEFAULT_APP_NAMESPACE
+    dimensions = {dimension: value}
+    signals = []
+    if scope in ("asg", "vpc"):
+        signals.append((
+            "network",
+            _network_in(dimensions) if scope == "asg" else _network_in(statistic="Average"),
+            _context_number(stack, "stop_network_in_min", DEFAULT_NETWORK_IN_MIN),
+            cw.ComparisonOperator.LESS_THAN_THRESHOLD,
+            STANDARD_RESOLUTION,
+        ))
+    elif scope == "nodegroup":
+        signals.append((
+            "network",
+            cw.Metric(namespace="ContainerInsights", metric_name="node_network_total_bytes", dimensions_map=dimensions,
+                      statistic="Sum", period=cdk.Duration.seconds(STANDARD_RESOLUTION["period"])),
+            _context_number(stack, "stop_network_in_min", DEFAULT_NETWORK_IN_MIN),
+            cw.ComparisonOperator.LESS_THAN_THRESHOLD,
+            STANDARD_RESOLUTION,
+        ))
+    if scope == "vpc" and not configured_namespace:
+        return signals
+    period = cdk.Duration.seconds(HIGH_RESOLUTION["period"])
+    signals.append((
+        "latency",
+        cw.Metric(namespace=namespace, metric_name="Latency", dimensions_map=dimensions, statistic="p99", period=period),
+        _context_number(stack, "stop_latency_ms", DEFAULT_LATENCY_MS),
+        cw.ComparisonOperator.GREATER_THAN_THRESHOLD,
+        HIGH_RESOLUTION,
+    ))
+    signals.append((
+        "errors",
+        cw.MathExpression(
+            expression="IF(requests > 0, 100 * errors / requests, 0)",
+            using_metrics={
+                "errors": cw.Metric(namespace=namespace, metric_name="Errors", dimensions_map=dimensions,
+                                    statistic="Sum", period=period),
+                "requests": cw.Metric(namespace=namespace, metric_name="Requests", dimensions_map=dimensions,
+                                      statistic="Sum", period=period),
+            },
+            label="Error rate (%)",
+            period=period,
+        ),
+        _context_number(stack, "stop_error_rate_percent", DEFAULT_ERROR_RATE_PERCENT),
+        cw.ComparisonOperator.GREATER_THAN_THRESHOLD,
+        HIGH_RESOLUTION,
+    ))
+    return signals
+
+
+def add_stop_conditions(stack):
+    """Add the alarms to ``stack``.
+
+    Returns ``(composite alarm of everything, {scope: composite alarm})``.
+    Scopes whose context value isn't set are skipped; with none set the
+    first item is an unscoped NetworkIn alarm and the mapping is empty.
+    """
+    scoped = {}
+    for scope, (context_key, dimension, _) in SCOPES.items():
+        value = stack.node.try_get_context(context_key)
+        if not value:
+            continue
+        alarms = []
+        for name, metric, threshold, comparison, resolution in _signals(stack, scope, dimension, value):
+            alarms.append(cw.Alarm(
+                stack, "%s-%s" % (scope, name),
+                alarm_name="FIS-%s-%s-%s" % (stack.stack_name, scope, name),
+                metric=metric,
+                threshold=threshold,
+                comparison_operator=comparison,
+                evaluation_periods=resolution["evaluation_periods"],
+                datapoints_to_alarm=resolution["datapoints_to_alarm"],
+                treat_missing_data=cw.TreatMissingData.NOT_BREACHING,
+            ))
+        scoped[scope] = cw.CompositeAlarm(
+            stack, "%s-stop" % scope,
+            composite_alarm_name="FIS-%s-%s" % (stack.stack_name, scope),
+            alarm_description="Stop FIS experiments scoped to %s %s" % (dimension, value),
+            alarm_rule=cw.AlarmRule.any_of(*alarms),
+        )
+    if not scoped:
+        alarm = cw.Alarm(
+            stack, "cw-alarm",
+            alarm_name="NetworkInAbnormal",
+            metric=_network_in(statistic="Average"),
+            threshold=_context_number(stack, "stop_network_in_min", DEFAULT_NETWORK_IN_MIN),
+            comparison_operator=cw.ComparisonOperator.LESS_THAN_THRESHOLD,
+            evaluation_periods=STANDARD_RESOLUTION["evaluation_periods"],
+            datapoints_to_alarm=STANDARD_RESOLUTION["datapoints_to_alarm"],
+            treat_missing_data=cw.TreatMissingData.NOT_BREACHING,
+        )
+        return alarm, scoped
+    overall = cw.CompositeAlarm(
+        stack, "any-stop",
+        composite_alarm_name="FIS-%s" % stack.stack_name,
+        alarm_description="Stop FIS experiments: any scoped stop condition",
+        alarm_rule=cw.AlarmRule.any_of(*scoped.values()),
+    )
+    return overall, scoped
+
+
+# -- simulation ----------------------------------------------------------------
+
+def time_to_abort(breach_start, period, evaluation_periods, datapoints_to_alarm, breach_fraction=1.0,
+                  ingest_delay=0.0, reaction=0.0):
+    """Seconds from a signal stepping into breach at ``breach_start`` until
+    the alarm is in ALARM and FIS has reacted.
+
+    A datapoint covers ``[k * period, (k + 1) * period)`` and breaches once
+    at least ``breach_fraction`` of it is in breach: a p99 is pulled over
+    by a few slow requests, a Sum has to stay low for most of the period.
+    Datapoints are evaluated ``ingest_delay`` after their period ends; the
+    alarm fires when ``datapoints_to_alarm`` of the last
+    ``evaluation_periods`` breached. ``reaction`` covers composite alarm
+    propagation and FIS noticing the state change.
+    """
+    breached = []
+    k = int(breach_start // period)
+    while True:
+        start = k * period
+        covered = max(0.0, start + period - max(start, breach_start)) / period
+        breached.append(covered >= breach_fraction)
+        if sum(breached[-evaluation_periods:]) >= datapoints_to_alarm:
+            return start + period + ingest_delay + reaction - breach_start
+        k += 1
+
+
+def simulate_time_to_abort(samples=10000, seed=0, horizon=3600.0, **config):
+    """``time_to_abort`` for ``samples`` breach start times spread
+    uniformly over ``horizon``; returns the sorted durations."""
+    rng = random.Random(seed)
+    return sorted(time_to_abort(rng.uniform(0, horizon), **config) for _ in range(samples))
@@ -0,0 +1,225 @@
+"""Run a sweep grid point by point and record the service's latency at each.
+
+    cdk deploy -c sweeps=fis-sweep-CPU-stress-asg ...
+    python aws_fcd_infra_fis_sweep_runner.py --sweep fis-sweep-CPU-stress-asg \
+        --dimension AutoScalingGroupName=web-asg --output cpu-sweep.csv
+    python aws_fcd_infra_fis_sweep_runner.py --sweep fis-sweep-CPU-stress-asg --local cdk.out
+
+The templates of a sweep (tagged Sweep=ID, SweepPoint=N, SweepAxes and
+Sweep:NAME for each coordinate, see fis_experiments.yml) run one at a time in SweepPoint
+order. After each, and after an optional baseline window with no
+experiment, p50 and p99 of the service's latency metric over the
+experiment window are read from CloudWatch. The knee is the first point
+whose p99 exceeds --knee-factor times the baseline (or, without one, the
+first point's) p99. A sweep built with -c az_mode=per-az has the zone as
+its outermost axis: the grid runs zone by zone and each zone gets its own
+knee.
+"""
+import argparse
+import csv
+import datetime
+import itertools
+import math
+import os
+import sys
+import time
+
+from aws_fcd_infra_fis_runner import ExperimentRunner, LocalFis, LocalInventory, RunnerError, VirtualClock
+
+# The application metrics the StopCondition stack's latency alarms watch
+DEFAULT_APP_NAMESPACE = "FIS/Application"
+DEFAULT_METRIC = "Latency"
+DEFAULT_SETTLE = 60.0
+DEFAULT_KNEE_FACTOR = 2.0
+# Sweep axis of a grid built once per zone (az_mode per-az)
+ZONE_AXIS = "AvailabilityZone"
+
+
+def sweep_templates(templates, sweep):
+    """``[(template id, template)]`` of ``sweep`` in SweepPoint order."""
+    points = [(tid, t) for tid, t in templates.items() if t.get("tags", {}).get("Sweep") == sweep]
+    return sorted(points, key=lambda item: int(item[1]["tags"].get("SweepPoint", 0)))
+
+
+def coordinates(template):
+    """``{name: value}`` of a sweep point, in the grid's order (SweepAxes)."""
+    tags = template.get("tags", {})
+    names = tags["SweepAxes"].split(",") if "SweepAxes" in tags else sorted(
+        key[len("Sweep:"):] for key in tags if key.startswith("Sweep:"))
+    return {name: tags["Sweep:" + name] for name in names}
+
+
+class CloudWatchLatency:
+    """p50/p99 of a CloudWatch metric over a time window."""
+
+    def __init__(self, namespace=DEFAULT_APP_NAMESPACE, metric=DEFAULT_METRIC, dimensions=None, region=None):
+        import boto3
+
+        self.client = boto3.client("cloudwatch", region_name=region)
+        self.namespace = namespace
+        self.metric = metric
+        self.dimensions = [{"Name": k, "Value": v} for k, v in (dimensions or {}).items()]
+
+    def percentiles(self, template, start, end):
+        # One datapoint covering the whole window
+        period = max(60, int(math.ceil((end - start).total_seconds() / 60.0)) * 60)
+        datapoints = self.client.get_metric_statistics(
+            Namespace=self.namespace,
+            MetricName=self.metric,
+            Dimensions=self.dimensions,
+            StartTime=start,
+            EndTime=start + datetime.timedelta(seconds=period),
+            Period=period,
+            ExtendedStatistics=["p50", "p99"],
+        )["Datapoints"]
+        if not datapoints:
+            return None, None
+        # The window may straddle two periods; datapoints come in no order
+        stats = min(datapoints, key=lambda d: d["Timestamp"])["ExtendedStatistics"]
+        return stats.get("p50"), stats.get("p99")
+
+
+class LocalLatency:
+    """Latency of a stand-in service for --local runs: an M/M/1 queue whose
+    capacity CPU stress takes away (LoadPercent), plus injected network
+    delay and jitter (DelayMilliseconds, JitterMilliseconds)."""
+
+    def __init__(self, service_ms=20.0, utilization=0.2, stress_share=0.95):
+        self.service_ms = service_ms
+        self.utilization = utilization
+        self.stress_share = stress_share
+
+    def percentiles(self, template, start, end):
+        point = coordinates(template) if template else {}
+        capacity = 1.0 - float(point.get("LoadPercent", 0)) / 100.0 * self.stress_share
+        rho = min(0.99, self.utilization / capacity)
+        mean = self.service_ms / (1.0 - rho)
+        delay = float(point.get("DelayMilliseconds", 0))
+        jitter = float(point.get("JitterMilliseconds", 0))
+        # Response time of M/M/1 is exponential; jitter roughly normal
+        return mean * math.log(2) + delay, mean * math.log(100) + delay + 2.33 * jitter
+
+
+class SweepRunner:
+    """Run sweep points one at a time through an ExperimentRunner.
+
+    ``now`` gives the timestamps handed to ``metrics.percentiles``
+    (datetimes for CloudWatch); ``settle`` waits for the last datapoints
+    of a window to be published, ``cooldown`` lets the service recover
+    before the next point.
+    """
+
+    def __init__(self, runner, metrics, now=None, settle=DEFAULT_SETTLE, cooldown=0.0, log=None):
+        self.runner = runner
+        self.metrics = metrics
+        self.now = now or (lambda: datetime.datetime.now(datetime.timezone.utc))
+        self.settle = settle
+        self.cooldown = cooldown
+        self.log = log or (lambda message: None)
+
+    def baseline(self, seconds):
+        start = self.now()
+        self.runner.sleep(seconds + self.settle)
+        return self.metrics.percentiles(None, start, start + _delta(start, seconds))
+
+    def run(self, points):
+        """``points`` as returned by ``sweep_templates``; returns one row
+        per point: template id, coordinates, status, p50, p99."""
+        rows = []
+        for i, (tid, template) in enumerate(points):
+            if i and self.cooldown:
+                self.runner.sleep(self.cooldown)
+            start = self.now()
+            state = self.runner.run([tid], {tid: template})[tid]
+            end = self.now()
+            self.runner.sleep(self.settle)
+            p50, p99 = self.metrics.percentiles(template, start, end)
+            row = dict(template=tid, status=state["status"], p50=p50, p99=p99, **coordinates(template))
+            self.log("point %d/%d %s: %s p50=%s p99=%s" % (i + 1, len(points), tid, state["status"], _ms(p50), _ms(p99)))
+            rows.append(row)
+        return rows
+
+
+def _delta(start, seconds):
+    return datetime.timedelta(seconds=seconds) if isinstance(start, datetime.datetime) else seconds
+
+
+def _ms(value):
+    return "-" if value is None else "%.1f" % value
+
+
+def knee(rows, reference_p99, factor=DEFAULT_KNEE_FACTOR):
+    """First row whose p99 exceeds ``factor`` times ``reference_p99``."""
+    if reference_p99 is None:
+        return None
+    for row in rows:
+        if row["p99"] is not None and row["p99"] > factor * reference_p99:
+            return row
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sweep", required=True, help="id of the sweep experiment in the catalog")
+    parser.add_argument("--namespace", default=DEFAULT_APP_NAMESPACE)
+    parser.add_argument("--metric", default=DEFAULT_METRIC)
+    parser.add_argument("--dimension", action="append", default=[], help="NAME=VALUE, repeatable")
+    parser.add_argument("--baseline", type=float, default=0.0, help="seconds to measure before the first point")
+    parser.add_argument("--settle", type=float, default=DEFAULT_SETTLE, help="seconds to wait before reading metrics")
+    parser.add_argument("--cooldown", type=float, default=0.0, help="seconds between points")
+    parser.add_argument("--knee-factor", type=float, default=DEFAULT_KNEE_FACTOR)
+    parser.add_argument("--output", help="write the results as CSV")
+    parser.add_argument("--local", metavar="ASSEMBLY", help="run against LocalFis and a stand-in service")
+    parser.add_argument("--region", default=os.environ.get("AWS_REGION"))
+    args = parser.parse_args(argv)
+
+    if args.local:
+        clock = VirtualClock()
+        client = LocalFis.from_assembly(args.local, LocalInventory.generate(), clock=clock)
+        runner = ExperimentRunner(client, 1, sleep=clock.sleep, clock=clock)
+        sweep = SweepRunner(runner, LocalLatency(), now=clock, settle=args.settle, cooldown=args.cooldown, log=print)
+    else:
+        import boto3
+
+        dimensions = dict(d.split("=", 1) for d in args.dimension)
+        runner = ExperimentRunner(boto3.client("fis", region_name=args.region), 1, sleep=time.sleep)
+        metrics = CloudWatchLatency(args.namespace, args.metric, dimensions, args.region)
+        sweep = SweepRunner(runner, metrics, settle=args.settle, cooldown=args.cooldown,
+                            log=lambda message: print(message, flush=True))
+
+    summaries = runner.list_templates()
+    templates = runner.describe([s["id"] for s in summaries if s.get("tags", {}).get("Sweep") == args.sweep])
+    points = sweep_templates(templates, args.sweep)
+    if not points:
+        raise RunnerError("no templates tagged Sweep=%s; deploy them with -c sweeps=%s" % (args.sweep, args.sweep))
+
+    reference = None
+    if args.baseline:
+        p50, p99 = sweep.baseline(args.baseline)
+        print("baseline: p50=%s p99=%s" % (_ms(p50), _ms(p99)))
+        reference = p99
+    rows = sweep.run(points)
+
+    names = list(coordinates(points[0][1]))
+    print("\n" + "  ".join("%12s" % name for name in names) + "  %10s %10s  status" % ("p50 ms", "p99 ms"))
+    for row in rows:
+        print("  ".join("%12s" % row[name] for name in names) + "  %10s %10s  %s" % (
+            _ms(row["p50"]), _ms(row["p99"]), row["status"]))
+    for _, zone_rows in itertools.groupby(rows, key=lambda row: row.get(ZONE_AXIS)):
+        zone_rows = list(zone_rows)
+        zone_reference = reference if reference is not None else zone_rows[0]["p99"]
+        found = knee(zone_rows, zone_reference, args.knee_factor)
+        if found:
+            print("knee: %s (p99 %s > %.1f x %s)" % (
+                ", ".join("%s=%s" % (name, found[name]) for name in names), _ms(found["p99"]), args.knee_factor,
+                _ms(zone_reference)))
+    if args.output:
+        with open(args.output, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["template"] + names + ["status", "p50", "p99"])
+            writer.writeheader()
+            writer.writerows(rows)
+    return 1 if any(row["status"] != "completed" for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
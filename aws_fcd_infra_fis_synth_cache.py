@@ -0,0 +1,391 @@
+"""Content-hash synth cache for the FIS app.
+
+Each stack is registered through ``SynthCache.stack`` together with the
+inputs that determine its template: the modules it is built from, the
+context keys it reads and any files it loads (SSM documents, the experiment
+catalog). Modules are followed through their imports of other modules in
+the same directory, and context keys are collected from them: literal
+``try_get_context("NAME")`` calls and module-level ``*CONTEXT`` lists of
+names read dynamically. Keys only known at runtime (the catalog's
+placeholders) are passed in. Files are hashed under their path relative to
+the directory of the module that creates the cache, so checkouts in
+different places share keys, and cdk.json and cdk.context.json (feature
+flags, lookups) are part of every key.
+
+If a stack's key is already in the cache, only an empty stack with the same
+construct id is built, so ``add_dependency`` calls still work, and
+``SynthCache.synth`` swaps the cached template and manifest entries into the
+cloud assembly afterwards. When no stack missed the cache, the previous
+assembly is copied as a whole and the CDK synth step is skipped; that
+assembly is keyed on the stack keys, their order and dependencies, and the
+module creating the cache with everything it imports. The assembly gets a
+synth-cache.json listing which stacks were rebuilt and which were reused.
+Whether a stack differs from what is deployed is for the deploy planner to
+tell (``--changed-only --state``), not the cache.
+
+Stacks must reference each other through exports (``Fn.import_value``), as
+all FIS stacks do; CDK's automatic cross-stack references can't be replayed
+from a cached template.
+
+The cache is off with ``-c synth_cache=off`` (or FIS_SYNTH_CACHE=off) and
+lives in .fis-synth-cache unless ``-c synth_cache_dir=...`` says otherwise.
+Entries are touched whenever they are used;
+
+    python aws_fcd_infra_fis_synth_cache.py prune --days 7
+    python aws_fcd_infra_fis_synth_cache.py prune --all
+
+removes those not used for that long (or everything).
+"""
+import argparse
+import ast
+import glob
+import hashlib
+import importlib.metadata
+import inspect
+import json
+import os
+import shutil
+import sys
+import time
+
+import aws_cdk as cdk
+
+CACHE_FORMAT = 2
+DEFAULT_CACHE_DIR = ".fis-synth-cache"
+REPORT_FILE = "synth-cache.json"
+# Project files that change synth output without being imported
+PROJECT_FILES = ("cdk.json", "cdk.context.json")
+
+try:
+    _CDK_VERSION = importlib.metadata.version("aws-cdk-lib")
+except importlib.metadata.PackageNotFoundError:
+    _CDK_VERSION = "unknown"
+
+
+_digests = {}
+
+
+def _file_digest(path):
+    stat = os.stat(path)
+    cache_key = (path, stat.st_mtime_ns, stat.st_size)
+    if cache_key not in _digests:
+        with open(path, "rb") as f:
+            _digests[cache_key] = hashlib.sha256(f.read()).hexdigest()
+    return _digests[cache_key]
+
+
+def _feeder(h):
+    def feed(*parts):
+        for part in parts:
+            h.update(str(part).encode())
+            h.update(b"\0")
+
+    return feed
+
+
+def _module_file(module):
+    if isinstance(module, str):
+        module = sys.modules[module]
+    return os.path.abspath(inspect.getsourcefile(module))
+
+
+_scans = {}
+
+
+def _scan(path):
+    """``(local imports, literal try_get_context keys)`` of a source file;
+    local imports are files of modules in the same directory."""
+    stat = os.stat(path)
+    cache_key = (path, stat.st_mtime_ns, stat.st_size)
+    if cache_key not in _scans:
+        with open(path, "rb") as f:
+            tree = ast.parse(f.read(), path)
+        directory = os.path.dirname(path)
+        names, keys = set(), set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names.update(alias.name.split(".")[0] for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names.add(node.module.split(".")[0])
+            elif (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                  and node.func.attr == "try_get_context" and node.args
+                  and isinstance(node.args[0], ast.Constant) and isinstance(node.args[0].value, str)):
+                keys.add(node.args[0].value)
+        imports = set()
+        for name in names:
+            for candidate in (os.path.join(directory, name + ".py"), os.path.join(directory, name, "__init__.py")):
+                if os.path.isfile(candidate):
+                    imports.add(candidate)
+        _scans[cache_key] = (imports, keys)
+    return _scans[cache_key]
+
+
+def _declared_context(path):
+    """Names in the module-level ``*CONTEXT`` lists of ``path``'s module,
+    if it is imported."""
+    name = os.path.splitext(os.path.basename(path))[0]
+    module = sys.modules.get(name)
+    if module is None or getattr(module, "__file__", None) is None or os.path.abspath(module.__file__) != path:
+        return set()
+    keys = set()
+    for attr, value in vars(module).items():
+        if attr.endswith("CONTEXT") and isinstance(value, (list, tuple)) and all(isinstance(v, str) for v in value):
+            keys.update(value)
+    return keys
+
+
+def local_closure(paths):
+    """``(source files, context keys)`` of ``paths`` and of every module
+    of their directory they import, transitively."""
+    seen = set()
+    keys = set()
+    todo = list(paths)
+    while todo:
+        path = todo.pop()
+        if path in seen:
+            continue
+        seen.add(path)
+        imports, literal_keys = _scan(path)
+        keys |= literal_keys | _declared_context(path)
+        todo.extend(imports - seen)
+    return sorted(seen), keys
+
+
+class SynthCache:
+    def __init__(self, app, directory=None, enabled=None, caller=None):
+        self.app = app
+        # The module building the app (app.py): its stack wiring is part of
+        # the whole-assembly key, and paths in keys are relative to it
+        if caller is None:
+            caller = inspect.currentframe().f_back.f_code.co_filename
+        self.caller = os.path.abspath(caller)
+        self.root = os.path.dirname(self.caller)
+        if directory is None:
+            directory = app.node.try_get_context("synth_cache_dir") or os.environ.get("FIS_SYNTH_CACHE_DIR", DEFAULT_CACHE_DIR)
+        if enabled is None:
+            setting = str(app.node.try_get_context("synth_cache") or os.environ.get("FIS_SYNTH_CACHE", "on"))
+            enabled = setting.lower() not in ("off", "false", "0", "no")
+        self.directory = directory
+        self.enabled = enabled
+        self._hits = {}    # stack -> key
+        self._misses = {}  # stack -> key
+        self._order = []   # stacks as registered
+
+    def _relative(self, path):
+        return os.path.relpath(path, self.root).replace(os.sep, "/")
+
+    def _feed_files(self, feed, paths):
+        for path in paths:
+            feed(self._relative(path), _file_digest(path) if os.path.exists(path) else "missing")
+
+    def key(self, scope, cls, id, modules=(), context=None, files=(), kwargs=None):
+        """Hash of everything that goes into ``cls(scope, id, **kwargs)``."""
+        h = hashlib.sha256()
+        feed = _feeder(h)
+        feed(CACHE_FORMAT, _CDK_VERSION, cls.__module__, cls.__qualname__, scope.node.path, id)
+        paths, keys = local_closure({_module_file(inspect.getmodule(cls))} | {_module_file(m) for m in modules})
+        self._feed_files(feed, paths)
+        self._feed_files(feed, [os.path.join(self.root, name) for name in PROJECT_FILES])
+        if context is None:
+            context_values = self.app.node.get_all_context()
+        else:
+            context_values = {name: scope.node.try_get_context(name) for name in sorted(keys.union(context))}
+        feed(json.dumps(context_values, sort_keys=True, default=str))
+        for pattern in files:
+            self._feed_files(feed, [os.path.abspath(path) for path in sorted(glob.glob(pattern)) or [pattern]])
+        feed(json.dumps(kwargs or {}, sort_keys=True, default=repr))
+        return h.hexdigest()
+
+    def stack(self, cls, scope, id, modules=(), context=None, files=(), **kwargs):
+        """Build ``cls(scope, id, **kwargs)``, or an empty stand-in whose
+        template is restored from the cache by ``synth``.
+
+        ``modules`` are extra modules the stack's template depends on
+        (besides its own module and what that imports from this directory),
+        ``context`` context keys it reads that aren't found in those
+        modules (None: every context value) and ``files`` paths or glob
+        patterns of files it loads.
+        """
+        if not self.enabled:
+            return cls(scope, id, **kwargs)
+        key = self.key(scope, cls, id, modules, context, files, kwargs)
+        entry = os.path.join(self.directory, key, "entry.json")
+        if os.path.exists(entry):
+            os.utime(entry)
+            stack = cdk.Stack(scope, id, **{k: v for k, v in kwargs.items() if k in ("env", "stack_name", "description")})
+            # Replaced by the cached template; keeps synth validation quiet
+            cdk.CfnWaitConditionHandle(stack, "SynthCachePlaceholder")
+            self._hits[stack] = key
+        else:
+            stack = cls(scope, id, **kwargs)
+            self._misses[stack] = key
+        self._order.append(stack)
+        return stack
+
+    def _assembly_key(self):
+        h = hashlib.sha256()
+        feed = _feeder(h)
+        feed(CACHE_FORMAT, _CDK_VERSION)
+        keys = {**self._misses, **self._hits}
+        for stack in self._order:
+            feed(stack.node.path, keys[stack], *sorted(dep.node.path for dep in stack.dependencies))
+            feed("")
+        paths, _ = local_closure([self.caller])
+        self._feed_files(feed, paths)
+        self._feed_files(feed, [os.path.join(self.root, name) for name in PROJECT_FILES])
+        return h.hexdigest()
+
+    def synth(self, app=None):
+        """Synthesize ``app`` and patch cached stacks into the assembly.
+
+        Returns the assembly directory.
+        """
+        app = app or self.app
+        if not self.enabled:
+            return app.synth().directory
+        whole = os.path.join(self.directory, "assembly-" + self._assembly_key())
+        if not self._misses and os.path.isdir(whole):
+            os.utime(whole)
+            outdir = app.outdir
+            shutil.rmtree(outdir, ignore_errors=True)
+            shutil.copytree(whole, outdir)
+            self._write_report(outdir)
+            return outdir
+
+        outdir = app.synth().directory
+        manifest_path = os.path.join(outdir, "manifest.json")
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        artifacts = manifest["artifacts"]
+
+        for stack, key in self._misses.items():
+            self._store(outdir, artifacts, stack.artifact_id, key)
+        for stack, key in self._hits.items():
+            self._restore(outdir, artifacts, stack.artifact_id, key)
+
+        with open(manifest_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        tmp = whole + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        shutil.copytree(outdir, tmp)
+        shutil.rmtree(whole, ignore_errors=True)
+        os.replace(tmp, whole)
+        self._write_report(outdir)
+        return outdir
+
+    def _write_report(self, outdir):
+        with open(os.path.join(outdir, REPORT_FILE), "w") as f:
+            json.dump({
+                "rebuilt": sorted(stack.stack_name for stack in self._misses),
+                "reused": sorted(stack.stack_name for stack in self._hits),
+                "keys": {stack.stack_name: key for stack, key in {**self._misses, **self._hits}.items()},
+            }, f, indent=2, sort_keys=True)
+
+    def _related(self, artifacts, artifact_id):
+        """The stack artifact and the asset manifests it depends on."""
+        ids = [artifact_id]
+        for dep in artifacts[artifact_id].get("dependencies", []):
+            if artifacts.get(dep, {}).get("type") == "cdk:asset-manifest":
+                ids.append(dep)
+        return ids
+
+    def _files(self, outdir, artifacts, ids):
+        files = []
+        for artifact_id in ids:
+            artifact = artifacts[artifact_id]
+            props = artifact.get("properties", {})
+            for name in (props.get("templateFile"), props.get("file"), artifact.get("additionalMetadataFile")):
+                if name:
+                    files.append(name)
+            if artifact.get("type") == "cdk:asset-manifest":
+                with open(os.path.join(outdir, props["file"])) as f:
+                    asset_manifest = json.load(f)
+                for asset in asset_manifest.get("files", {}).values():
+                    files.append(asset["source"]["path"])
+        return sorted(set(files))
+
+    def _store(self, outdir, artifacts, artifact_id, key):
+        ids = self._related(artifacts, artifact_id)
+        target = os.path.join(self.directory, key)
+        tmp = target + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        files = self._files(outdir, artifacts, ids)
+        for name in files:
+            source = os.path.join(outdir, name)
+            if os.path.isdir(source):
+                shutil.copytree(source, os.path.join(tmp, name))
+            else:
+                shutil.copy2(source, os.path.join(tmp, name))
+        with open(os.path.join(tmp, "entry.json"), "w") as f:
+            json.dump({"artifacts": {i: artifacts[i] for i in ids}, "files": files}, f, indent=2)
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(tmp, target)
+
+    def _restore(self, outdir, artifacts, artifact_id, key):
+        source = os.path.join(self.directory, key)
+        with open(os.path.join(source, "entry.json")) as f:
+            entry = json.load(f)
+        # Drop the stand-in's own files and asset manifest
+        for name in self._files(outdir, artifacts, self._related(artifacts, artifact_id)):
+            path = os.path.join(outdir, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+        current_deps = set(artifacts[artifact_id].get("dependencies", []))
+        for i in self._related(artifacts, artifact_id)[1:]:
+            del artifacts[i]
+        for name in entry["files"]:
+            path = os.path.join(source, name)
+            if os.path.isdir(path):
+                shutil.copytree(path, os.path.join(outdir, name))
+            else:
+                shutil.copy2(path, os.path.join(outdir, name))
+        artifacts.update(entry["artifacts"])
+        # Keep dependencies declared in this run; forget stacks that are gone
+        deps = set(artifacts[artifact_id].get("dependencies", [])) | {d for d in current_deps if d in artifacts}
+        artifacts[artifact_id]["dependencies"] = sorted(d for d in deps if d in artifacts)
+
+
+def prune(directory=DEFAULT_CACHE_DIR, max_age=None, now=None):
+    """Remove cache entries and assemblies not used for ``max_age`` seconds
+    (all of them with None), and leftovers of interrupted writes. Returns
+    ``(entries removed, bytes freed)``."""
+    now = time.time() if now is None else now
+    removed = freed = 0
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return 0, 0
+    for name in names:
+        path = os.path.join(directory, name)
+        if not os.path.isdir(path):
+            continue
+        marker = os.path.join(path, "entry.json")
+        used = os.path.getmtime(marker if os.path.exists(marker) else path)
+        if name.endswith(".tmp") or max_age is None or now - used > max_age:
+            for root, _, files in os.walk(path):
+                freed += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    return removed, freed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    prune_parser = sub.add_parser("prune", help="remove cache entries not used recently")
+    prune_parser.add_argument("--dir", default=os.environ.get("FIS_SYNTH_CACHE_DIR", DEFAULT_CACHE_DIR))
+    age = prune_parser.add_mutually_exclusive_group()
+    age.add_argument("--days", type=float, default=7.0, help="keep entries used within this many days")
+    age.add_argument("--all", action="store_true", help="empty the cache")
+    args = parser.parse_args(argv)
+    removed, freed = prune(args.dir, None if args.all else args.days * 86400)
+    print("removed %d entries, %.1f MiB" % (removed, freed / 1048576.0))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
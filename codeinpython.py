@@ -1,63 +1,207 @@
-import boto3
+import base64
 import json
 import zlib
 import os
 import logging
-from splunk_http_event_collector import http_event_collector
+import random
+import time
+import requests
+from forwarder_decode import CloudWatchLogsStream
+from forwarder_batching import HecBatcher
+from forwarder_fanout import HecFanout, parse_endpoints
+from forwarder_routing import load_routing_table
+from forwarder_timestamps import TimestampParser
+from forwarder_spill import SpillQueue
+from forwarder_metrics import InvocationMetrics
 
 loggerConfig = {
     'url': os.environ['splunk_hec_url'],
+    # Optional 'url|weight|max_in_flight,...' list of indexer clusters
+    'urls': os.environ.get('splunk_hec_urls', ''),
+    'maxInFlight': int(os.environ.get('splunk_hec_max_in_flight', 4)),
     'token': os.environ['splunk_hec_token'],
-    'maxBatchCount': 0, # Manually flush events
-    'maxRetries': 3,    # Retry 3 times
+    'maxBatchBytes': int(os.environ.get('splunk_hec_max_batch_bytes', 512 * 1024)),
+    'maxBatchCount': int(os.environ.get('splunk_hec_max_batch_count', 1000)),
+    'maxRetries': 3,    # Retry each failed chunk 3 times
+    'retryBackoff': float(os.environ.get('splunk_hec_retry_backoff', 0.2)),
+    # gzip level 1-9 for HEC request bodies; unset sends them uncompressed
+    'gzipLevel': int(os.environ['splunk_hec_gzip_level']) if os.environ.get('splunk_hec_gzip_level') else None,
+    # e.g. /tmp/hec-spill; undeliverable chunks are parked there and re-sent
+    # on later warm invocations instead of failing the invocation
+    'spillPath': os.environ.get('splunk_hec_spill_path', ''),
+    'spillMaxBytes': int(os.environ.get('splunk_hec_spill_max_bytes', 256 * 1024 * 1024)),
+    'spillDrainRecords': int(os.environ.get('splunk_hec_spill_drain_records', 50)),
+    'spillDrainConcurrency': int(os.environ.get('splunk_hec_spill_drain_concurrency', 4)),
+    # Fraction of invocations that log the full incoming event (debug aid)
+    'debugEventSampleRate': float(os.environ.get('splunk_debug_event_sample_rate', 0)),
+    'emitMetrics': os.environ.get('splunk_forwarder_metrics', 'on') != 'off',
 }
 
-hec = http_event_collector(token=loggerConfig['token'], http_event_server=loggerConfig['url'])
+def hec_event_url(url):
+    # Accept either a bare host (as http_event_collector did) or a full URL
+    if '://' not in url:
+        url = 'https://%s:8088' % url
+    if '/services/collector' not in url:
+        url = url.rstrip('/') + '/services/collector/event'
+    return url
+
+hecUrl = hec_event_url(loggerConfig['url'])
+hecHeaders = {'Authorization': 'Splunk ' + loggerConfig['token']}
+if loggerConfig['gzipLevel'] is not None:
+    hecHeaders['Content-Encoding'] = 'gzip'
+hecEndpoints = parse_endpoints(loggerConfig['urls'] or hecUrl, loggerConfig['maxInFlight'])
+for endpoint in hecEndpoints:
+    endpoint.url = hec_event_url(endpoint.url)
+
+# Created once per container so warm invocations reuse pooled keep-alive
+# connections instead of paying a TCP and TLS handshake per request
+hecSession = requests.Session()
+hecAdapter = requests.adapters.HTTPAdapter(
+    pool_connections=len(hecEndpoints),
+    pool_maxsize=max(int(os.environ.get('splunk_hec_pool_size', 10)),
+                     max(endpoint.max_in_flight for endpoint in hecEndpoints)),
+)
+hecSession.mount('https://', hecAdapter)
+hecSession.mount('http://', hecAdapter)
+
+def post_to_hec(url, body, verify=True):
+    response = hecSession.post(url, headers=hecHeaders, data=body, verify=verify, timeout=10)
+    response.raise_for_status()
+
+# Sourcetype/index routing rules, compiled once per container
+routingTable = load_routing_table()
+
+# Chunks are spread over every endpoint concurrently, so an invocation takes
+# as long as its slowest chunk rather than the sum of all sends
+hecFanout = HecFanout(hecEndpoints, post_to_hec)
+
+def send_to_hec(body):
+    hecFanout.send(body)
+
+hecSpill = SpillQueue(loggerConfig['spillPath'], loggerConfig['spillMaxBytes']) if loggerConfig['spillPath'] else None
+
+def drain_spill(spill, send):
+    # Re-send what earlier invocations parked; if HEC still fails, skip
+    # straight to spilling this invocation's chunks too
+    if spill is None:
+        return False
+    sent, healthy = spill.drain(
+        send,
+        max_records=loggerConfig['spillDrainRecords'],
+        concurrency=loggerConfig['spillDrainConcurrency'],
+    )
+    if sent:
+        logging.getLogger().info('Re-sent {} spilled event(s)'.format(sent))
+    return not healthy
 
 def lambda_handler(event, context):
     logger = logging.getLogger()
     logger.setLevel(logging.INFO)
-    logger.info('Received event: ' + json.dumps(event, indent=2))
-    sourcetype = 'aws:cloudwatchlogs'
-    # CloudWatch Logs data is base64 encoded so decode here
-    payload = zlib.decompress(base64.b64decode(event['awslogs']['data']), 16+zlib.MAX_WBITS)
-    parsed = json.loads(payload)
-    if parsed['logGroup'] == 'AWS-CLOUD2-GD-SECURITY':
-        sourcetype = 'aws:cloudwatch:guardduty'
-    for logEvent in parsed['logEvents']:
-        event = {
-            'event': logEvent['message'],
-            'sourcetype': sourcetype,
-            'source': parsed['logStream'],
-            'time': logEvent['timestamp'] / 1000
-        }
-        hec.batchEvent(event)
-    hec.flushBatch()
+    if random.random() < loggerConfig['debugEventSampleRate']:
+        logger.info('Received event: ' + json.dumps(event, indent=2))
+    metrics = InvocationMetrics(getattr(context, 'function_name', None))
+    clock = time.perf_counter
+    route = None
+    # CloudWatch Logs data is base64 encoded gzip; decode it incrementally so
+    # only one log event is held in memory at a time
+    stream = CloudWatchLogsStream(event['awslogs']['data'])
+    metrics.input_bytes = len(event['awslogs']['data'])
+    # Flush whenever a chunk reaches the byte or event limit; only chunks that
+    # fail are retried
+    hec = HecBatcher(
+        send_to_hec,
+        spill=hecSpill,
+        circuit_open=drain_spill(hecSpill, send_to_hec),
+        max_bytes=loggerConfig['maxBatchBytes'],
+        max_events=loggerConfig['maxBatchCount'],
+        max_retries=loggerConfig['maxRetries'],
+        backoff=loggerConfig['retryBackoff'],
+        max_in_flight=hecFanout.max_in_flight,
+        compress_level=loggerConfig['gzipLevel'],
+    )
+    metrics.batcher = hec
+    logEvents = iter(stream)
+    try:
+        while True:
+            t0 = clock()
+            logEvent = next(logEvents, None)
+            t1 = clock()
+            metrics.decode += t1 - t0
+            if logEvent is None:
+                break
+            if route is None:
+                route = routingTable.route(stream.header['logGroup'], stream.header['logStream'])
+                metadata = {k: route[k] for k in ('index', 'host') if k in route}
+                metrics.properties['LogGroup'] = stream.header['logGroup']
+            event = {
+                'event': logEvent['message'],
+                'sourcetype': route['sourcetype'],
+                'source': route.get('source', stream.header['logStream']),
+                'time': logEvent['timestamp'] / 1000
+            }
+            event.update(metadata)
+            t2 = clock()
+            metrics.transform += t2 - t1
+            hec.add(event)
+            metrics.batch += clock() - t2
+            metrics.events += 1
+        t3 = clock()
+        try:
+            hec.close()
+        finally:
+            metrics.flush += clock() - t3
+    finally:
+        if loggerConfig['emitMetrics']:
+            metrics.emit()
 
 import json
 import time
 import requests
 
+sourcetype = 'aws:cloudwatchlogs'
+
+def send_legacy(body):
+    hecFanout.send(body, verify=False)
+
+legacySpill = SpillQueue(loggerConfig['spillPath'] + '.legacy', loggerConfig['spillMaxBytes']) if loggerConfig['spillPath'] else None
+
 def handler(event, context):
-    payload = event['awslogs']['data']
-    decoded = json.loads(json.loads(payload).decode('base64'))
+    payload = base64.b64decode(event['awslogs']['data'])
+    if payload[:2] == b'\x1f\x8b':
+        payload = zlib.decompress(payload, 16+zlib.MAX_WBITS)
+    decoded = json.loads(payload)
     count = 0
+    route = routingTable.route(decoded.get('logGroup', ''), decoded.get('logStream', ''))
+    # UTC, and only the sub-second part is parsed while events share a second
+    parseTimestamp = TimestampParser()
+    # Many events go out newline-delimited in one request over the pooled session
+    batch = HecBatcher(
+        send_legacy,
+        spill=legacySpill,
+        circuit_open=drain_spill(legacySpill, send_legacy),
+        max_bytes=loggerConfig['maxBatchBytes'],
+        max_events=loggerConfig['maxBatchCount'],
+        max_retries=loggerConfig['maxRetries'],
+        backoff=loggerConfig['retryBackoff'],
+        max_in_flight=hecFanout.max_in_flight,
+        compress_level=loggerConfig['gzipLevel'],
+    )
     if 'logEvents' in decoded:
         for item in decoded['logEvents']:
             if item['message'].strip() != "":
                 data = {
                     'message': item['message'],
                     'metadata': {
-                        'time': int(time.mktime(time.strptime(item['timestamp'], '%Y-%m-%dT%H:%M:%S.%fZ'))),
+                        'time': int(parseTimestamp(item['timestamp'])),
                         'host': 'serverless',
-                        'source': decoded['logGroup'],
-                        'sourcetype': sourcetype,
-                        'index': 'aws_cloudwatch'
+                        'source': route.get('source', decoded['logGroup']),
+                        'sourcetype': route.get('sourcetype', sourcetype),
+                        'index': route.get('index', 'aws_cloudwatch')
                     }
                 }
-                response = requests.post(url, headers=headers, data=json.dumps(data), verify=False)
-                response.raise_for_status()
+                batch.add(data)
             count += 1
+    batch.close()
     print('Successfully processed {} log event(s).'.format(count))
     return count
 	
@@ -0,0 +1,820 @@
+"""Benchmarks for the FIS CDK app.
+
+    python fis_bench.py synth --templates 15 100 300 600
+    python fis_bench.py deploy --workers 1 2 4 8
+    python fis_bench.py synth-cache
+    python fis_bench.py ssm-docs
+    python fis_bench.py startup --select all nacl,asg
+    python fis_bench.py runner --max-concurrent 4
+    python fis_bench.py stop-conditions
+    python fis_bench.py blast-radius --instances 1000 10000 100000
+    python fis_bench.py lambda-chaos
+    python fis_bench.py lambda-latency
+    python fis_bench.py recovery --boot 120 90 60 --interval 5 10 30
+
+Each measurement runs in a fresh interpreter so peak RSS of Python and of the
+jsii node process reflects that run only.
+"""
+import argparse
+import copy
+import importlib
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+
+CONTEXT = {
+    "vpc_id": "vpc-0123456789abcdef0",
+    "asg_name": "web-asg",
+    "eks_cluster_name": "eks-main",
+    "eks_pod_selector": "app=web",
+    "target_role_name": "app-role",
+    "security_group_id": "sg-0123456789abcdef0",
+    "ssm_parameter_name": "lambda-chaos-config",
+    "s3-bucket-to-deny": "app-bucket",
+}
+
+
+def _vm_hwm_kb(pid="self"):
+    try:
+        with open("/proc/%s/status" % pid) as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def _child_pids():
+    me = os.getpid()
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open("/proc/%s/stat" % entry) as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == me:
+            pids.append(entry)
+    return pids
+
+
+# -- synth -------------------------------------------------------------------
+
+def scaled_catalog(templates, per_stack=100):
+    """The bundled catalog with its experiments cloned up to ``templates``,
+    spread over groups of ``per_stack`` (CloudFormation caps resources per
+    stack)."""
+    from aws_fcd_infra_fis_experiment_catalog import DEFAULT_CATALOG, ExperimentCatalog
+    import yaml
+
+    with open(DEFAULT_CATALOG) as f:
+        data = yaml.safe_load(f)
+    base = [spec for spec in data["experiments"] if "sweep" not in spec]
+    experiments = []
+    for i in range(templates):
+        spec = copy.deepcopy(base[i % len(base)])
+        spec["id"] = "%s-%d" % (spec["id"], i)
+        spec["group"] = "bench_%d" % (i // per_stack)
+        experiments.append(spec)
+    data["experiments"] = experiments
+    return ExperimentCatalog(data, source="scaled:%d" % templates)
+
+
+def _synth_child(args):
+    import aws_cdk as cdk
+    from aws_fcd_infra_fis_experiment_catalog import add_experiments
+
+    catalog = scaled_catalog(args.child)
+    started = time.perf_counter()
+    app = cdk.App(context=CONTEXT, outdir=args.outdir)
+    for group in catalog.groups:
+        stack = cdk.Stack(app, group.replace("_", "-"))
+        add_experiments(stack, group, values={"s3_fault_policy_name": "bench-policy"}, catalog=catalog)
+    built = time.perf_counter()
+    assembly = app.synth()
+    done = time.perf_counter()
+    node_kb = sum(_vm_hwm_kb(pid) for pid in _child_pids())
+    print(json.dumps({
+        "templates": args.child,
+        "stacks": len(assembly.stacks),
+        "build_ms": (built - started) * 1000,
+        "synth_ms": (done - built) * 1000,
+        "python_rss_kb": _vm_hwm_kb(),
+        "node_rss_kb": node_kb,
+    }))
+
+
+def bench_synth(args):
+    import tempfile
+
+    print("%10s %7s %10s %10s %14s %14s %14s" % (
+        "templates", "stacks", "build ms", "synth ms", "ms/template", "python RSS MB", "node RSS MB"))
+    for templates in args.templates:
+        with tempfile.TemporaryDirectory() as outdir:
+            out = subprocess.run(
+                [sys.executable, __file__, "synth", "--child", str(templates), "--outdir", outdir],
+                check=True, capture_output=True, text=True,
+                env=dict(os.environ, JSII_SILENCE_WARNING_DEPRECATED_NODE_VERSION="1"),
+            ).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        print("%10d %7d %10.0f %10.0f %14.2f %14.1f %14.1f" % (
+            r["templates"], r["stacks"], r["build_ms"], r["synth_ms"],
+            (r["build_ms"] + r["synth_ms"]) / r["templates"],
+            r["python_rss_kb"] / 1024, r["node_rss_kb"] / 1024,
+        ))
+
+
+# -- deploy ------------------------------------------------------------------
+
+# Exports of the FisLogs/FisRole/FisSsmDocs/StopCondition stacks that the
+# experiment stacks import, by the stack that owns them
+CORE_EXPORTS = {
+    "FisLogs": ["fisLogGroupArn", "fisS3BucketArn", "fisS3BucketName"],
+    "FisRole": ["FISIamRoleArn"],
+    "FisSsmDocs": [
+        "NaclSSMADocName", "SecGroupSSMADocName", "IamAccessSSMADocName", "PutParameterStoreSSMADocName",
+        "SSMANaclRoleArn", "SSMASecGroupRoleArn", "SSMAIamAccessRoleArn", "SSMAPutParameterStoreRoleArn",
+    ],
+    "StopCond": ["StopConditionArn", "StopConditionAsgArn", "StopConditionVpcArn", "StopConditionNodeGroupArn"],
+}
+
+
+def _core_stand_in_class():
+    import aws_cdk as cdk
+    from aws_cdk import aws_logs as logs
+
+    class CoreStandIn(cdk.Stack):
+        def __init__(self, scope, id, exports, **kwargs):
+            super().__init__(scope, id, **kwargs)
+            for i in range(len(exports) * 2):
+                logs.CfnLogGroup(self, "Resource%d" % i)
+            for export in exports:
+                cdk.CfnOutput(self, export, value=export, export_name=export)
+
+    return CoreStandIn
+
+
+def synth_fis_assembly(outdir, context=CONTEXT, cache_dir=None):
+    """The stack graph of app.py: stand-ins for the core stacks with their
+    exports and resource counts, the eight experiment stacks after them.
+    With ``cache_dir`` stacks go through the synth cache like in app.py."""
+    import aws_cdk as cdk
+    import aws_fcd_infra_fis_experiment_catalog as catalog
+    from aws_fcd_infra_fis_synth_cache import SynthCache
+    from app import EXPERIMENT_STACKS
+
+    experiment_stacks = [
+        (getattr(importlib.import_module(module), class_name), stack_id, group)
+        for module, class_name, stack_id, group, _ in EXPERIMENT_STACKS.values()
+    ]
+    app = cdk.App(context=context, outdir=outdir)
+    cache = SynthCache(app, directory=cache_dir, enabled=cache_dir is not None)
+    fis = cdk.Stack(app, "FIS")
+    core_stand_in = _core_stand_in_class()
+    core = {
+        name: cache.stack(core_stand_in, fis, name, context=[], exports=exports)
+        for name, exports in CORE_EXPORTS.items()
+    }
+    core["FisRole"].add_dependency(core["FisLogs"])
+    for cls, stack_id, group in experiment_stacks:
+        stack = cache.stack(
+            cls, fis, stack_id, context=catalog.load_catalog().context_keys(group), files=[catalog.DEFAULT_CATALOG],
+        )
+        stack.add_dependency(core["FisRole"])
+        stack.add_dependency(core["StopCond"])
+        stack.add_dependency(core["FisSsmDocs"])
+    return cache.synth(app)
+
+
+def bench_deploy(args):
+    import tempfile
+    from aws_fcd_infra_fis_deploy_planner import (
+        LocalCloudFormation, _critical_priority, deploy, estimate_durations, estimate_wall_time,
+        load_assembly, plan_waves,
+    )
+
+    with tempfile.TemporaryDirectory() as outdir:
+        subprocess.run(
+            [sys.executable, __file__, "deploy", "--synth-to", outdir],
+            check=True, capture_output=True,
+            env=dict(os.environ, JSII_SILENCE_WARNING_DEPRECATED_NODE_VERSION="1"),
+        )
+        stacks = load_assembly(outdir)
+    durations = estimate_durations(stacks)
+    waves = plan_waves(stacks)
+    print("%d stacks in %d waves: %s" % (len(stacks), len(waves), " | ".join(", ".join(w) for w in waves)))
+    print("%8s %12s %12s %12s %14s" % ("workers", "estimated s", "measured s", "max running", "speed-up"))
+    serial = None
+    for workers in args.workers:
+        estimated, _, _ = estimate_wall_time(stacks, durations, workers)
+        cfn = LocalCloudFormation(speed=args.speed)
+        result = deploy(stacks, cfn, workers=workers, priority=_critical_priority(stacks, durations))
+        assert result.ok, result.failed
+        measured = result.wall / args.speed
+        serial = serial or measured
+        print("%8d %12.0f %12.0f %12d %13.1fx" % (workers, estimated, measured, cfn.max_in_flight, serial / measured))
+
+
+def _synth_cache_child(args):
+    context = dict(CONTEXT)
+    if args.child == "one-changed":
+        context["asg_name"] = "web-asg-v2"
+    started = time.perf_counter()
+    synth_fis_assembly(args.outdir, context=context, cache_dir=args.cache)
+    elapsed = time.perf_counter() - started
+    report = os.path.join(args.outdir, "synth-cache.json")
+    rebuilt = None
+    if os.path.exists(report):
+        with open(report) as f:
+            rebuilt = len(json.load(f)["rebuilt"])
+    print(json.dumps({"synth_ms": elapsed * 1000, "rebuilt": rebuilt}))
+
+
+def bench_synth_cache(args):
+    import tempfile
+    from aws_fcd_infra_fis_deploy_planner import load_assembly
+
+    env = dict(os.environ, JSII_SILENCE_WARNING_DEPRECATED_NODE_VERSION="1")
+    print("%-14s %10s %10s %10s" % ("run", "synth ms", "rebuilt", "stacks"))
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = os.path.join(tmp, "cache")
+        runs = [("no cache", None), ("cold", cache), ("warm", cache), ("one-changed", cache)]
+        templates = {}
+        for run, cache_dir in runs:
+            outdir = os.path.join(tmp, run.replace(" ", "-"))
+            command = [sys.executable, __file__, "synth-cache", "--child", run, "--outdir", outdir]
+            if cache_dir:
+                command += ["--cache", cache_dir]
+            out = subprocess.run(command, check=True, capture_output=True, text=True, env=env).stdout
+            r = json.loads(out.strip().splitlines()[-1])
+            stacks = load_assembly(outdir)
+            templates[run] = {name: info.template for name, info in stacks.items()}
+            print("%-14s %10.0f %10s %10d" % (run, r["synth_ms"], "-" if r["rebuilt"] is None else r["rebuilt"], len(stacks)))
+        # Cached templates are the ones an uncached synth produces
+        assert templates["warm"] == templates["no cache"]
+
+
+# -- ssm-docs ----------------------------------------------------------------
+
+def synth_automation_document(steps):
+    """An SSM Automation document shaped like the documents/ ones, with
+    ``steps`` branch/API/sleep steps."""
+    main_steps = []
+    for i in range(steps):
+        main_steps.append({
+            "name": "step%d" % i,
+            "action": "aws:executeAwsApi",
+            "onFailure": "step:rollback%d" % i,
+            "inputs": {
+                "Service": "ec2",
+                "Api": "DescribeNetworkAcls",
+                "Filters": [{"Name": "vpc-id", "Values": ["{{ VPCId }}"]}, {"Name": "default", "Values": ["false"]}],
+            },
+            "outputs": [{"Name": "NetworkAclId%d" % i, "Selector": "$.NetworkAcls[0].NetworkAclId", "Type": "String"}],
+        })
+        main_steps.append({"name": "rollback%d" % i, "action": "aws:sleep", "inputs": {"Duration": "PT1S"}})
+    return {
+        "description": "Benchmark automation document",
+        "schemaVersion": "0.3",
+        "assumeRole": "{{ AutomationAssumeRole }}",
+        "parameters": {
+            "AvailabilityZone": {"type": "String", "description": "(Required) The Availability Zone to impact"},
+            "VPCId": {"type": "String", "description": "(Required) The VPC ID"},
+            "AutomationAssumeRole": {"type": "String", "description": "(Required) The ARN of the role"},
+        },
+        "mainSteps": main_steps,
+    }
+
+
+def bench_ssm_docs(args):
+    import tempfile
+    import yaml
+    from aws_fcd_infra_fis_ssm_document_registry import SsmDocumentRegistry
+
+    names = ["ssma-nacl-faults", "security-groups-faults", "iam-access-faults", "ssma-put-config-parameterstore"]
+    with tempfile.TemporaryDirectory() as directory:
+        for name in names:
+            with open(os.path.join(directory, name + ".yml"), "w") as f:
+                yaml.safe_dump(synth_automation_document(args.steps), f, sort_keys=False)
+        size = sum(os.path.getsize(os.path.join(directory, n + ".yml")) for n in names)
+
+        def per_file(loader):
+            for name in names:
+                with open(os.path.join(directory, name + ".yml")) as f:
+                    loader(f.read())
+
+        def registry_cold():
+            registry = SsmDocumentRegistry(directory)
+            for name in names:
+                registry.get(name).content
+
+        warm = SsmDocumentRegistry(directory)
+
+        def registry_warm():
+            for name in names:
+                warm.get(name).content
+
+        rows = [
+            ("yaml.load (pure Python)", lambda: per_file(lambda text: yaml.load(text, Loader=yaml.SafeLoader))),
+            ("yaml.safe_load", lambda: per_file(yaml.safe_load)),
+            ("registry, new process", registry_cold),
+            ("registry, re-synth", registry_warm),
+        ]
+        import aws_fcd_infra_fis_ssm_document_registry as registry_module
+
+        print("%d documents, %.0f KiB, C loader: %s" % (len(names), size / 1024, registry_module._YamlLoader.__name__))
+        print("%-26s %12s" % ("", "ms/synth"))
+        for label, fn in rows:
+            if label == "registry, new process":
+                times = []
+                for _ in range(args.repeat):
+                    registry_module._parsed.clear()
+                    t0 = time.perf_counter()
+                    fn()
+                    times.append(time.perf_counter() - t0)
+                elapsed = min(times)
+            else:
+                fn()
+                t0 = time.perf_counter()
+                for _ in range(args.repeat):
+                    fn()
+                elapsed = (time.perf_counter() - t0) / args.repeat
+            print("%-26s %12.2f" % (label, elapsed * 1000))
+
+
+# -- startup -----------------------------------------------------------------
+
+def _startup_child(args):
+    started = time.perf_counter()
+    import aws_cdk as cdk
+    import app as fis_app
+
+    imported = time.perf_counter()
+    context = json.loads(os.environ["FIS_BENCH_CONTEXT"])
+    cdk_app = cdk.App(context=context, outdir=args.outdir)
+    cache = fis_app.SynthCache(cdk_app)
+    fis_app.FIS(cdk_app, "FIS", cache, experiments=context["experiments"])
+    built = time.perf_counter()
+    cache.synth(cdk_app)
+    done = time.perf_counter()
+    print(json.dumps({
+        "import_ms": (imported - started) * 1000,
+        "build_ms": (built - imported) * 1000,
+        "synth_ms": (done - built) * 1000,
+        "stack_modules": len([m for m in sys.modules if m.startswith("aws_fcd_infra_fis_") and m.endswith("_stack")]),
+        "python_rss_kb": _vm_hwm_kb(),
+    }))
+
+
+def bench_startup(args):
+    """app.py with the synth cache off: the full app vs selections."""
+    import shutil
+    import tempfile
+    import yaml
+    from aws_fcd_infra_fis_deploy_planner import load_assembly
+    from aws_fcd_infra_fis_ssm_stack import DOCUMENTS
+
+    print("%-16s %7s %8s %10s %10s %10s %10s %14s" % (
+        "experiments", "stacks", "modules", "import ms", "build ms", "synth ms", "total ms", "python RSS MB"))
+    with tempfile.TemporaryDirectory() as tmp:
+        documents = os.path.join(tmp, "documents")
+        os.makedirs(documents)
+        for key, _, _ in DOCUMENTS:
+            with open(os.path.join(documents, key + ".yml"), "w") as f:
+                yaml.safe_dump(synth_automation_document(20), f, sort_keys=False)
+        for selection in args.select:
+            context = dict(CONTEXT, ssm_documents_dir=documents, synth_cache="off", experiments=selection)
+            outdir = os.path.join(tmp, "out")
+            runs = []
+            for _ in range(args.repeat):
+                shutil.rmtree(outdir, ignore_errors=True)
+                out = subprocess.run(
+                    [sys.executable, __file__, "startup", "--child", "--outdir", outdir],
+                    check=True, capture_output=True, text=True,
+                    env=dict(os.environ, FIS_BENCH_CONTEXT=json.dumps(context),
+                             JSII_SILENCE_WARNING_DEPRECATED_NODE_VERSION="1"),
+                ).stdout
+                runs.append(json.loads(out.strip().splitlines()[-1]))
+            r = min(runs, key=lambda r: r["import_ms"] + r["build_ms"] + r["synth_ms"])
+            print("%-16s %7d %8d %10.0f %10.0f %10.0f %10.0f %14.1f" % (
+                selection, len(load_assembly(outdir)), r["stack_modules"], r["import_ms"], r["build_ms"], r["synth_ms"],
+                r["import_ms"] + r["build_ms"] + r["synth_ms"], r["python_rss_kb"] / 1024,
+            ))
+
+
+# -- runner ------------------------------------------------------------------
+
+def bench_runner(args):
+    """Run every template of the app on LocalFis (virtual clock): serial,
+    conflict-aware, conflict-blind, and with naive per-experiment polling."""
+    import tempfile
+    from unittest import mock
+    import aws_fcd_infra_fis_runner as fis_runner
+
+    context = dict(CONTEXT, az_mode=args.az_mode, availability_zones="local-1a,local-1b,local-1c")
+    with tempfile.TemporaryDirectory() as outdir:
+        subprocess.run(
+            [sys.executable, "-c", "import fis_bench, json, sys; fis_bench.synth_fis_assembly(sys.argv[1], json.loads(sys.argv[2]))",
+             outdir, json.dumps(context)],
+            check=True, capture_output=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+            env=dict(os.environ, JSII_SILENCE_WARNING_DEPRECATED_NODE_VERSION="1"),
+        )
+
+        class NaivePolling(fis_runner.ExperimentRunner):
+            def _poll(self, running):
+                return {eid: self._call("get_experiment", id=eid)["experiment"]["state"] for eid in running}
+
+        def run(label, max_concurrent, runner_class=fis_runner.ExperimentRunner, poll=args.poll, max_poll=args.max_poll,
+                ignore_conflicts=False):
+            random.seed(0)
+            clock = fis_runner.VirtualClock()
+            client = fis_runner.LocalFis.from_assembly(outdir, fis_runner.LocalInventory.generate(), clock=clock)
+            runner = runner_class(client, max_concurrent, poll, max_poll, sleep=clock.sleep, clock=clock)
+            ids = [t["id"] for t in runner.list_templates()]
+            blind = mock.patch.object(fis_runner, "conflict_graph", lambda fps: {t: set() for t in fps})
+            if ignore_conflicts:
+                with blind:
+                    results = runner.run(ids)
+            else:
+                results = runner.run(ids)
+            done = sum(1 for state in results.values() if state["status"] == "completed")
+            print("%-34s %9d %9.0f %9d %9d %11d" % (
+                label, done, clock(), runner.api_calls, client.throttled, len({c[:2] for c in client.collisions})))
+
+        print("%-34s %9s %9s %9s %9s %11s" % ("", "completed", "wall s", "API calls", "throttled", "collisions"))
+        run("serial", 1)
+        run("conflict-aware, %d slots" % args.max_concurrent, args.max_concurrent)
+        run("conflict-blind, %d slots" % args.max_concurrent, args.max_concurrent, ignore_conflicts=True)
+        run("conflict-aware, per-experiment 1s", args.max_concurrent, NaivePolling, poll=1.0, max_poll=1.0)
+
+
+# -- stop conditions ---------------------------------------------------------
+
+def bench_stop_conditions(args):
+    """Time from a breach to FIS stopping the experiment, for the old 60s
+    NetworkIn alarm and the 10s latency/error-rate alarms; and how often
+    noise alone (each datapoint breaching with probability --noise) would
+    abort an experiment."""
+    from aws_fcd_infra_fis_stop_conditions import HIGH_RESOLUTION, STANDARD_RESOLUTION, simulate_time_to_abort
+
+    configs = [
+        # label, resolution, fraction of a period in breach to breach the datapoint, ingest delay
+        ("NetworkIn 60s 1/1 (before)", STANDARD_RESOLUTION, 1.0, args.ingest_standard),
+        ("latency p99 10s 2/3", HIGH_RESOLUTION, 0.05, args.ingest_high),
+        ("error rate 10s 2/3", HIGH_RESOLUTION, 0.2, args.ingest_high),
+        ("latency p99 10s 1/1", dict(HIGH_RESOLUTION, evaluation_periods=1, datapoints_to_alarm=1), 0.05, args.ingest_high),
+    ]
+    rng = random.Random(1)
+    print("%-28s %8s %8s %8s %18s" % ("", "p50 s", "p95 s", "max s", "false aborts/hour"))
+    for label, resolution, fraction, ingest in configs:
+        times = simulate_time_to_abort(
+            samples=args.samples, breach_fraction=fraction, ingest_delay=ingest, reaction=args.reaction, **resolution
+        )
+        # false alarms: count M-of-N windows over a day of noisy datapoints
+        per_hour = 3600 // resolution["period"]
+        noise = [rng.random() < args.noise for _ in range(per_hour * 24)]
+        false_alarms = 0
+        for i in range(len(noise)):
+            window = noise[max(0, i - resolution["evaluation_periods"] + 1):i + 1]
+            if noise[i] and sum(window) >= resolution["datapoints_to_alarm"]:
+                false_alarms += 1
+        print("%-28s %8.1f %8.1f %8.1f %18.2f" % (
+            label, times[len(times) // 2], times[int(len(times) * 0.95)], times[-1], false_alarms / 24.0))
+
+
+# -- blast radius ------------------------------------------------------------
+
+def inventory_snapshot(instances, seed=0, page_size=1000):
+    """DescribeInstances pages for a synthetic fleet: 3 zones, 4 VPCs (one
+    is CONTEXT's), 100 ASGs (one is CONTEXT's), mostly running."""
+    rng = random.Random(seed)
+    vpcs = [CONTEXT["vpc_id"]] + ["vpc-%017x" % i for i in range(1, 4)]
+    asgs = [CONTEXT["asg_name"]] + ["asg-%02d" % i for i in range(1, 100)]
+    pages = []
+    for start in range(0, instances, page_size):
+        reservations = []
+        for i in range(start, min(start + page_size, instances)):
+            tags = [{"Key": "Name", "Value": "node-%d" % i}]
+            if rng.random() < 0.3:
+                tags.append({"Key": "FIS-Ready", "Value": "true"})
+            if rng.random() < 0.6:
+                tags.append({"Key": "aws:autoscaling:groupName", "Value": rng.choice(asgs)})
+            if rng.random() < 0.1:
+                tags.append({"Key": "eksctl.cluster.k8s.io/v1alpha1/cluster-name", "Value": CONTEXT["eks_cluster_name"]})
+            state = rng.choices(["running", "stopped", "terminated"], [90, 5, 5])[0]
+            reservations.append({"ReservationId": "r-%017x" % i, "Instances": [{
+                "InstanceId": "i-%017x" % i,
+                "InstanceType": rng.choice(["m5.large", "c5.xlarge", "t3.medium"]),
+                "Placement": {"AvailabilityZone": rng.choice(["local-1a", "local-1b", "local-1c"])},
+                "State": {"Code": 16, "Name": state},
+                "VpcId": rng.choice(vpcs),
+                "SubnetId": "subnet-%04d" % rng.randrange(48),
+                "Tags": tags,
+            }]})
+        pages.append({"Reservations": reservations})
+    return pages
+
+
+def catalog_targets(az="local-1a"):
+    """The catalog's targets with ${context:...} from CONTEXT and ${az} set."""
+    import aws_fcd_infra_fis_experiment_catalog as catalog
+
+    def fill(obj):
+        if isinstance(obj, str):
+            return re.sub(r"\$\{(context:([^}]+)|az|account)\}",
+                          lambda m: CONTEXT.get(m.group(2), "") if m.group(2) else az if m.group(1) == "az" else "123456789012",
+                          obj)
+        if isinstance(obj, dict):
+            return {k: fill(v) for k, v in obj.items()}
+        if isinstance(obj, list):
+            return [fill(v) for v in obj]
+        return obj
+
+    return {name: fill(target) for name, target in catalog.load_catalog().targets.items()}
+
+
+def bench_blast_radius(args):
+    """Load a DescribeInstances snapshot, index it and resolve every catalog
+    target, against resolving by scanning every instance."""
+    import tempfile
+    from aws_fcd_infra_fis_blast_radius import InstanceIndex, resolve_template
+
+    targets = catalog_targets()
+    for count in args.instances:
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as f:
+            json.dump(inventory_snapshot(count), f)
+            f.flush()
+            started = time.perf_counter()
+            index = InstanceIndex.load(f.name)
+            load_ms = (time.perf_counter() - started) * 1000
+        print("%d instances: snapshot loaded and indexed in %.0f ms" % (count, load_ms))
+        print("  %-24s %-12s %10s %12s %11s %8s" % ("target", "mode", "instances", "indexed ms", "scan ms", "speedup"))
+        for name, target in targets.items():
+            template = {"targets": {name: target}}
+            timings = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                resolution = resolve_template(index, template)[name]
+                timings.append((time.perf_counter() - started) * 1000)
+            if not resolution.supported:
+                continue
+            started = time.perf_counter()
+            scanned = index.scan(target.get("resourceTags"), target.get("filters"), target.get("resourceArns"))
+            scan_ms = (time.perf_counter() - started) * 1000
+            assert scanned == resolution.candidates, name
+            indexed_ms = sorted(timings)[len(timings) // 2]
+            print("  %-24s %-12s %10s %12.2f %11.1f %7.0fx" % (
+                name, resolution.selection_mode,
+                "%d/%d" % (resolution.selected, len(resolution.candidates)), indexed_ms, scan_ms, scan_ms / indexed_ms))
+
+
+# -- lambda chaos ------------------------------------------------------------
+
+def bench_lambda_chaos(args):
+    """Per-invocation overhead of the chaos wrapper on a fleet of
+    ``--containers`` warm containers taking ``--rps`` requests per second
+    (virtual time) between them: GetParameter on every invocation against
+    the TTL-cached client, with chaos off and on."""
+    import logging
+    import aws_fcd_infra_fis_lambda_chaos as chaos
+
+    # Throttled refreshes are counted below, not logged
+    logging.getLogger(chaos.__name__).setLevel(logging.ERROR)
+    name = CONTEXT["ssm_parameter_name"]
+    configs = {
+        "off": {"is_enabled": False, "fault_type": "exception", "rate": 1},
+        "on, latency 0 ms": {"is_enabled": True, "fault_type": "latency", "delay": 0, "rate": 1},
+        "on, status_code 10%": {"is_enabled": True, "fault_type": "status_code", "error_code": 503, "rate": 0.1},
+    }
+
+    def handler(event, context):
+        return {"statusCode": 200}
+
+    def naive(config_value):
+        def wrapper(ssm):
+            def invoke(event, context):
+                try:
+                    value = ssm.get_parameter(Name=name)["Parameter"]["Value"]
+                except chaos.ThrottlingError:
+                    return handler(event, context)
+                config = chaos.ChaosConfig.parse(value)
+                if not config.is_enabled:
+                    return handler(event, context)
+                return chaos.inject(config, handler, event, context)
+            return invoke
+        return wrapper
+
+    def cached(config_value):
+        def wrapper(ssm):
+            client = chaos.ChaosConfigClient(name, ttl=args.ttl, ssm=ssm, clock=now)
+            return chaos.inject_chaos(client=client)(handler)
+        return wrapper
+
+    def run(make, config_value, invocations):
+        random.seed(0)
+        clock[0] = 0.0
+        ssm = chaos.LocalSsm({name: json.dumps(config_value)}, latency=args.ssm_latency_ms / 1000.0, clock=now)
+        functions = [make(config_value)(ssm) for _ in range(args.containers)]
+        step = 1.0 / args.rps
+        started = time.perf_counter()
+        for i in range(invocations):
+            clock[0] += step
+            try:
+                functions[i % args.containers]({}, None)
+            except chaos.ChaosException:
+                pass
+        elapsed = time.perf_counter() - started
+        time.sleep(args.ssm_latency_ms / 1000.0 * 2)  # let background refreshes land
+        return elapsed / invocations * 1e6, ssm.calls * 3600.0 / clock[0], ssm.throttled * 100.0 / max(1, ssm.calls)
+
+    clock = [0.0]
+    now = lambda: clock[0]
+    bare, _, _ = run(lambda value: lambda ssm: handler, {}, args.invocations)
+    print("%d containers, %d requests/s, SSM GetParameter %.1f ms, ttl %.0f s" % (
+        args.containers, args.rps, args.ssm_latency_ms, args.ttl))
+    print("%-42s %14s %18s %11s" % ("", "overhead us", "GetParameter/hour", "throttled"))
+    for label, config_value in configs.items():
+        for kind, make, invocations in [("GetParameter per call", naive, args.naive_invocations),
+                                        ("cached", cached, args.invocations)]:
+            per_call, calls_per_hour, throttled = run(make, config_value, invocations)
+            print("%-42s %14.2f %18.0f %10.1f%%" % (
+                "%s, %s" % (kind, label), per_call - bare, calls_per_hour, throttled))
+
+
+def bench_lambda_latency(args):
+    """Injected delay percentiles against the spec, and cost per sample of
+    the alias-table sampler against sampling the distribution directly."""
+    import bisect
+    import math
+    import statistics
+    import aws_fcd_infra_fis_lambda_chaos as chaos
+
+    percentiles = {"50": 50, "90": 200, "99": 1000, "99.9": 3000}
+    table_q = [0.0] + [float(k) / 100 for k in percentiles] + [1.0]
+    table_v = [0.0] + list(percentiles.values()) + [6000.0]
+
+    def table_direct():
+        u = random.random()
+        i = bisect.bisect_right(table_q, u)
+        return table_v[i - 1] + (table_v[i] - table_v[i - 1]) * (u - table_q[i - 1]) / (table_q[i] - table_q[i - 1])
+
+    sigma = math.log(1000 / 50.0) / statistics.NormalDist().inv_cdf(0.99)
+    specs = [
+        ("percentiles", {"distribution": "percentiles", "percentiles": percentiles, "max": 6000}, table_direct),
+        ("lognormal median 50, p99 1000", {"distribution": "lognormal", "median": 50, "p99": 1000},
+         lambda: random.lognormvariate(math.log(50), sigma)),
+        ("pareto scale 20, shape 1.2", {"distribution": "pareto", "scale": 20, "shape": 1.2},
+         lambda: 20 * random.paretovariate(1.2)),
+    ]
+    levels = [0.5, 0.9, 0.99, 0.999]
+    print("%d samples each" % args.samples)
+    print("%-30s %-8s %10s %10s %9s" % ("", "level", "spec ms", "injected", "error"))
+    timings = []
+    for label, spec, direct in specs:
+        distribution = chaos.LatencyDistribution.parse(spec)
+        random.seed(0)
+        started = time.perf_counter()
+        samples = [distribution.sample() for _ in range(args.samples)]
+        alias_ns = (time.perf_counter() - started) / args.samples * 1e9
+        started = time.perf_counter()
+        for _ in range(args.samples):
+            direct()
+        direct_ns = (time.perf_counter() - started) / args.samples * 1e9
+        timings.append((label, alias_ns, direct_ns))
+        samples.sort()
+        for level in levels:
+            expected = distribution.quantile(level)
+            injected = samples[int(level * len(samples))]
+            print("%-30s %-8s %10.1f %10.1f %8.2f%%" % (
+                label if level == levels[0] else "", "p%g" % (level * 100), expected, injected,
+                (injected - expected) / expected * 100))
+    print()
+    print("%-30s %12s %12s" % ("", "alias ns", "direct ns"))
+    for label, alias_ns, direct_ns in timings:
+        print("%-30s %12.0f %12.0f" % (label, alias_ns, direct_ns))
+
+
+def bench_recovery(args):
+    """ASG recovery after losing a zone, on the local stand-in: measured
+    time to full capacity against the true one for several boot times and
+    sampling intervals, the API calls it took, and whether replaying the
+    recorded run gives the same report."""
+    from aws_fcd_infra_fis_recovery import LocalAsg, RecoverySampler, RecoveryTracker, replay, track
+    from aws_fcd_infra_fis_runner import VirtualClock
+
+    print("%d runs each" % args.runs)
+    print("%8s %10s %10s %10s %10s %14s %8s" % (
+        "boot s", "interval s", "true s", "measured s", "max err s", "calls per run", "replay"))
+    for boot in args.boot:
+        for interval in args.interval:
+            true, measured, errors, calls, same = [], [], [], 0, True
+            for seed in range(args.runs):
+                clock = VirtualClock()
+                asg = LocalAsg(clock=clock, per_zone=args.per_zone, boot=boot, seed=seed)
+                sampler = RecoverySampler(asg.name, asg, asg, asg, clock=clock)
+                first = sampler.sample()
+                asg.terminate_zone(asg.zones[0])
+                tracker = RecoveryTracker(clock())
+                tracker.observe(first)
+                clock.sleep(interval)
+                samples = [first] + track(sampler, tracker, clock.sleep, interval)
+                report = tracker.report()
+                recorded = json.loads(json.dumps({"start": tracker.start, "samples": samples}))
+                same = same and replay(recorded).report() == report
+                expected = max(r["healthy"] for r in asg.replaced.values())
+                true.append(expected)
+                measured.append(report["time_to_full_capacity"])
+                errors.append(report["time_to_full_capacity"] - expected)
+                calls += sum(asg.calls.values())
+            print("%8.0f %10.0f %10.1f %10.1f %10.1f %14.1f %8s" % (
+                boot, interval, sum(true) / len(true), sum(measured) / len(measured), max(errors),
+                calls / float(args.runs), "same" if same else "DIFFERS"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    synth = sub.add_parser("synth", help="synth time and memory as the experiment catalog grows")
+    synth.add_argument("--templates", type=int, nargs="+", default=[15, 100, 300, 600])
+    synth.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    synth.add_argument("--outdir", help=argparse.SUPPRESS)
+    synth.set_defaults(func=lambda a: _synth_child(a) if a.child else bench_synth(a))
+
+    deploy = sub.add_parser("deploy", help="serial vs parallel rollout of the app's stacks on the local CloudFormation stand-in")
+    deploy.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    deploy.add_argument("--speed", type=float, default=0.01, help="stand-in time scale")
+    deploy.add_argument("--synth-to", help=argparse.SUPPRESS)
+    deploy.set_defaults(func=lambda a: synth_fis_assembly(a.synth_to) if a.synth_to else bench_deploy(a))
+
+    synth_cache = sub.add_parser("synth-cache", help="synth time with a cold, warm and partly invalidated synth cache")
+    synth_cache.add_argument("--child", help=argparse.SUPPRESS)
+    synth_cache.add_argument("--outdir", help=argparse.SUPPRESS)
+    synth_cache.add_argument("--cache", help=argparse.SUPPRESS)
+    synth_cache.set_defaults(func=lambda a: _synth_cache_child(a) if a.child else bench_synth_cache(a))
+
+    ssm_docs = sub.add_parser("ssm-docs", help="loading the SSM documents: per-file yaml.load vs the document registry")
+    ssm_docs.add_argument("--steps", type=int, default=200, help="steps per document")
+    ssm_docs.add_argument("--repeat", type=int, default=5)
+    ssm_docs.set_defaults(func=bench_ssm_docs)
+
+    startup = sub.add_parser("startup", help="app.py wall time, import time and memory: full vs selective synth")
+    startup.add_argument("--select", nargs="+", default=["all", "nacl,asg", "nacl", "ec2"])
+    startup.add_argument("--repeat", type=int, default=3)
+    startup.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    startup.add_argument("--outdir", help=argparse.SUPPRESS)
+    startup.set_defaults(func=lambda a: _startup_child(a) if a.child else bench_startup(a))
+
+    runner = sub.add_parser("runner", help="experiment runner on the local FIS/EC2 stand-in")
+    runner.add_argument("--max-concurrent", type=int, default=4)
+    runner.add_argument("--poll", type=float, default=5.0)
+    runner.add_argument("--max-poll", type=float, default=60.0)
+    runner.add_argument("--az-mode", default="per-az", choices=["rotate", "per-az"])
+    runner.set_defaults(func=bench_runner)
+
+    stop = sub.add_parser("stop-conditions", help="simulated time-to-abort of the stop-condition alarms")
+    stop.add_argument("--samples", type=int, default=20000)
+    stop.add_argument("--ingest-standard", type=float, default=60.0, help="delay before an AWS/EC2 datapoint is evaluated")
+    stop.add_argument("--ingest-high", type=float, default=5.0, help="delay before a high-resolution datapoint is evaluated")
+    stop.add_argument("--reaction", type=float, default=5.0, help="alarm state change to FIS stopping the experiment")
+    stop.add_argument("--noise", type=float, default=0.02, help="chance a healthy datapoint breaches")
+    stop.set_defaults(func=bench_stop_conditions)
+
+    blast = sub.add_parser("blast-radius", help="resolving experiment targets against an indexed inventory snapshot")
+    blast.add_argument("--instances", type=int, nargs="+", default=[1000, 10000, 100000])
+    blast.add_argument("--repeat", type=int, default=5)
+    blast.set_defaults(func=bench_blast_radius)
+
+    lambda_chaos = sub.add_parser("lambda-chaos", help="chaos wrapper overhead: GetParameter per call vs the cached client")
+    lambda_chaos.add_argument("--invocations", type=int, default=200000)
+    lambda_chaos.add_argument("--naive-invocations", type=int, default=2000)
+    lambda_chaos.add_argument("--containers", type=int, default=50)
+    lambda_chaos.add_argument("--rps", type=float, default=500)
+    lambda_chaos.add_argument("--ttl", type=float, default=60)
+    lambda_chaos.add_argument("--ssm-latency-ms", type=float, default=2.0, help="stand-in GetParameter latency")
+    lambda_chaos.set_defaults(func=bench_lambda_chaos)
+
+    lambda_latency = sub.add_parser("lambda-latency", help="latency distributions: injected percentiles and sampling cost")
+    lambda_latency.add_argument("--samples", type=int, default=1000000)
+    lambda_latency.set_defaults(func=bench_lambda_latency)
+
+    recovery = sub.add_parser("recovery", help="ASG recovery tracker on the local stand-in: measured vs true time to full capacity")
+    recovery.add_argument("--boot", type=float, nargs="+", default=[120.0, 90.0, 60.0], help="replacement boot seconds")
+    recovery.add_argument("--interval", type=float, nargs="+", default=[5.0, 10.0, 30.0], help="sampling interval seconds")
+    recovery.add_argument("--per-zone", type=int, default=4)
+    recovery.add_argument("--runs", type=int, default=20)
+    recovery.set_defaults(func=bench_recovery)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
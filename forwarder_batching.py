@@ -0,0 +1,159 @@
+import json
+import logging
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+# Splunk recommends keeping HEC request bodies well below the default
+# max_content_length of 1 MB; stay at half of that so one oversized event
+# doesn't push a chunk over the limit.
+DEFAULT_MAX_BYTES = 512 * 1024
+DEFAULT_MAX_EVENTS = 1000
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_SECONDS = 0.2
+# zlib wbits for a gzip container, which is what Content-Encoding: gzip wants
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+logger = logging.getLogger(__name__)
+
+
+class HecDeliveryError(Exception):
+    """Raised by HecBatcher.close() when chunks were still failing after retries."""
+
+    def __init__(self, failed_chunks):
+        self.failed_chunks = failed_chunks
+        events = sum(count for _, count in failed_chunks)
+        super().__init__('%d HEC chunk(s) with %d event(s) could not be delivered' % (len(failed_chunks), events))
+
+
+class HecBatcher:
+    """Accumulate HEC events into bounded chunks and flush them as they fill.
+
+    ``send`` is called with the newline-delimited JSON body of one chunk and
+    must raise on failure. A chunk is flushed once it reaches ``max_bytes`` or
+    ``max_events``, so a large subscription batch becomes several bounded
+    requests instead of one huge body. A failing chunk is retried on its own
+    with exponential backoff; chunks that still fail are kept in ``failed``
+    and reported by ``close()``.
+
+    With ``max_in_flight`` above 1, full chunks are handed to a thread pool
+    and sent concurrently while the next chunk is being built; ``add`` blocks
+    once that many chunks are outstanding, so memory stays bounded and
+    ``close()`` returns as soon as the slowest chunk is done.
+
+    With ``compress_level`` set, each event is fed straight into a gzip
+    stream as it is added, so the uncompressed chunk is never held in memory
+    and ``send`` receives the gzip body. The thresholds still apply to the
+    uncompressed size, which is what HEC's max_content_length is checked
+    against.
+
+    With a ``spill`` queue (see forwarder_spill), a chunk that still fails
+    after its retries is appended to the queue instead of being reported, and
+    the batcher stops talking to HEC for the rest of the invocation: every
+    later chunk goes straight to the queue. Setting ``circuit_open`` up front
+    does the same from the first chunk.
+    """
+
+    def __init__(self, send, max_bytes=DEFAULT_MAX_BYTES, max_events=DEFAULT_MAX_EVENTS,
+                 max_retries=DEFAULT_MAX_RETRIES, backoff=DEFAULT_BACKOFF_SECONDS, max_in_flight=1,
+                 compress_level=None, spill=None, circuit_open=False):
+        self.send = send
+        self.max_bytes = max_bytes
+        self.max_events = max_events
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_in_flight = max_in_flight
+        self.compress_level = compress_level
+        self.spill = spill
+        self.circuit_open = circuit_open
+        self.failed = []
+        self.events_spilled = 0
+        self.chunks_sent = 0
+        self.events_sent = 0
+        self.bytes_sent = 0
+        self.raw_bytes_sent = 0
+        self._start_chunk()
+        self._lock = threading.Lock()
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+
+    def _start_chunk(self):
+        self._parts = []
+        self._count = 0
+        self._size = 0
+        self._compressor = None
+        if self.compress_level is not None:
+            self._compressor = zlib.compressobj(self.compress_level, zlib.DEFLATED, GZIP_WBITS)
+
+    def add(self, event):
+        line = json.dumps(event, separators=(',', ':')).encode('utf-8')
+        if self._count and self._size + len(line) + 1 > self.max_bytes:
+            self.flush()
+        if self._count:
+            line = b'\n' + line
+        self._count += 1
+        self._size += len(line)
+        if self._compressor is not None:
+            line = self._compressor.compress(line)
+        if line:
+            self._parts.append(line)
+        if self._count >= self.max_events or self._size >= self.max_bytes:
+            self.flush()
+
+    def flush(self):
+        if not self._count:
+            return
+        if self._compressor is not None:
+            self._parts.append(self._compressor.flush())
+        body = b''.join(self._parts)
+        count = self._count
+        raw_size = self._size
+        self._start_chunk()
+        if self.max_in_flight <= 1:
+            self._deliver(body, count, raw_size)
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight)
+        self._slots.acquire()
+        future = self._executor.submit(self._deliver, body, count, raw_size)
+        future.add_done_callback(lambda _: self._slots.release())
+
+    def _deliver(self, body, count, raw_size):
+        ok = not self.circuit_open and self._send_with_retries(body)
+        with self._lock:
+            if ok:
+                self.chunks_sent += 1
+                self.events_sent += count
+                self.bytes_sent += len(body)
+                self.raw_bytes_sent += raw_size
+                return
+            if self.spill is not None:
+                self.circuit_open = True
+                try:
+                    self.spill.append(body, count)
+                    self.events_spilled += count
+                    return
+                except Exception as e:
+                    logger.error('Could not spill HEC chunk of %d event(s): %s', count, e)
+            self.failed.append((body, count))
+
+    def _send_with_retries(self, body):
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.send(body)
+                return True
+            except Exception as e:
+                logger.warning('HEC chunk of %d bytes failed (attempt %d/%d): %s',
+                               len(body), attempt + 1, self.max_retries + 1, e)
+                if attempt < self.max_retries:
+                    time.sleep(self.backoff * (2 ** attempt))
+        return False
+
+    def close(self):
+        self.flush()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self.failed:
+            raise HecDeliveryError(self.failed)
@@ -0,0 +1,771 @@
+"""Benchmarks for the Splunk forwarder in codeinpython.py.
+
+    python forwarder_bench.py decode --sizes 1 6
+    python forwarder_bench.py throughput --events 5000
+    python forwarder_bench.py fanout --latencies 0.05 0.1 0.2
+    python forwarder_bench.py compression --levels 1 6 9
+    python forwarder_bench.py routing --rules 10000
+    python forwarder_bench.py timestamps --events 100000
+    python forwarder_bench.py spill --outage 3
+    python forwarder_bench.py load --handler lambda_handler --rate 20 --duration 30
+
+Decode measurements run in a fresh interpreter so peak RSS is not polluted
+by earlier runs. Network benchmarks drive the handlers in-process against
+StubHec, a local HEC stand-in.
+"""
+import argparse
+import base64
+import gzip
+import json
+import logging
+import os
+import random
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import ExitStack, redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from forwarder_batching import HecDeliveryError
+from forwarder_decode import CloudWatchLogsStream, decode_awslogs
+from forwarder_routing import RoutingTable
+from forwarder_timestamps import TimestampParser
+
+_WORDS = (
+    'GET POST PUT DELETE 200 201 204 301 304 400 401 403 404 409 429 500 502 503 '
+    'request response latency user session token cache miss hit upstream timeout '
+    'retry connection reset INFO WARN ERROR DEBUG handler service worker queue '
+    'order payment inventory checkout cart account region us-east-1 eu-west-1'
+).split()
+
+
+def synth_message(rng, size):
+    parts = ['%032x' % rng.getrandbits(128)]
+    length = len(parts[0])
+    while length < size:
+        word = rng.choice(_WORDS)
+        parts.append(word)
+        length += len(word) + 1
+    return ' '.join(parts)[:size]
+
+
+def synth_log_events(count, message_size=256, seed=0, start_ms=1700000000000):
+    rng = random.Random(seed)
+    return [
+        {
+            'id': '%056d' % i,
+            'timestamp': start_ms + i,
+            'message': synth_message(rng, message_size),
+        }
+        for i in range(count)
+    ]
+
+
+def synth_awslogs_data(log_events, log_group='/aws/lambda/synthetic', log_stream='synthetic-stream'):
+    body = json.dumps({
+        'messageType': 'DATA_MESSAGE',
+        'owner': '123456789012',
+        'logGroup': log_group,
+        'logStream': log_stream,
+        'subscriptionFilters': ['synthetic'],
+        'logEvents': log_events,
+    }).encode('utf-8')
+    return base64.b64encode(gzip.compress(body)).decode('ascii')
+
+
+def synth_payload_of_size(compressed_bytes, message_size=256, seed=0, **kwargs):
+    """Build ``awslogs.data`` whose gzip body is roughly ``compressed_bytes``."""
+    count = 1000
+    for _ in range(3):
+        data = synth_awslogs_data(synth_log_events(count, message_size, seed), **kwargs)
+        actual = len(data) * 3 // 4
+        count = max(1, int(count * compressed_bytes / actual))
+    return synth_awslogs_data(synth_log_events(count, message_size, seed), **kwargs)
+
+
+def synth_iso_log_events(count, message_size=256, seed=0, start_ms=1700000000000):
+    """Log events in the shape the legacy ``handler`` expects (ISO timestamps)."""
+    log_events = synth_log_events(count, message_size, seed, start_ms)
+    for logEvent in log_events:
+        ms = logEvent['timestamp']
+        logEvent['timestamp'] = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(ms // 1000)) + '.%03dZ' % (ms % 1000)
+    return log_events
+
+
+class StubHec:
+    """Local HEC stand-in that counts requests, events and connections.
+
+    ``latency`` delays every response and ``bandwidth`` (bytes/sec) adds a
+    transfer delay proportional to the request body, as seen on the wire.
+    While ``failing`` is true every request gets a 503. gzip bodies are
+    inflated before events are counted; ``bytes`` is wire size and
+    ``raw_bytes`` the decoded size. The server speaks HTTP/1.1 so clients can
+    keep connections alive.
+    """
+
+    def __init__(self, latency=0.0, bandwidth=None, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.failing = False
+        self.rejected = 0
+        self.requests = 0
+        self.events = 0
+        self.bytes = 0
+        self.raw_bytes = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+
+            def do_POST(self):
+                wire = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                body = wire
+                if self.headers.get('Content-Encoding') == 'gzip':
+                    body = gzip.decompress(wire)
+                delay = stub.latency + (len(wire) / stub.bandwidth if stub.bandwidth else 0)
+                if delay:
+                    time.sleep(delay)
+                if stub.failing:
+                    with stub._lock:
+                        stub.rejected += 1
+                    self._reply(503, b'{"text":"Server is busy","code":9}')
+                    return
+                with stub._lock:
+                    stub.requests += 1
+                    stub.events += body.count(b'\n') + 1 if body else 0
+                    stub.bytes += len(wire)
+                    stub.raw_bytes += len(body)
+                self._reply(200, b'{"text":"Success","code":0}')
+
+            def _reply(self, status, body):
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return 'http://%s:%d/services/collector/event' % (host, port)
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def import_forwarder(hec_url, token='bench-token', **env):
+    """Import codeinpython with its environment pointed at ``hec_url``.
+
+    EMF metric lines are off unless ``splunk_forwarder_metrics='on'`` is
+    passed, so they don't interleave with benchmark output.
+    """
+    os.environ['splunk_hec_url'] = hec_url
+    os.environ['splunk_hec_token'] = token
+    os.environ['splunk_forwarder_metrics'] = 'off'
+    os.environ.update({k: str(v) for k, v in env.items()})
+    sys.modules.pop('codeinpython', None)
+    import codeinpython
+    return codeinpython
+
+
+def _peak_rss_kb():
+    # ru_maxrss survives exec on Linux, so a child would report the parent's
+    # peak; VmHWM belongs to the current address space only.
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+# -- decode ------------------------------------------------------------------
+
+def _decode_full(data):
+    event = {'awslogs': {'data': data}}
+    json.dumps(event, indent=2)
+    parsed = decode_awslogs(data)
+    count = 0
+    for logEvent in parsed['logEvents']:
+        json.dumps({
+            'event': logEvent['message'],
+            'sourcetype': 'aws:cloudwatchlogs',
+            'source': parsed['logStream'],
+            'time': logEvent['timestamp'] / 1000,
+        })
+        count += 1
+    return count
+
+
+def _decode_stream(data):
+    stream = CloudWatchLogsStream(data)
+    count = 0
+    for logEvent in stream:
+        json.dumps({
+            'event': logEvent['message'],
+            'sourcetype': 'aws:cloudwatchlogs',
+            'source': stream.header['logStream'],
+            'time': logEvent['timestamp'] / 1000,
+        })
+        count += 1
+    return count
+
+
+_DECODERS = {'full': _decode_full, 'stream': _decode_stream}
+
+
+def _decode_child(args):
+    with open(args.payload) as f:
+        data = f.read()
+    baseline = _peak_rss_kb()
+    started = time.perf_counter()
+    count = _DECODERS[args.child](data)
+    elapsed = time.perf_counter() - started
+    print(json.dumps({
+        'events': count,
+        'wall_ms': elapsed * 1000,
+        'peak_rss_kb': _peak_rss_kb(),
+        'delta_rss_kb': _peak_rss_kb() - baseline,
+    }))
+
+
+def bench_decode(args):
+    print('%-8s %-8s %10s %10s %14s %14s' % ('size', 'path', 'events', 'wall ms', 'peak RSS MB', 'delta RSS MB'))
+    for size_mb in args.sizes:
+        data = synth_payload_of_size(int(size_mb * 1024 * 1024))
+        with tempfile.NamedTemporaryFile('w', suffix='.b64', delete=False) as f:
+            f.write(data)
+        try:
+            for path in ('full', 'stream'):
+                out = subprocess.run(
+                    [sys.executable, __file__, 'decode', '--child', path, '--payload', f.name],
+                    check=True, capture_output=True, text=True,
+                ).stdout
+                result = json.loads(out)
+                print('%-8s %-8s %10d %10.1f %14.1f %14.1f' % (
+                    '%gMB' % size_mb, path, result['events'], result['wall_ms'],
+                    result['peak_rss_kb'] / 1024, result['delta_rss_kb'] / 1024,
+                ))
+        finally:
+            os.unlink(f.name)
+
+
+# -- throughput --------------------------------------------------------------
+
+def _legacy_per_event(url, log_events, log_group):
+    import requests
+    for item in log_events:
+        data = {
+            'message': item['message'],
+            'metadata': {
+                'time': int(time.mktime(time.strptime(item['timestamp'], '%Y-%m-%dT%H:%M:%S.%fZ'))),
+                'host': 'serverless',
+                'source': log_group,
+                'sourcetype': 'aws:cloudwatchlogs',
+                'index': 'aws_cloudwatch',
+            },
+        }
+        requests.post(url, headers={'Authorization': 'Splunk bench-token'}, data=json.dumps(data)).raise_for_status()
+
+
+def bench_throughput(args):
+    log_group = '/aws/lambda/synthetic'
+    log_events = synth_iso_log_events(args.events, args.message_size)
+    event = {'awslogs': {'data': synth_awslogs_data(log_events, log_group)}}
+    print('%-22s %10s %10s %12s %12s' % ('path', 'events', 'requests', 'connections', 'events/sec'))
+    with StubHec(latency=args.latency) as stub:
+        started = time.perf_counter()
+        _legacy_per_event(stub.url, log_events, log_group)
+        elapsed = time.perf_counter() - started
+        print('%-22s %10d %10d %12d %12.0f' % ('per-event post', stub.events, stub.requests, stub.connections, args.events / elapsed))
+
+    with StubHec(latency=args.latency) as stub:
+        forwarder = import_forwarder(stub.url)
+        for _ in range(args.invocations):
+            started = time.perf_counter()
+            forwarder.handler(event, None)
+            elapsed = time.perf_counter() - started
+        print('%-22s %10d %10d %12d %12.0f' % ('pooled session, batched', stub.events, stub.requests, stub.connections, args.events / elapsed))
+
+
+# -- fanout ------------------------------------------------------------------
+
+def bench_fanout(args):
+    event = {'awslogs': {'data': synth_awslogs_data(synth_log_events(args.events, args.message_size))}}
+    print('%-28s %10s %12s %s' % ('mode', 'chunks', 'wall ms', 'events per endpoint'))
+    with ExitStack() as stack:
+        stubs = [stack.enter_context(StubHec(latency=latency)) for latency in args.latencies]
+        modes = [
+            ('serial, 1 endpoint', dict(splunk_hec_urls=stubs[0].url, splunk_hec_max_in_flight=1)),
+            ('fanout, %d endpoints' % len(stubs), dict(
+                splunk_hec_urls=','.join(stub.url for stub in stubs),
+                splunk_hec_max_in_flight=args.max_in_flight,
+            )),
+        ]
+        for name, env in modes:
+            for stub in stubs:
+                stub.events = stub.requests = 0
+            forwarder = import_forwarder(stubs[0].url, splunk_hec_max_batch_count=args.batch_count, **env)
+            started = time.perf_counter()
+            forwarder.lambda_handler(event, None)
+            elapsed = time.perf_counter() - started
+            print('%-28s %10d %12.1f %s' % (
+                name, sum(stub.requests for stub in stubs), elapsed * 1000,
+                ' '.join(str(stub.events) for stub in stubs),
+            ))
+
+
+# -- compression -------------------------------------------------------------
+
+def _corpus_app_json(rng, i):
+    return json.dumps({
+        'level': rng.choice(['INFO', 'INFO', 'INFO', 'WARN', 'ERROR']),
+        'logger': rng.choice(['com.example.orders.OrderService', 'com.example.payments.Gateway',
+                              'com.example.http.AccessFilter']),
+        'thread': 'http-nio-8080-exec-%d' % rng.randint(1, 64),
+        'traceId': '%032x' % rng.getrandbits(128),
+        'spanId': '%016x' % rng.getrandbits(64),
+        'message': synth_message(rng, rng.randint(60, 400)),
+        'durationMs': rng.randint(1, 2500),
+        'customerId': 'cust-%06d' % rng.randint(0, 999999),
+    })
+
+
+def _corpus_access(rng, i):
+    return '10.%d.%d.%d - - [14/Nov/2023:22:13:%02d +0000] "%s /api/v1/%s/%d HTTP/1.1" %d %d "-" "%s"' % (
+        rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255), i % 60,
+        rng.choice(['GET', 'GET', 'POST', 'PUT']), rng.choice(['orders', 'carts', 'accounts', 'items']),
+        rng.randint(1, 10 ** 6), rng.choice([200, 200, 200, 201, 304, 404, 500]), rng.randint(100, 50000),
+        rng.choice(['Mozilla/5.0 (X11; Linux x86_64)', 'okhttp/4.9.3', 'aws-sdk-java/2.20.0']),
+    )
+
+
+def _corpus_guardduty(rng, i):
+    return json.dumps({
+        'schemaVersion': '2.0',
+        'accountId': '123456789012',
+        'region': 'us-east-1',
+        'id': '%032x' % rng.getrandbits(128),
+        'type': rng.choice(['Recon:EC2/PortProbeUnprotectedPort', 'UnauthorizedAccess:EC2/SSHBruteForce',
+                            'Trojan:EC2/DNSDataExfiltration']),
+        'resource': {
+            'resourceType': 'Instance',
+            'instanceDetails': {
+                'instanceId': 'i-%017x' % rng.getrandbits(68),
+                'instanceType': rng.choice(['m5.large', 'c5.xlarge', 't3.medium']),
+                'networkInterfaces': [{
+                    'privateIpAddress': '10.0.%d.%d' % (rng.randint(0, 255), rng.randint(0, 255)),
+                    'subnetId': 'subnet-%017x' % rng.getrandbits(68),
+                    'vpcId': 'vpc-%017x' % rng.getrandbits(68),
+                    'securityGroups': [{'groupId': 'sg-%017x' % rng.getrandbits(68), 'groupName': 'default'}],
+                }],
+                'tags': [{'key': 'FIS-Ready', 'value': 'true'}, {'key': 'Name', 'value': 'web-%d' % rng.randint(1, 99)}],
+            },
+        },
+        'service': {
+            'action': {'actionType': 'NETWORK_CONNECTION', 'networkConnectionAction': {
+                'connectionDirection': 'INBOUND', 'protocol': 'TCP', 'blocked': False,
+                'remoteIpDetails': {'ipAddressV4': '198.51.100.%d' % rng.randint(1, 254),
+                                    'country': {'countryName': rng.choice(['Netherlands', 'Brazil', 'Vietnam'])}},
+                'localPortDetails': {'port': rng.choice([22, 3389, 5432]), 'portName': 'Unknown'},
+            }},
+            'count': rng.randint(1, 500),
+        },
+        'severity': rng.choice([2, 5, 8]),
+    })
+
+
+_CORPORA = {
+    'app-json': ('/aws/ecs/orders', _corpus_app_json),
+    'access': ('/aws/ec2/nginx-access', _corpus_access),
+    'guardduty': ('AWS-CLOUD2-GD-SECURITY', _corpus_guardduty),
+}
+
+
+def synth_corpus_events(corpus, count, seed=0, start_ms=1700000000000):
+    rng = random.Random(seed)
+    make = _CORPORA[corpus][1]
+    return [{'id': '%056d' % i, 'timestamp': start_ms + i, 'message': make(rng, i)} for i in range(count)]
+
+
+def bench_compression(args):
+    print('%-10s %-6s %12s %12s %7s %10s %10s' % ('corpus', 'level', 'raw bytes', 'sent bytes', 'ratio', 'cpu ms', 'wall ms'))
+    for corpus in args.corpora:
+        log_group = _CORPORA[corpus][0]
+        event = {'awslogs': {'data': synth_awslogs_data(synth_corpus_events(corpus, args.events), log_group)}}
+        with StubHec(bandwidth=args.bandwidth_mbps * 1024 * 1024 / 8) as stub:
+            for level in [None] + args.levels:
+                env = {'splunk_hec_max_in_flight': 1, 'splunk_hec_gzip_level': '' if level is None else level}
+                forwarder = import_forwarder(stub.url, **env)
+                stub.bytes = stub.raw_bytes = 0
+                # Sends are serial, so the calling thread's CPU time covers
+                # decode, serialization and compression but not the stub
+                cpu_started = time.thread_time()
+                started = time.perf_counter()
+                forwarder.lambda_handler(event, None)
+                elapsed = time.perf_counter() - started
+                cpu = time.thread_time() - cpu_started
+                print('%-10s %-6s %12d %12d %7.1f %10.1f %10.1f' % (
+                    corpus, 'off' if level is None else level, stub.raw_bytes, stub.bytes,
+                    stub.raw_bytes / max(stub.bytes, 1), cpu * 1000, elapsed * 1000,
+                ))
+
+
+# -- routing -----------------------------------------------------------------
+
+def synth_routing_rules(count, seed=0):
+    rng = random.Random(seed)
+    rules = []
+    for i in range(count):
+        kind = rng.choice(['exact', 'exact', 'prefix', 'regex'])
+        team = 'team%05d' % i
+        if kind == 'exact':
+            rule = {'match': 'exact', 'pattern': '/aws/lambda/%s-handler' % team}
+        elif kind == 'prefix':
+            rule = {'match': 'prefix', 'pattern': '/aws/ecs/%s/' % team}
+        else:
+            rule = {'match': 'regex', 'pattern': r'/aws/eks/%s/[a-z]+-\d+$' % team}
+        rule.update(sourcetype='aws:%s' % team, index='idx_%d' % (i % 50))
+        rules.append(rule)
+    return rules
+
+
+def _linear_route(rules, logGroup):
+    # What a growing if/elif chain amounts to (regexes precompiled)
+    for match, pattern, rule in rules:
+        if match == 'exact' and logGroup == pattern:
+            return rule
+        if match == 'prefix' and logGroup.startswith(pattern):
+            return rule
+        if match == 'regex' and pattern.match(logGroup):
+            return rule
+    return None
+
+
+def bench_routing(args):
+    rules = synth_routing_rules(args.rules)
+    rng = random.Random(1)
+    groups = []
+    for _ in range(args.streams):
+        rule = rng.choice(rules)
+        team = rule['sourcetype'].split(':')[1]
+        groups.append({
+            'exact': '/aws/lambda/%s-handler' % team,
+            'prefix': '/aws/ecs/%s/service-%d' % (team, rng.randint(0, 9)),
+            'regex': '/aws/eks/%s/pod-%d' % (team, rng.randint(0, 9)),
+        }[rule['match']] if rng.random() < 0.9 else '/aws/unrouted/%d' % rng.randint(0, 999))
+
+    started = time.perf_counter()
+    table = RoutingTable(rules)
+    build = time.perf_counter() - started
+    print('%d rules compiled in %.1f ms' % (len(rules), build * 1000))
+    print('%-22s %12s' % ('path', 'us/lookup'))
+
+    linear = [(r['match'], re.compile(r['pattern']) if r['match'] == 'regex' else r['pattern'], r) for r in rules]
+    sample = groups[:args.linear_lookups]
+    started = time.perf_counter()
+    for logGroup in sample:
+        _linear_route(linear, logGroup)
+    print('%-22s %12.2f' % ('linear if-chain', (time.perf_counter() - started) / len(sample) * 1e6))
+
+    started = time.perf_counter()
+    for logGroup in groups:
+        table._resolve(logGroup, '')
+    print('%-22s %12.2f' % ('compiled, uncached', (time.perf_counter() - started) / len(groups) * 1e6))
+
+    # Per-event cost on a warm container: every event of a stream after the
+    # first hits the memo
+    for logGroup in groups:
+        table.route(logGroup, 'stream')
+    events = [rng.choice(groups) for _ in range(args.lookups)]
+    started = time.perf_counter()
+    for logGroup in events:
+        table.route(logGroup, 'stream')
+    print('%-22s %12.2f' % ('compiled, memoised', (time.perf_counter() - started) / len(events) * 1e6))
+
+
+# -- timestamps --------------------------------------------------------------
+
+def bench_timestamps(args):
+    # Events per millisecond controls how many share a second
+    log_events = synth_iso_log_events(args.events, message_size=1)
+    for logEvent, ms in zip(log_events, range(0, args.events * args.spacing_ms, args.spacing_ms)):
+        logEvent['timestamp'] = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(1700000000 + ms // 1000)) + '.%03dZ' % (ms % 1000)
+    values = [logEvent['timestamp'] for logEvent in log_events]
+    numeric = [1700000000000 + i * args.spacing_ms for i in range(args.events)]
+
+    def strptime_mktime(values):
+        for value in values:
+            int(time.mktime(time.strptime(value, '%Y-%m-%dT%H:%M:%S.%fZ')))
+
+    def parser(values):
+        parse = TimestampParser()
+        for value in values:
+            parse(value)
+
+    def parser_no_cache(values):
+        for value in values:
+            TimestampParser()(value)
+
+    print('%-26s %12s' % ('path', 'ns/event'))
+    for name, fn, data in (
+        ('strptime + mktime', strptime_mktime, values),
+        ('TimestampParser, no cache', parser_no_cache, values),
+        ('TimestampParser', parser, values),
+        ('TimestampParser, epoch ms', parser, numeric),
+    ):
+        started = time.perf_counter()
+        fn(data)
+        print('%-26s %12.0f' % (name, (time.perf_counter() - started) / len(data) * 1e9))
+
+
+# -- spill -------------------------------------------------------------------
+
+def bench_spill(args):
+    # Every failed attempt logs a warning; that is the point of this benchmark
+    for name in ('forwarder_batching', 'forwarder_spill'):
+        logging.getLogger(name).setLevel(logging.CRITICAL)
+    event = {'awslogs': {'data': synth_awslogs_data(synth_log_events(args.events, args.message_size))}}
+    total = args.events * args.invocations
+    print('%-10s %18s %18s %12s %12s' % ('spill', 'requests in outage', 'requests after', 'delivered', 'duplicates'))
+    for spill in (False, True):
+        spill_dir = tempfile.mkdtemp()
+        env = {
+            'splunk_hec_max_batch_count': args.batch_count,
+            'splunk_hec_max_in_flight': 1,
+            'splunk_hec_retry_backoff': 0,
+            'splunk_hec_spill_path': os.path.join(spill_dir, 'hec-spill') if spill else '',
+        }
+        with StubHec() as stub:
+            forwarder = import_forwarder(stub.url, **env)
+            in_outage = after = 0
+            for i in range(args.invocations):
+                stub.failing = i < args.outage
+                before = stub.requests + stub.rejected
+                # An async Lambda invocation that raises is retried twice
+                for attempt in range(3):
+                    try:
+                        forwarder.lambda_handler(event, None)
+                        break
+                    except HecDeliveryError:
+                        pass
+                if stub.failing:
+                    in_outage += stub.requests + stub.rejected - before
+                else:
+                    after += stub.requests + stub.rejected - before
+            print('%-10s %18d %18d %12d %12d' % (
+                'on' if spill else 'off', in_outage, after, min(stub.events, total), max(stub.events - total, 0),
+            ))
+
+
+# -- load --------------------------------------------------------------------
+
+def _reset_peak_rss():
+    # Writing 5 to clear_refs resets VmHWM (Linux >= 4.0); elsewhere the
+    # reported peak includes payload generation
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def synth_invocations(args, rng):
+    """Distinct ``awslogs`` events to replay, cycling through the configured
+    batch sizes, message sizes and log groups."""
+    events = []
+    for i in range(args.distinct_payloads):
+        count = rng.choice(args.batch_sizes)
+        log_group = rng.choice(args.log_groups)
+        if log_group == 'AWS-CLOUD2-GD-SECURITY':
+            log_events = synth_corpus_events('guardduty', count, seed=i)
+        else:
+            log_events = synth_log_events(count, rng.choice(args.message_sizes), seed=i)
+        if args.handler == 'handler':
+            for logEvent in log_events:
+                ms = logEvent['timestamp']
+                logEvent['timestamp'] = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(ms // 1000)) + '.%03dZ' % (ms % 1000)
+        data = synth_awslogs_data(log_events, log_group, 'stream-%d' % rng.randint(0, 9))
+        events.append(({'awslogs': {'data': data}}, count))
+    return events
+
+
+def bench_load(args):
+    rng = random.Random(args.seed)
+    payloads = synth_invocations(args, rng)
+    env = dict(item.split('=', 1) for item in args.env)
+    latencies = []
+    events = errors = 0
+    with StubHec(latency=args.stub_latency) as stub, open(os.devnull, 'w') as devnull:
+        forwarder = import_forwarder(stub.url, **env)
+        handle = getattr(forwarder, args.handler)
+        peak_reset = _reset_peak_rss()
+        interval = 1.0 / args.rate if args.rate else 0
+        started = time.perf_counter()
+        deadline = started + args.duration
+        next_at = started
+        i = 0
+        while time.perf_counter() < deadline:
+            if interval:
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                next_at += interval
+            event, count = payloads[i % len(payloads)]
+            i += 1
+            t0 = time.perf_counter()
+            try:
+                with redirect_stdout(devnull):
+                    handle(event, None)
+                events += count
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+    result = {
+        'handler': args.handler,
+        'invocations': len(latencies),
+        'errors': errors,
+        'events': events,
+        'events_per_sec': events / elapsed,
+        'invocations_per_sec': len(latencies) / elapsed,
+        'target_rate': args.rate,
+        'p50_ms': _percentile(latencies, 50) * 1000,
+        'p99_ms': _percentile(latencies, 99) * 1000,
+        'max_ms': (latencies[-1] if latencies else 0) * 1000,
+        'peak_rss_mb': _peak_rss_kb() / 1024,
+        'peak_rss_includes_setup': not peak_reset,
+        'hec_requests': stub.requests,
+        'hec_events': stub.events,
+    }
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        for key, value in result.items():
+            print('%-24s %s' % (key, '%.2f' % value if isinstance(value, float) else value))
+
+    failures = []
+    if args.gate_p99_ms is not None and result['p99_ms'] > args.gate_p99_ms:
+        failures.append('p99 %.1f ms > %.1f ms' % (result['p99_ms'], args.gate_p99_ms))
+    if args.gate_min_eps is not None and result['events_per_sec'] < args.gate_min_eps:
+        failures.append('%.0f events/sec < %.0f' % (result['events_per_sec'], args.gate_min_eps))
+    if args.gate_max_rss_mb is not None and result['peak_rss_mb'] > args.gate_max_rss_mb:
+        failures.append('peak RSS %.1f MB > %.1f MB' % (result['peak_rss_mb'], args.gate_max_rss_mb))
+    if errors:
+        failures.append('%d invocation(s) raised' % errors)
+    if failures:
+        sys.exit('gate failed: ' + '; '.join(failures))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    decode = sub.add_parser('decode', help='peak RSS and wall time of the awslogs decode paths')
+    decode.add_argument('--sizes', type=float, nargs='+', default=[1, 6], help='compressed payload sizes in MB')
+    decode.add_argument('--child', choices=sorted(_DECODERS), help=argparse.SUPPRESS)
+    decode.add_argument('--payload', help=argparse.SUPPRESS)
+    decode.set_defaults(func=lambda a: _decode_child(a) if a.child else bench_decode(a))
+
+    throughput = sub.add_parser('throughput', help='legacy handler events/sec against a local stub HEC')
+    throughput.add_argument('--events', type=int, default=5000)
+    throughput.add_argument('--message-size', type=int, default=256)
+    throughput.add_argument('--latency', type=float, default=0.0, help='stub HEC response delay in seconds')
+    throughput.add_argument('--invocations', type=int, default=3, help='warm invocations; the last one is reported')
+    throughput.set_defaults(func=bench_throughput)
+
+    fanout = sub.add_parser('fanout', help='lambda_handler wall time, serial vs fanned out over several stub HECs')
+    fanout.add_argument('--latencies', type=float, nargs='+', default=[0.05, 0.1, 0.2],
+                        help='one stub HEC per value, delaying responses by that many seconds')
+    fanout.add_argument('--events', type=int, default=20000)
+    fanout.add_argument('--message-size', type=int, default=256)
+    fanout.add_argument('--batch-count', type=int, default=1000)
+    fanout.add_argument('--max-in-flight', type=int, default=4, help='per endpoint')
+    fanout.set_defaults(func=bench_fanout)
+
+    compression = sub.add_parser('compression', help='bytes sent, CPU and latency per gzip level')
+    compression.add_argument('--corpora', nargs='+', choices=sorted(_CORPORA), default=sorted(_CORPORA))
+    compression.add_argument('--levels', type=int, nargs='+', default=[1, 3, 6, 9])
+    compression.add_argument('--events', type=int, default=10000)
+    compression.add_argument('--bandwidth-mbps', type=float, default=100.0,
+                             help='simulated egress bandwidth to the stub HEC')
+    compression.set_defaults(func=bench_compression)
+
+    routing = sub.add_parser('routing', help='per-event routing cost with a large rule table')
+    routing.add_argument('--rules', type=int, default=10000)
+    routing.add_argument('--streams', type=int, default=2000, help='distinct log groups looked up')
+    routing.add_argument('--lookups', type=int, default=100000, help='events routed in the memoised run')
+    routing.add_argument('--linear-lookups', type=int, default=500, help='the linear scan is slow; sample fewer')
+    routing.set_defaults(func=bench_routing)
+
+    timestamps = sub.add_parser('timestamps', help='per-event timestamp parse cost')
+    timestamps.add_argument('--events', type=int, default=100000)
+    timestamps.add_argument('--spacing-ms', type=int, default=1, help='gap between consecutive events')
+    timestamps.set_defaults(func=bench_timestamps)
+
+    spill = sub.add_parser('spill', help='HEC traffic during and after an outage, with and without spilling')
+    spill.add_argument('--invocations', type=int, default=8)
+    spill.add_argument('--outage', type=int, default=3, help='invocations during which the stub HEC fails')
+    spill.add_argument('--events', type=int, default=5000)
+    spill.add_argument('--message-size', type=int, default=256)
+    spill.add_argument('--batch-count', type=int, default=500)
+    spill.set_defaults(func=bench_spill)
+
+    load = sub.add_parser('load', help='replay synthetic awslogs events through a handler at a target rate')
+    load.add_argument('--handler', choices=['lambda_handler', 'handler'], default='lambda_handler')
+    load.add_argument('--rate', type=float, default=10.0, help='target invocations/sec; 0 runs flat out')
+    load.add_argument('--duration', type=float, default=10.0, help='seconds')
+    load.add_argument('--batch-sizes', type=int, nargs='+', default=[50, 500, 5000], help='log events per invocation')
+    load.add_argument('--message-sizes', type=int, nargs='+', default=[128, 512, 2048])
+    load.add_argument('--log-groups', nargs='+', default=['/aws/lambda/orders', '/aws/ecs/web', 'AWS-CLOUD2-GD-SECURITY'])
+    load.add_argument('--distinct-payloads', type=int, default=20)
+    load.add_argument('--stub-latency', type=float, default=0.0)
+    load.add_argument('--seed', type=int, default=0)
+    load.add_argument('--env', nargs='*', default=[], metavar='KEY=VALUE', help='extra forwarder environment')
+    load.add_argument('--json', action='store_true')
+    load.add_argument('--gate-p99-ms', type=float, help='exit non-zero if p99 latency exceeds this')
+    load.add_argument('--gate-min-eps', type=float, help='exit non-zero if events/sec falls below this')
+    load.add_argument('--gate-max-rss-mb', type=float, help='exit non-zero if peak RSS exceeds this')
+    load.set_defaults(func=bench_load)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
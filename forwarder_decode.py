@@ -0,0 +1,140 @@
+import base64
+import codecs
+import json
+import zlib
+
+# Size of the base64 slices fed to the decompressor. Must be a multiple of 4
+# so every slice decodes on its own.
+B64_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = ' \t\n\r'
+_decoder = json.JSONDecoder()
+
+
+class CloudWatchLogsStream:
+    """Incrementally decode a CloudWatch Logs subscription payload.
+
+    The base64 blob is decoded, gunzipped and parsed in small slices, so only
+    the current log event (plus one decompressed chunk) is held in memory
+    instead of the whole expanded payload. Iterating yields ``logEvents``
+    entries one at a time; every other top-level key (``logGroup``,
+    ``logStream``, ``messageType``...) is collected into ``header``.
+
+    CloudWatch writes ``logEvents`` last, so the header is complete before the
+    first event is yielded. If a producer ever orders the keys differently the
+    events are buffered until the object is closed.
+    """
+
+    def __init__(self, data, chunk_size=B64_CHUNK_SIZE):
+        if isinstance(data, str):
+            data = data.encode('ascii')
+        self.header = {}
+        self._data = data
+        self._chunk_size = chunk_size - chunk_size % 4
+        self._offset = 0
+        self._zlib = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+        self._consumed = False
+
+    # -- input ---------------------------------------------------------------
+
+    def _fill(self):
+        """Append the next decompressed chunk to the buffer. False at EOF."""
+        if self._eof:
+            return False
+        if self._pos:
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+        while True:
+            if self._offset >= len(self._data):
+                tail = self._zlib.flush()
+                self._buf += self._utf8.decode(tail, final=True)
+                self._eof = True
+                return bool(tail)
+            raw = base64.b64decode(self._data[self._offset:self._offset + self._chunk_size])
+            self._offset += self._chunk_size
+            text = self._utf8.decode(self._zlib.decompress(raw))
+            if text:
+                self._buf += text
+                return True
+
+    def _peek(self):
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                raise ValueError('Unexpected end of CloudWatch Logs payload')
+
+    def _expect(self, char):
+        if self._peek() != char:
+            raise ValueError('Expected %r at offset %d of CloudWatch Logs payload' % (char, self._pos))
+        self._pos += 1
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number at the very end of the buffer may still be cut short.
+            if end == len(self._buf) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    # -- parsing -------------------------------------------------------------
+
+    def __iter__(self):
+        if self._consumed:
+            raise RuntimeError('CloudWatchLogsStream can only be iterated once')
+        self._consumed = True
+        pending = []
+        self._expect('{')
+        if self._peek() == '}':
+            return
+        while True:
+            key = self._value()
+            self._expect(':')
+            if key == 'logEvents':
+                for logEvent in self._events():
+                    if 'logGroup' in self.header:
+                        yield logEvent
+                    else:
+                        pending.append(logEvent)
+            else:
+                self.header[key] = self._value()
+            sep = self._peek()
+            self._pos += 1
+            if sep == '}':
+                break
+            if sep != ',':
+                raise ValueError('Malformed CloudWatch Logs payload near offset %d' % self._pos)
+        for logEvent in pending:
+            yield logEvent
+
+    def _events(self):
+        self._expect('[')
+        if self._peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield self._value()
+            sep = self._peek()
+            self._pos += 1
+            if sep == ']':
+                return
+            if sep != ',':
+                raise ValueError('Malformed logEvents array near offset %d' % self._pos)
+
+
+def decode_awslogs(data):
+    """Decode the whole payload at once. Kept for callers that need the dict."""
+    return json.loads(zlib.decompress(base64.b64decode(data), 16 + zlib.MAX_WBITS))
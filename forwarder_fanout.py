@@ -0,0 +1,92 @@
+import threading
+
+DEFAULT_MAX_IN_FLIGHT = 4
+
+
+class HecEndpoint:
+    def __init__(self, url, weight=1, max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+        if weight < 1 or max_in_flight < 1:
+            raise ValueError('HEC endpoint weight and max_in_flight must be >= 1: %s' % url)
+        self.url = url
+        self.weight = weight
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.current = 0
+        self.sent = 0
+
+    def __repr__(self):
+        return 'HecEndpoint(%r, weight=%d, max_in_flight=%d)' % (self.url, self.weight, self.max_in_flight)
+
+
+def parse_endpoints(spec, default_max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+    """Parse ``url[|weight[|max_in_flight]]`` entries separated by commas.
+
+    ``https://idx-a:8088|3,https://idx-b:8088|1|2`` sends three chunks to
+    idx-a for every one to idx-b, with at most two requests in flight to idx-b.
+    """
+    endpoints = []
+    for entry in spec.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        parts = entry.split('|')
+        weight = int(parts[1]) if len(parts) > 1 and parts[1] else 1
+        max_in_flight = int(parts[2]) if len(parts) > 2 and parts[2] else default_max_in_flight
+        endpoints.append(HecEndpoint(parts[0], weight, max_in_flight))
+    if not endpoints:
+        raise ValueError('No HEC endpoints in %r' % spec)
+    return endpoints
+
+
+class HecFanout:
+    """Spread HEC requests over several endpoints.
+
+    Endpoints are picked with smooth weighted round-robin, skipping any that
+    are at their ``max_in_flight`` limit; when all are saturated the caller
+    blocks until a request completes. ``post(url, body, **kwargs)`` does the
+    actual request and must raise on failure. ``send`` is thread-safe, so a
+    retry from HecBatcher naturally lands on the next endpoint in rotation.
+    """
+
+    def __init__(self, endpoints, post):
+        self.endpoints = list(endpoints)
+        self.post = post
+        self._cond = threading.Condition()
+
+    @property
+    def max_in_flight(self):
+        return sum(endpoint.max_in_flight for endpoint in self.endpoints)
+
+    def _acquire(self):
+        with self._cond:
+            while True:
+                available = [e for e in self.endpoints if e.in_flight < e.max_in_flight]
+                if available:
+                    break
+                self._cond.wait()
+            total = 0
+            chosen = None
+            for endpoint in available:
+                endpoint.current += endpoint.weight
+                total += endpoint.weight
+                if chosen is None or endpoint.current > chosen.current:
+                    chosen = endpoint
+            chosen.current -= total
+            chosen.in_flight += 1
+            return chosen
+
+    def _release(self, endpoint, ok):
+        with self._cond:
+            endpoint.in_flight -= 1
+            if ok:
+                endpoint.sent += 1
+            self._cond.notify()
+
+    def send(self, body, **kwargs):
+        endpoint = self._acquire()
+        ok = False
+        try:
+            self.post(endpoint.url, body, **kwargs)
+            ok = True
+        finally:
+            self._release(endpoint, ok)
@@ -0,0 +1,89 @@
+import json
+import os
+import sys
+import time
+
+DEFAULT_NAMESPACE = 'SplunkForwarder'
+
+_UNITS = {
+    'DecodeTime': 'Milliseconds',
+    'TransformTime': 'Milliseconds',
+    'BatchTime': 'Milliseconds',
+    'FlushTime': 'Milliseconds',
+    'TotalTime': 'Milliseconds',
+    'Events': 'Count',
+    'EventsSent': 'Count',
+    'EventsSpilled': 'Count',
+    'EventsFailed': 'Count',
+    'Chunks': 'Count',
+    'InputBytes': 'Bytes',
+    'RawBytesSent': 'Bytes',
+    'BytesSent': 'Bytes',
+}
+
+
+class InvocationMetrics:
+    """Per-invocation timings and counters, written as one EMF record.
+
+    Phase times are accumulated in seconds by the caller (the handler adds
+    to ``decode``, ``transform``... around each step) and reported in
+    milliseconds. Delivery counters come from ``batcher``, the invocation's
+    HecBatcher, when one is attached. ``emit`` prints a CloudWatch Embedded
+    Metric Format line to stdout; the Lambda log agent turns it into metrics
+    with no API calls.
+    """
+
+    def __init__(self, function_name=None, namespace=None):
+        self.function_name = function_name or os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'local')
+        self.namespace = namespace or os.environ.get('splunk_forwarder_metrics_namespace', DEFAULT_NAMESPACE)
+        self.started = time.perf_counter()
+        self.decode = 0.0
+        self.transform = 0.0
+        self.batch = 0.0
+        self.flush = 0.0
+        self.events = 0
+        self.input_bytes = 0
+        self.batcher = None
+        self.properties = {}
+
+    def values(self):
+        values = {
+            'DecodeTime': self.decode * 1000,
+            'TransformTime': self.transform * 1000,
+            'BatchTime': self.batch * 1000,
+            'FlushTime': self.flush * 1000,
+            'TotalTime': (time.perf_counter() - self.started) * 1000,
+            'Events': self.events,
+            'InputBytes': self.input_bytes,
+        }
+        batcher = self.batcher
+        if batcher is not None:
+            values.update({
+                'EventsSent': batcher.events_sent,
+                'EventsSpilled': batcher.events_spilled,
+                'EventsFailed': sum(count for _, count in batcher.failed),
+                'Chunks': batcher.chunks_sent,
+                'RawBytesSent': batcher.raw_bytes_sent,
+                'BytesSent': batcher.bytes_sent,
+            })
+        return values
+
+    def to_emf(self):
+        values = self.values()
+        record = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': self.namespace,
+                    'Dimensions': [['FunctionName']],
+                    'Metrics': [{'Name': name, 'Unit': _UNITS[name]} for name in values],
+                }],
+            },
+            'FunctionName': self.function_name,
+        }
+        record.update(self.properties)
+        record.update(values)
+        return json.dumps(record, separators=(',', ':'))
+
+    def emit(self, out=None):
+        (out or sys.stdout).write(self.to_emf() + '\n')
@@ -0,0 +1,164 @@
+import json
+import os
+import re
+
+DEFAULT_SOURCETYPE = 'aws:cloudwatchlogs'
+
+# Used when neither splunk_routing_rules nor splunk_routing_file is set
+DEFAULT_RULES = [
+    {'match': 'exact', 'pattern': 'AWS-CLOUD2-GD-SECURITY', 'sourcetype': 'aws:cloudwatch:guardduty'},
+]
+
+FIELDS = ('logGroup', 'logStream')
+MATCH_TYPES = ('exact', 'prefix', 'regex')
+ROUTE_KEYS = ('sourcetype', 'index', 'source', 'host')
+
+# Distinct (logGroup, logStream) pairs remembered per container
+DEFAULT_CACHE_SIZE = 4096
+
+# Inline flags at the start of a pattern, e.g. (?i) or (?i)(?s)
+_LEADING_FLAGS = re.compile(r'^(?:\(\?[aiLmsux]+\))+')
+_DEFAULT_FLAGS = re.compile('').flags
+
+
+def _scoped_regex(pattern):
+    """``pattern`` ready to join the alternation: compiled on its own first,
+    then leading inline flags like (?i) turned into a scoped (?i:...) group
+    so they apply to this rule only."""
+    try:
+        compiled = re.compile(pattern)
+    except re.error as e:
+        raise ValueError('Routing regex %r does not compile: %s' % (pattern, e))
+    if compiled.groupindex:
+        raise ValueError('Routing regex %r must not define named groups' % pattern)
+    m = _LEADING_FLAGS.match(pattern)
+    flags = ''.join(sorted(set(m.group(0)) - set('(?)'))) if m else ''
+    if not m:
+        if compiled.flags != _DEFAULT_FLAGS:
+            raise ValueError('Routing regex %r: inline flags must come first, e.g. (?i)...' % pattern)
+        return pattern
+    if 'x' in flags:
+        raise ValueError('Routing regex %r: verbose (?x) cannot be limited to one rule' % pattern)
+    return '(?%s:%s)' % (flags, pattern[m.end():])
+
+
+class _FieldTable:
+    def __init__(self):
+        self.exact = {}
+        self.prefixes = {}
+        self.prefix_lengths = []
+        self.regex_routes = []
+        self.regex = None
+
+    def compile(self, regex_patterns):
+        self.prefix_lengths = sorted({len(p) for p in self.prefixes}, reverse=True)
+        if regex_patterns:
+            # One alternation, one named group per rule; lastgroup names the
+            # first rule that matched
+            self.regex = re.compile('|'.join(
+                '(?P<r%d>%s)' % (i, pattern) for i, pattern in enumerate(regex_patterns)
+            ))
+
+    def match_exact(self, value):
+        return self.exact.get(value)
+
+    def match_prefix(self, value):
+        for length in self.prefix_lengths:
+            if length <= len(value):
+                route = self.prefixes.get(value[:length])
+                if route is not None:
+                    return route
+        return None
+
+    def match_regex(self, value):
+        if self.regex is None:
+            return None
+        m = self.regex.match(value)
+        if m is None:
+            return None
+        return self.regex_routes[int(m.lastgroup[1:])]
+
+
+class RoutingTable:
+    """Map a log group/stream to a sourcetype, index and other HEC metadata.
+
+    Rules are dicts with ``match`` (exact, prefix or regex), ``pattern``,
+    an optional ``field`` (logGroup, the default, or logStream) and the HEC
+    keys to set (``sourcetype``, ``index``, ``source``, ``host``). Exact rules
+    land in a dict, prefix rules in a dict probed once per distinct prefix
+    length (longest first), and all regex rules of a field are compiled into
+    one alternation, first rule wins. Exact beats prefix beats regex, and a
+    logGroup rule beats a logStream rule of the same kind. Results are
+    memoised per (logGroup, logStream), so a warm container pays for rule
+    evaluation once per stream instead of once per event.
+
+    Regex patterns must not define named groups or use numbered
+    backreferences, since they are combined into a single pattern. Each is
+    compiled on its own first; leading inline flags such as ``(?i)`` only
+    apply to their own rule, and ``(?x)`` is rejected.
+    """
+
+    def __init__(self, rules, defaults=None, cache_size=DEFAULT_CACHE_SIZE):
+        self.defaults = {'sourcetype': DEFAULT_SOURCETYPE}
+        self.defaults.update(defaults or {})
+        self.cache_size = cache_size
+        self._cache = {}
+        self._tables = {field: _FieldTable() for field in FIELDS}
+        regex_patterns = {field: [] for field in FIELDS}
+        for rule in rules:
+            field = rule.get('field', 'logGroup')
+            match = rule.get('match', 'exact')
+            if field not in FIELDS:
+                raise ValueError('Routing rule field must be one of %s: %r' % (FIELDS, rule))
+            if match not in MATCH_TYPES:
+                raise ValueError('Routing rule match must be one of %s: %r' % (MATCH_TYPES, rule))
+            route = dict(self.defaults)
+            route.update((k, rule[k]) for k in ROUTE_KEYS if k in rule)
+            table = self._tables[field]
+            if match == 'exact':
+                table.exact.setdefault(rule['pattern'], route)
+            elif match == 'prefix':
+                table.prefixes.setdefault(rule['pattern'], route)
+            else:
+                regex_patterns[field].append(_scoped_regex(rule['pattern']))
+                table.regex_routes.append(route)
+        for field in FIELDS:
+            self._tables[field].compile(regex_patterns[field])
+
+    def route(self, logGroup, logStream=''):
+        key = (logGroup, logStream)
+        route = self._cache.get(key)
+        if route is None:
+            route = self._resolve(logGroup, logStream)
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            self._cache[key] = route
+        return route
+
+    def _resolve(self, logGroup, logStream):
+        group = self._tables['logGroup']
+        stream = self._tables['logStream']
+        return (
+            group.match_exact(logGroup) or stream.match_exact(logStream)
+            or group.match_prefix(logGroup) or stream.match_prefix(logStream)
+            or group.match_regex(logGroup) or stream.match_regex(logStream)
+            or self.defaults
+        )
+
+
+def load_routing_table(environ=os.environ):
+    """Build the table from ``splunk_routing_rules`` (inline JSON) or
+    ``splunk_routing_file`` (path to a JSON file), falling back to
+    DEFAULT_RULES. Either source may be a list of rules or an object with
+    ``rules`` and ``defaults``.
+    """
+    if environ.get('splunk_routing_rules'):
+        config = json.loads(environ['splunk_routing_rules'])
+    elif environ.get('splunk_routing_file'):
+        with open(environ['splunk_routing_file']) as f:
+            config = json.load(f)
+    else:
+        config = DEFAULT_RULES
+    if isinstance(config, list):
+        config = {'rules': config}
+    return RoutingTable(config.get('rules', []), config.get('defaults'))
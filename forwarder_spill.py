@@ -0,0 +1,166 @@
+import logging
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+# Record header: body length, event count
+_HEADER = struct.Struct('>II')
+# Position file header: read offset into the draining file
+_OFFSET = struct.Struct('>Q')
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_DRAIN_RECORDS = 50
+DEFAULT_DRAIN_CONCURRENCY = 4
+
+logger = logging.getLogger(__name__)
+
+
+class SpillFull(Exception):
+    pass
+
+
+class SpillQueue:
+    """Append-only, length-prefixed file of HEC chunks that could not be sent.
+
+    Each record is an 8-byte header (body length, event count) followed by
+    the chunk body exactly as HecBatcher would have posted it, so draining
+    needs no re-serialization. The file lives in Lambda's /tmp, i.e. it
+    survives across warm invocations of one container but not a recycle;
+    it smooths over short HEC outages rather than replacing a durable queue.
+
+    ``drain`` moves the file aside before reading it, so chunks spilled while
+    draining go to a fresh file. How far the moved-aside file has been sent
+    is kept in a small position file (read offset, then the few records of
+    a failed wave to resend first), replaced atomically after every wave:
+    a drain reads only the records it sends, never the rest of the file,
+    and one interrupted by a timeout carries on where it stopped.
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._draining_path = path + '.draining'
+        self._position_path = path + '.position'
+
+    def __len__(self):
+        offset, pending = self._position()
+        return (sum(1 for _ in self._records(self.path)) + len(pending)
+                + sum(1 for _ in self._records(self._draining_path, offset)))
+
+    def size(self):
+        offset, pending = self._position()
+        total = sum(_HEADER.size + len(body) for body, _ in pending)
+        for path, skip in ((self.path, 0), (self._draining_path, offset)):
+            try:
+                total += os.path.getsize(path) - skip
+            except OSError:
+                pass
+        return total
+
+    def append(self, body, count):
+        if self.size() + _HEADER.size + len(body) > self.max_bytes:
+            raise SpillFull('HEC spill file %s would exceed %d bytes' % (self.path, self.max_bytes))
+        with open(self.path, 'ab') as f:
+            f.write(_HEADER.pack(len(body), count))
+            f.write(body)
+
+    def _records(self, path, offset=0):
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(offset)
+            yield from _read_records(f, path)
+
+    def _position(self):
+        """``(offset into the draining file, records to resend first)``."""
+        try:
+            f = open(self._position_path, 'rb')
+        except FileNotFoundError:
+            return 0, []
+        with f:
+            header = f.read(_OFFSET.size)
+            if len(header) < _OFFSET.size:
+                return 0, []
+            return _OFFSET.unpack(header)[0], list(_read_records(f, self._position_path))
+
+    def _save_position(self, offset, pending):
+        tmp = self._position_path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(_OFFSET.pack(offset))
+            for body, count in pending:
+                f.write(_HEADER.pack(len(body), count))
+                f.write(body)
+        os.replace(tmp, self._position_path)
+
+    def drain(self, send, max_records=DEFAULT_DRAIN_RECORDS, concurrency=DEFAULT_DRAIN_CONCURRENCY):
+        """Resend up to ``max_records`` spilled chunks, ``concurrency`` at a time.
+
+        Records go out in waves; if anything in a wave fails, HEC is assumed
+        to still be unhealthy, the failed records are kept to go first next
+        time and the rest of the file is left untouched. Returns
+        ``(events_sent, healthy)``.
+        """
+        if not os.path.exists(self._draining_path):
+            if not os.path.exists(self.path):
+                return 0, True
+            os.replace(self.path, self._draining_path)
+            if os.path.exists(self._position_path):
+                os.remove(self._position_path)
+        offset, pending = self._position()
+        sent = 0
+        healthy = True
+        with open(self._draining_path, 'rb') as f, ThreadPoolExecutor(max_workers=concurrency) as pool:
+            f.seek(offset)
+            records = _read_records(f, self._draining_path)
+            attempted = 0
+            while healthy and attempted < max_records:
+                size = min(concurrency, max_records - attempted)
+                wave, pending = pending[:size], pending[size:]
+                for record in records if len(wave) < size else ():
+                    wave.append(record)
+                    if len(wave) >= size:
+                        break
+                if not wave:
+                    break
+                attempted += len(wave)
+                results = list(pool.map(lambda record: _try_send(send, record[0]), wave))
+                failed = []
+                for (body, count), ok in zip(wave, results):
+                    if ok:
+                        sent += count
+                    else:
+                        failed.append((body, count))
+                        healthy = False
+                pending = failed + pending
+                offset = f.tell()
+                self._save_position(offset, pending)
+            done = not pending and not f.read(1)
+        if done:
+            os.remove(self._draining_path)
+            if os.path.exists(self._position_path):
+                os.remove(self._position_path)
+        return sent, healthy
+
+
+def _read_records(f, path):
+    while True:
+        header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            return
+        length, count = _HEADER.unpack(header)
+        body = f.read(length)
+        if len(body) < length:
+            logger.warning('Dropping truncated record at the end of %s', path)
+            return
+        yield body, count
+
+
+def _try_send(send, body):
+    try:
+        send(body)
+        return True
+    except Exception as e:
+        logger.warning('Re-sending spilled HEC chunk of %d bytes failed: %s', len(body), e)
+        return False
@@ -0,0 +1,62 @@
+import calendar
+
+# Fractions are cut to nanoseconds, finer digits are below float precision
+MAX_FRACTION_DIGITS = 9
+_SCALE = [10 ** n for n in range(MAX_FRACTION_DIGITS + 1)]
+
+
+class TimestampParser:
+    """Convert CloudWatch timestamps to epoch seconds (float, UTC).
+
+    Accepts epoch milliseconds (int, float or digit string, as in the
+    ``logEvents`` of a subscription payload) and ISO-8601 strings of the form
+    ``YYYY-MM-DDTHH:MM:SS[.fff][Z|+HH:MM|-HH:MM]``; a missing offset means
+    UTC, and digits of the fraction past nanoseconds are dropped. The fields
+    are sliced out directly rather than going through ``time.strptime``, and
+    the epoch of the last ``YYYY-MM-DDTHH:MM:SS`` prefix is remembered, since
+    consecutive events in a batch mostly share the same second and then only
+    the fraction has to be parsed.
+    """
+
+    def __init__(self):
+        self._prefix = None
+        self._prefix_epoch = 0
+
+    def __call__(self, value):
+        if isinstance(value, (int, float)):
+            return value / 1000
+        if value.isdigit():
+            return int(value) / 1000
+        prefix = value[:19]
+        if prefix != self._prefix:
+            if len(prefix) != 19 or prefix[4] != '-' or prefix[7] != '-' or prefix[10] not in 'Tt ' \
+                    or prefix[13] != ':' or prefix[16] != ':':
+                raise ValueError('Unsupported timestamp: %r' % value)
+            self._prefix_epoch = calendar.timegm((
+                int(prefix[0:4]), int(prefix[5:7]), int(prefix[8:10]),
+                int(prefix[11:13]), int(prefix[14:16]), int(prefix[17:19]),
+            ))
+            self._prefix = prefix
+        epoch = self._prefix_epoch
+        rest = value[19:]
+        if not rest:
+            return float(epoch)
+        if rest[0] == '.' and rest[-1] == 'Z' and rest[1:-1].isdigit():
+            digits = rest[1:min(len(rest) - 1, MAX_FRACTION_DIGITS + 1)]
+            return epoch + int(digits) / _SCALE[len(digits)]
+        i = 0
+        if rest[0] == '.':
+            i = 1
+            while i < len(rest) and rest[i].isdigit():
+                i += 1
+            if i > 1:
+                digits = rest[1:min(i, MAX_FRACTION_DIGITS + 1)]
+                epoch += int(digits) / _SCALE[len(digits)]
+        tz = rest[i:]
+        if tz in ('', 'Z', 'z'):
+            return float(epoch)
+        if len(tz) in (5, 6) and tz[0] in '+-':
+            hours, minutes = int(tz[1:3]), int(tz[-2:])
+            offset = hours * 3600 + minutes * 60
+            return float(epoch - offset if tz[0] == '+' else epoch + offset)
+        raise ValueError('Unsupported timestamp: %r' % value)